@@ -0,0 +1,146 @@
+use std::collections::HashMap;
+use std::sync::Arc;
+use tokio::task::JoinSet;
+
+/// One unit of work in a plan, runnable once every id in `deps` has finished.
+#[derive(Debug, Clone)]
+pub struct TaskNode {
+    pub id: usize,
+    pub name: String,
+    pub deps: Vec<usize>,
+}
+
+/// Result of running a node; `halt` skips everything that depends on it.
+pub struct NodeOutcome<T> {
+    pub value: T,
+    pub halt: bool,
+}
+
+/// Run `nodes` on tokio's blocking pool, starting each one as soon as its
+/// dependencies complete. Returns `(id, value)` sorted by id for every node
+/// that ran; dependents of a halted node are skipped.
+///
+/// Nodes that call into Python hold the GIL while Python bytecode runs, so
+/// independent branches only overlap where Python releases it: subprocesses
+/// (git, pip), socket I/O, blocking queue waits such as token streaming,
+/// and torch kernels. Agent subtasks spend nearly all their time there, so
+/// wall-clock time still approaches the critical path, but pure-Python
+/// stretches of different branches run one at a time.
+pub async fn run_dag<T, F>(nodes: Vec<TaskNode>, run: F) -> Vec<(usize, T)>
+where
+    T: Send + 'static,
+    F: Fn(&TaskNode) -> NodeOutcome<T> + Send + Sync + 'static,
+{
+    let run = Arc::new(run);
+    let mut remaining: HashMap<usize, usize> = nodes.iter().map(|n| (n.id, n.deps.len())).collect();
+    let mut dependents: HashMap<usize, Vec<usize>> = HashMap::new();
+    for node in &nodes {
+        for dep in &node.deps {
+            dependents.entry(*dep).or_default().push(node.id);
+        }
+    }
+    let by_id: HashMap<usize, TaskNode> = nodes.into_iter().map(|n| (n.id, n)).collect();
+
+    let mut set = JoinSet::new();
+    let spawn = |set: &mut JoinSet<(usize, NodeOutcome<T>)>, node: TaskNode| {
+        let run = run.clone();
+        // Python work blocks its thread, so it goes on the blocking pool
+        set.spawn_blocking(move || {
+            let outcome = run(&node);
+            (node.id, outcome)
+        });
+    };
+    let mut roots: Vec<usize> = remaining.iter().filter(|(_, n)| **n == 0).map(|(id, _)| *id).collect();
+    roots.sort();
+    for id in roots {
+        spawn(&mut set, by_id[&id].clone());
+    }
+
+    let mut results = Vec::new();
+    while let Some(joined) = set.join_next().await {
+        let (id, outcome) = match joined {
+            Ok(done) => done,
+            Err(e) => {
+                eprintln!("Subtask panicked: {}", e);
+                continue;
+            }
+        };
+        results.push((id, outcome.value));
+        if outcome.halt {
+            continue;
+        }
+        if let Some(ready) = dependents.get(&id) {
+            for dep in ready {
+                let count = remaining.get_mut(dep).unwrap();
+                *count -= 1;
+                if *count == 0 {
+                    spawn(&mut set, by_id[dep].clone());
+                }
+            }
+        }
+    }
+    results.sort_by_key(|(id, _)| *id);
+    results
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::sync::atomic::{AtomicUsize, Ordering};
+    use std::sync::Mutex;
+    use std::time::{Duration, Instant};
+
+    fn node(id: usize, deps: &[usize]) -> TaskNode {
+        TaskNode { id, name: format!("task {}", id), deps: deps.to_vec() }
+    }
+
+    #[tokio::test(flavor = "multi_thread")]
+    async fn runs_nodes_after_their_dependencies() {
+        let events = Arc::new(Mutex::new(Vec::new()));
+        let log = events.clone();
+        let nodes = vec![node(0, &[]), node(1, &[0]), node(2, &[1]), node(3, &[0, 1]), node(4, &[])];
+        let results = run_dag(nodes, move |n| {
+            log.lock().unwrap().push(("start", n.id));
+            std::thread::sleep(Duration::from_millis(10));
+            log.lock().unwrap().push(("end", n.id));
+            NodeOutcome { value: n.id * 10, halt: false }
+        })
+        .await;
+
+        assert_eq!(results, vec![(0, 0), (1, 10), (2, 20), (3, 30), (4, 40)]);
+        let events = events.lock().unwrap();
+        let at = |event: (&str, usize)| events.iter().position(|e| *e == event).unwrap();
+        for (id, deps) in [(1, vec![0]), (2, vec![1]), (3, vec![0, 1])] {
+            for dep in deps {
+                assert!(at(("end", dep)) < at(("start", id)), "{} started before {} finished", id, dep);
+            }
+        }
+    }
+
+    #[tokio::test(flavor = "multi_thread")]
+    async fn runs_independent_nodes_concurrently() {
+        // Each node waits until every node has started, which only happens if they overlap
+        let started = Arc::new(AtomicUsize::new(0));
+        let nodes = vec![node(0, &[]), node(1, &[]), node(2, &[])];
+        let results = run_dag(nodes, move |_| {
+            started.fetch_add(1, Ordering::SeqCst);
+            let deadline = Instant::now() + Duration::from_secs(5);
+            while started.load(Ordering::SeqCst) < 3 && Instant::now() < deadline {
+                std::thread::sleep(Duration::from_millis(1));
+            }
+            NodeOutcome { value: started.load(Ordering::SeqCst), halt: false }
+        })
+        .await;
+
+        assert_eq!(results, vec![(0, 3), (1, 3), (2, 3)]);
+    }
+
+    #[tokio::test(flavor = "multi_thread")]
+    async fn halt_skips_every_dependent() {
+        let nodes = vec![node(0, &[]), node(1, &[0]), node(2, &[1]), node(3, &[]), node(4, &[2, 3]), node(5, &[3])];
+        let results = run_dag(nodes, |n| NodeOutcome { value: (), halt: n.id == 0 }).await;
+
+        let ran: Vec<usize> = results.into_iter().map(|(id, _)| id).collect();
+        assert_eq!(ran, vec![0, 3, 5]);
+    }
+}
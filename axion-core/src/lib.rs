@@ -3,6 +3,8 @@ pub mod integrity;
 pub mod audit_ledger;
 pub mod state;
 pub mod security;
+pub mod executor;
+pub mod orchestrator;
 
 use serde::{Deserialize, Serialize};
 
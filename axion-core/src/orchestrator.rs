@@ -1,107 +1,318 @@
+use crate::executor::{run_dag, NodeOutcome, TaskNode};
 use pyo3::prelude::*;
 use pyo3::types::PyDict;
 use serde::{Deserialize, Serialize};
 use std::collections::HashMap;
+use std::future::Future;
+use std::io::Write;
+use std::sync::{Arc, Mutex};
+use std::time::{Duration, Instant};
 
-#[derive(Serialize, Deserialize)]
+/// Held by the one LLM query streaming to stdout. Queries that run
+/// alongside it buffer their text and print it whole once it is free.
+static ECHO: Mutex<()> = Mutex::new(());
+
+#[derive(Serialize, Deserialize, Clone)]
 pub struct AgentResult {
     pub output: String,
     pub status: bool,
 }
 
+/// Construction cost and call latency of one long-lived Python agent.
+#[derive(Default, Debug, Clone)]
+pub struct AgentTiming {
+    pub init: Duration,
+    pub first_call: Option<Duration>,
+    pub later_calls: u32,
+    pub later_total: Duration,
+}
+
+impl AgentTiming {
+    pub fn later_mean(&self) -> Option<Duration> {
+        if self.later_calls == 0 {
+            None
+        } else {
+            Some(self.later_total / self.later_calls)
+        }
+    }
+}
+
+/// Cheap to clone: every clone shares the same agents, timings and runtime,
+/// which is how subtasks running on different threads reuse them.
+#[derive(Clone)]
 pub struct CognitiveOrchestrator {
-    pub active_goals: Vec<String>,
+    pub active_goals: Arc<Mutex<Vec<String>>>,
+    // Agents are imported and constructed once, then reused for every subtask
+    agents: Arc<Mutex<HashMap<&'static str, Py<PyAny>>>>,
+    pub timings: Arc<Mutex<HashMap<&'static str, AgentTiming>>>,
+    runtime: Arc<tokio::runtime::Runtime>,
+}
+
+impl Default for CognitiveOrchestrator {
+    fn default() -> Self {
+        Self::new()
+    }
+}
+
+/// One entry of `PlannerAgent.decompose(command, as_dag=True)`, whose
+/// `depends_on` names earlier entries by position.
+#[derive(FromPyObject)]
+struct PlannedTask {
+    #[pyo3(item)]
+    task: String,
+    #[pyo3(item)]
+    depends_on: Vec<usize>,
+}
+
+/// Add an anomaly write for each of the plan's dispatch nodes `0..n`. The
+/// write for node `id` takes id `n + id` and waits only for its own
+/// dispatch, so it overlaps the next one.
+fn plan_graph(mut plan: Vec<TaskNode>) -> Vec<TaskNode> {
+    let n = plan.len();
+    for id in 0..n {
+        let name = format!("record {}", plan[id].name);
+        plan.push(TaskNode { id: n + id, name, deps: vec![id] });
+    }
+    plan
+}
+
+/// A plan that runs `subtasks` one after another.
+fn sequence(subtasks: &[&str]) -> Vec<TaskNode> {
+    subtasks
+        .iter()
+        .enumerate()
+        .map(|(id, sub)| TaskNode { id, name: sub.to_string(), deps: id.checked_sub(1).into_iter().collect() })
+        .collect()
 }
 
 impl CognitiveOrchestrator {
-    pub fn proactive_plan(&mut self, command: String, context_id: &str) -> Vec<String> {
-        let mut subtasks = Python::with_gil(|py| {
-            let planner_module = py.import("python.agents.planner_agent")?;
-            let planner_class = planner_module.getattr("PlannerAgent")?;
-            let planner_inst = planner_class.call0()?;
-            let subtasks_py = planner_inst.call_method1("decompose", (command.clone(),))?;
-            Ok(subtasks_py.extract::<Vec<String>>()?)
-        }).unwrap_or(vec![command]);
-        if command.starts_with("--nl") {
-            subtasks.insert(0, "check_install_deps".to_string());
+    pub fn new() -> Self {
+        Self {
+            active_goals: Arc::new(Mutex::new(Vec::new())),
+            agents: Arc::new(Mutex::new(HashMap::new())),
+            timings: Arc::new(Mutex::new(HashMap::new())),
+            runtime: Arc::new(
+                tokio::runtime::Builder::new_multi_thread()
+                    .enable_all()
+                    .build()
+                    .expect("failed to start tokio runtime"),
+            ),
         }
-        subtasks
     }
 
-    pub fn self_debug(&mut self, result: &AgentResult, orig_cmd: &str, context_id: &str) -> bool {
-        if !result.status {
-            Python::with_gil(|py| {
-                let mem_module = py.import("python.memory")?;
-                let mem_inst = mem_module.getattr("QdrantMemory")?.call0()?;
-                let payload = PyDict::new(py);
-                payload.set_item("type", "error")?;
-                mem_inst.call_method1("store_context", (format!("Anomaly: {}", result.output), context_id, payload))?;
-                Ok(())
-            }).unwrap_or(());
-            if result.output.contains("ImportError") {
-                let alt = "install missing deps and retry";
-                Python::with_gil(|py| {
-                    let debug_module = py.import("python.agents.debug_agent")?;
-                    let debug_inst = debug_module.getattr("DebugAgent")?.call0()?;
-                    let new_plan = debug_inst.call_method1("re_plan", (alt, context_id))?;
-                    eprintln!("Re-plan: {}", new_plan.extract::<String>()?);
-                    Ok(true)
-                }).unwrap_or(false)
-            } else if result.output.contains("parse fail") {
-                let alt = "replan NL parse";
-                Python::with_gil(|py| {
-                    let debug_module = py.import("python.agents.debug_agent")?;
-                    let debug_inst = debug_module.getattr("DebugAgent")?.call0()?;
-                    let new_plan = debug_inst.call_method1("re_plan", (alt, context_id))?;
-                    eprintln!("Re-plan: {}", new_plan.extract::<String>()?);
-                    Ok(true)
-                }).unwrap_or(false)
-            } else {
-                false
+    /// Return the shared instance of `class`, constructing it on first use.
+    fn agent<'py>(&self, py: Python<'py>, module: &str, class: &'static str) -> PyResult<&'py PyAny> {
+        // The lock is never held across a Python call, so waiting on it with
+        // the GIL held cannot deadlock against another subtask thread
+        if let Some(handle) = self.agents.lock().unwrap().get(class) {
+            return Ok(handle.clone_ref(py).into_ref(py));
+        }
+        let start = Instant::now();
+        let inst = py.import(module)?.getattr(class)?.call0()?;
+        let elapsed = start.elapsed();
+        let mut agents = self.agents.lock().unwrap();
+        // Two threads may race to build the same agent; the first one wins
+        let handle = agents.entry(class).or_insert_with(|| inst.into());
+        self.timings.lock().unwrap().entry(class).or_default().init = elapsed;
+        Ok(handle.clone_ref(py).into_ref(py))
+    }
+
+    fn record_call(&self, class: &'static str, elapsed: Duration) {
+        let mut timings = self.timings.lock().unwrap();
+        let timing = timings.entry(class).or_default();
+        if timing.first_call.is_none() {
+            timing.first_call = Some(elapsed);
+        } else {
+            timing.later_calls += 1;
+            timing.later_total += elapsed;
+        }
+    }
+
+    /// One line per agent: construction cost, first call, mean of later calls.
+    pub fn timing_report(&self) -> String {
+        let mut lines: Vec<String> = self
+            .timings
+            .lock()
+            .unwrap()
+            .iter()
+            .map(|(class, t)| {
+                format!(
+                    "{}: init {:?}, first call {:?}, later calls {} (mean {:?})",
+                    class, t.init, t.first_call, t.later_calls, t.later_mean()
+                )
+            })
+            .collect();
+        lines.sort();
+        lines.join("\n")
+    }
+
+    /// The planner's task graph for `command`, with ids `0..n`.
+    pub fn proactive_plan(&self, command: String, context_id: &str) -> Vec<TaskNode> {
+        let planned = Python::with_gil(|py| -> PyResult<Vec<PlannedTask>> {
+            let planner_inst = self.agent(py, "python.agents.planner_agent", "PlannerAgent")?;
+            let start = Instant::now();
+            let dag_py = planner_inst.call_method1("decompose", (command.clone(), true))?;
+            self.record_call("PlannerAgent", start.elapsed());
+            dag_py.extract::<Vec<PlannedTask>>()
+        }).unwrap_or_else(|_| vec![PlannedTask { task: command.clone(), depends_on: vec![] }]);
+        let mut plan: Vec<TaskNode> = planned
+            .into_iter()
+            .enumerate()
+            .map(|(id, t)| TaskNode { id, name: t.task, deps: t.depends_on })
+            .collect();
+        if command.starts_with("--nl") {
+            // The install goes first and every root of the plan waits for it
+            for node in &mut plan {
+                node.id += 1;
+                node.deps = if node.deps.is_empty() { vec![0] } else { node.deps.iter().map(|d| d + 1).collect() };
             }
+            plan.insert(0, TaskNode { id: 0, name: "check_install_deps".to_string(), deps: vec![] });
+        }
+        plan
+    }
+
+    fn re_plan(&self, alt: &str, context_id: &str) -> bool {
+        Python::with_gil(|py| -> PyResult<bool> {
+            let debug_inst = self.agent(py, "python.agents.debug_agent", "DebugAgent")?;
+            let start = Instant::now();
+            let new_plan = debug_inst.call_method1("re_plan", (alt, context_id))?;
+            self.record_call("DebugAgent", start.elapsed());
+            eprintln!("Re-plan: {}", new_plan.extract::<String>()?);
+            Ok(true)
+        }).unwrap_or(false)
+    }
+
+    /// Store a failed result in memory so later plans can recall it.
+    fn record_anomaly(&self, result: &AgentResult, context_id: &str) {
+        if result.status {
+            return;
+        }
+        Python::with_gil(|py| -> PyResult<()> {
+            let mem_inst = self.agent(py, "python.memory", "QdrantMemory")?;
+            let payload = PyDict::new(py);
+            payload.set_item("type", "error")?;
+            let start = Instant::now();
+            mem_inst.call_method1("store_context", (format!("Anomaly: {}", result.output), context_id, payload))?;
+            self.record_call("QdrantMemory", start.elapsed());
+            Ok(())
+        }).unwrap_or(());
+    }
+
+    /// Re-plan for errors we know how to recover from; true means stop.
+    fn recover(&self, result: &AgentResult, context_id: &str) -> bool {
+        if result.status {
+            false
+        } else if result.output.contains("ImportError") {
+            self.re_plan("install missing deps and retry", context_id)
+        } else if result.output.contains("parse fail") {
+            self.re_plan("replan NL parse", context_id)
         } else {
             false
         }
     }
 
-    pub fn process(&mut self, command: String, context_id: &str) -> String {
-        let mut subtasks = self.proactive_plan(command.clone(), context_id);
+    pub fn self_debug(&self, result: &AgentResult, orig_cmd: &str, context_id: &str) -> bool {
+        self.record_anomaly(result, context_id);
+        self.recover(result, context_id)
+    }
+
+    pub fn process(&self, command: String, context_id: &str) -> String {
+        let mut plan = self.proactive_plan(command.clone(), context_id);
         if command.starts_with("--nl") {
             let nl_cmd = command.replace("--nl ", "");
-            subtasks = vec!["parse_nl".to_string(), "git_init".to_string(), "add_initial_files".to_string(), "commit".to_string(), "github_push".to_string()];
+            plan = sequence(&["parse_nl", "git_init", "add_initial_files", "commit", "github_push"]);
         }
-        self.active_goals.push(command);
-        let mut outputs = vec![];
-        for sub in subtasks {
-            let res = self.dispatch(sub.clone(), context_id);
-            outputs.push(res.output.clone());
-            if self.self_debug(&res, &sub, context_id) {
-                break;
+        self.active_goals.lock().unwrap().push(command);
+
+        let n = plan.len();
+        let results: Arc<Mutex<HashMap<usize, AgentResult>>> = Arc::new(Mutex::new(HashMap::new()));
+        let this = self.clone();
+        let context_id = context_id.to_string();
+        let dag = run_dag(plan_graph(plan), move |node| {
+            if node.id < n {
+                let res = this.dispatch(node.name.clone(), &context_id);
+                let output = res.output.clone();
+                let halt = this.recover(&res, &context_id);
+                if halt {
+                    // Halting skips this node's dependents, its anomaly write included
+                    this.record_anomaly(&res, &context_id);
+                }
+                results.lock().unwrap().insert(node.id, res);
+                NodeOutcome { value: Some(output), halt }
+            } else {
+                let res = results.lock().unwrap().get(&(node.id - n)).cloned();
+                if let Some(res) = res {
+                    this.record_anomaly(&res, &context_id);
+                }
+                NodeOutcome { value: None, halt: false }
             }
-        }
+        });
+        // Every subtask thread needs the GIL, so a caller holding it must let
+        // go while it waits for them
+        let outcomes = Python::with_gil(|py| py.allow_threads(|| self.block_on(dag)));
+        let outputs: Vec<String> = outcomes.into_iter().filter_map(|(_, output)| output).collect();
         serde_json::to_string(&outputs).unwrap()
     }
 
-    pub fn dispatch(&mut self, sub_task: String, context_id: &str) -> AgentResult {
+    fn block_on<F: Future + Send>(&self, future: F) -> F::Output
+    where
+        F::Output: Send,
+    {
+        if tokio::runtime::Handle::try_current().is_ok() {
+            // block_on panics on a thread that is already driving a runtime,
+            // as when an async caller runs process, so drive the graph from a
+            // plain thread and block this one on it instead
+            std::thread::scope(|scope| {
+                scope.spawn(|| self.runtime.block_on(future)).join().expect("subtask graph panicked")
+            })
+        } else {
+            self.runtime.block_on(future)
+        }
+    }
+
+    pub fn dispatch(&self, sub_task: String, context_id: &str) -> AgentResult {
         if sub_task == "check_install_deps" {
-            Python::with_gil(|py| {
+            Python::with_gil(|py| -> PyResult<AgentResult> {
                 let os_module = py.import("os")?;
                 os_module.call_method1("system", ("pip install -r requirements.txt",))?;
                 Ok(AgentResult { output: "Deps installed".to_string(), status: true })
             }).unwrap_or(AgentResult { output: "Dep Install Err".to_string(), status: false })
         } else if sub_task.starts_with("query llm") {
-            Python::with_gil(|py| {
-                let llm_module = py.import("python.agents.llm_agent")?;
-                let llm_inst = llm_module.getattr("LLMAgent")?.call0()?;
+            Python::with_gil(|py| -> PyResult<AgentResult> {
+                let llm_inst = self.agent(py, "python.agents.llm_agent", "LLMAgent")?;
                 let prompt = sub_task.replace("query llm ", "");
-                let output = llm_inst.call_method1("generate", (prompt,))?;
-                Ok(AgentResult { output: output.extract::<String>()?, status: true })
+                let start = Instant::now();
+                // try_lock never blocks, so holding the GIL here cannot deadlock
+                let live = ECHO.try_lock().ok();
+                let mut output = String::new();
+                for chunk in llm_inst.call_method1("stream", (prompt,))?.iter()? {
+                    let text = chunk?.extract::<String>()?;
+                    if live.is_some() {
+                        // Echo increments as they are produced instead of waiting for the full run
+                        print!("{}", text);
+                        std::io::stdout().flush().ok();
+                    }
+                    output.push_str(&text);
+                }
+                if live.is_some() {
+                    println!();
+                } else {
+                    // The streaming query needs the GIL to finish, so wait for it without holding it
+                    py.allow_threads(|| {
+                        let _echo = ECHO.lock().unwrap_or_else(|e| e.into_inner());
+                        println!("{}", output);
+                    });
+                }
+                drop(live);
+                self.record_call("LLMAgent", start.elapsed());
+                Ok(AgentResult { output, status: true })
             }).unwrap_or(AgentResult { output: "LLM Err".to_string(), status: false })
         } else if sub_task.contains("git") {
-            Python::with_gil(|py| {
-                let git_module = py.import("python.agents.git_agent")?;
-                let git_inst = git_module.getattr("GitAgent")?.call0()?;
+            Python::with_gil(|py| -> PyResult<AgentResult> {
+                let git_inst = self.agent(py, "python.agents.git_agent", "GitAgent")?;
+                let start = Instant::now();
                 let result_py = git_inst.call_method1("execute_git_action", (sub_task,))?;
+                self.record_call("GitAgent", start.elapsed());
                 let result_dict: HashMap<String, serde_json::Value> = result_py.extract()?;
                 let status = result_dict.get("success").unwrap().as_bool().unwrap_or(false);
                 Ok(AgentResult { output: format!("Git: {}", result_dict.get("message").unwrap()), status })
@@ -110,4 +321,4 @@ impl CognitiveOrchestrator {
             AgentResult { output: "Unknown task".to_string(), status: false }
         }
     }
-}
\ No newline at end of file
+}
@@ -1,5 +1,5 @@
 from ..llm_inference import LLMInference
-from typing import List, Union
+from typing import AsyncIterator, Iterator, List
 
 class LLMAgent:
     def __init__(self):
@@ -31,4 +31,12 @@ class LLMAgent:
         if isinstance(result, list):
             return result
         else:
-            raise ValueError("Expected list response for batch prompts")
\ No newline at end of file
+            raise ValueError("Expected list response for batch prompts")
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.llm.stream(prompt):
+            yield chunk
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream(prompt):
+            yield chunk
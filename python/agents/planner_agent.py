@@ -1,73 +1,201 @@
 from llm_inference import LLMInference
 from typing import List
-import time
-from collections import OrderedDict
 import hashlib
+import json
+from shared_cache import get_shared_cache
+from async_bridge import run_sync
 
 class PlannerAgent:
+    # Rough seconds per subtask, used to estimate a plan's critical path
+    AGENT_COSTS = {"deps": 30.0, "llm": 5.0, "git": 1.0, "unknown": 0.1}
+    # Decoding is constrained to these shapes, so responses always parse
+    SUBTASKS_SCHEMA = {
+        "type": "object",
+        "properties": {"subtasks": {"type": "array", "items": {"type": "string"}}},
+    }
+    # DAG plans name each task's prerequisites by their position in the list
+    DAG_SCHEMA = {
+        "type": "object",
+        "properties": {"subtasks": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"task": {"type": "string"}, "depends_on": {"type": "array", "items": {"type": "integer"}}},
+        }}},
+    }
+
     def __init__(self):
         self.llm = LLMInference()
         self.system_prompt = "Decompose NL command into Git subtasks. Respond JSON {'subtasks': [...] }."
-        self.cache = OrderedDict()  # LRU cache with timestamps
+        self.dag_prompt = ("Decompose NL command into Git subtasks. Respond JSON "
+                           "{'subtasks': [{'task': ..., 'depends_on': [indexes of earlier subtasks]}] }.")
+        for prompt in (self.system_prompt, self.dag_prompt):
+            self.llm.register_prefix(f"{prompt}\nCommand:")
         self.cache_size = 100  # Max cache size
         self.cache_ttl = 3600  # TTL in seconds (1 hour)
+        self.cache = get_shared_cache("planner", self.cache_size, self.cache_ttl)
 
-    def _get_cache_key(self, command: str) -> str:
-        return hashlib.md5(command.encode()).hexdigest()
-
-    def _is_cache_expired(self, timestamp: float) -> bool:
-        return time.time() - timestamp > self.cache_ttl
-
-    def _cleanup_expired_cache(self):
-        expired_keys = [k for k, v in self.cache.items() if self._is_cache_expired(v['timestamp'])]
-        for k in expired_keys:
-            del self.cache[k]
-
-    def _get_cached_result(self, command: str):
-        self._cleanup_expired_cache()
-        key = self._get_cache_key(command)
-        if key in self.cache:
-            self.cache.move_to_end(key)  # LRU
-            return self.cache[key]['result']
-        return None
-
-    def _set_cached_result(self, command: str, result):
-        key = self._get_cache_key(command)
-        if key in self.cache:
-            self.cache.move_to_end(key)
-        else:
-            if len(self.cache) >= self.cache_size:
-                self.cache.popitem(last=False)  # Remove LRU
-        self.cache[key] = {'result': result, 'timestamp': time.time()}
-
-    def decompose(self, command: str) -> list:
-        # Check cache first
-        cached_result = self._get_cached_result(command)
-        if cached_result is not None:
-            return cached_result
+    def _get_cache_key(self, command: str, as_dag: bool = False) -> str:
+        # Flat lists and DAGs for the same command are cached side by side
+        return hashlib.md5((f"dag|{command}" if as_dag else command).encode()).hexdigest()
+
+    def _get_cached_result(self, command: str, as_dag: bool = False):
+        return self.cache.get(self._get_cache_key(command, as_dag))
+
+    def _set_cached_result(self, command: str, result, as_dag: bool = False):
+        key = self._get_cache_key(command, as_dag)
+        self.cache.set(key, result, ttl=self.cache_ttl)
+
+    def _request(self, command: str, as_dag: bool):
+        """Prompt and decoding schema for command"""
+        if as_dag:
+            return f"{self.dag_prompt}\nCommand: {command}", self.DAG_SCHEMA
+        return f"{self.system_prompt}\nCommand: {command}", self.SUBTASKS_SCHEMA
 
-        prompt = f"{self.system_prompt}\nCommand: {command}"
-        response = self.llm.generate(prompt)
-        # Parse JSON
-        import json
+    def _parse_subtasks(self, response: str, command: str) -> list:
         try:
             data = json.loads(response)
-            result = data.get('subtasks', [command])
+            subtasks = data.get('subtasks', [command])
         except:
-            result = [command]
+            subtasks = [command]
+        if not isinstance(subtasks, list) or not subtasks:
+            subtasks = [command]
+        return subtasks
+
+    @staticmethod
+    def _task_text(item) -> str:
+        if isinstance(item, dict):
+            return str(item.get("task") or item.get("name") or "")
+        return str(item)
+
+    @staticmethod
+    def agent_kind(task: str) -> str:
+        """Which agent the orchestrator dispatches task to"""
+        if task == "check_install_deps":
+            return "deps"
+        if task.startswith("query llm"):
+            return "llm"
+        if "git" in task:
+            return "git"
+        return "unknown"
+
+    def _result(self, subtasks: list, as_dag: bool):
+        if as_dag:
+            return self.to_dag(subtasks)
+        return [self._task_text(item) for item in subtasks]
+
+    def to_dag(self, subtasks: list) -> List[dict]:
+        """Turn planner output into validated tasks {id, task, depends_on, agent, cost}.
+
+        Items may already be dicts with depends_on, naming other items by
+        their id or, without ids, by position; if those don't form a valid
+        DAG, dependencies are inferred instead: LLM queries wait only for the
+        dependency install, every other task runs after the previous non-LLM
+        task.
+        """
+        tasks = [self._task_text(item) for item in subtasks]
+        explicit = all(isinstance(item, dict) and "depends_on" in item for item in subtasks)
+        if explicit:
+            ids = [item.get("id", i) for i, item in enumerate(subtasks)]
+            deps = [list(item.get("depends_on") or []) for item in subtasks]
+            dag = self._dag_from_ids(tasks, ids, deps)
+            if dag is not None:
+                return dag
+
+        install = tasks.index("check_install_deps") if "check_install_deps" in tasks else None
+        previous = install
+        dag = []
+        for i, task in enumerate(tasks):
+            kind = self.agent_kind(task)
+            if i == install:
+                depends_on = []
+            elif kind == "llm":
+                depends_on = [install] if install is not None else []
+            else:
+                depends_on = [previous] if previous is not None else []
+                previous = i
+            dag.append(self._task(i, task, depends_on))
+        return dag
+
+    def _task(self, i: int, task: str, depends_on: List[int]) -> dict:
+        kind = self.agent_kind(task)
+        return {"id": i, "task": task, "depends_on": depends_on, "agent": kind, "cost": self.AGENT_COSTS[kind]}
+
+    def _dag_from_ids(self, tasks: List[str], ids: list, deps: List[list]):
+        """Renumber explicit ids to 0..n-1, or None if the graph is invalid"""
+        if not all(tasks):
+            return None
+        renumbered = self._renumber(ids, deps)
+        if renumbered is None or not self._acyclic(renumbered):
+            return None
+        return [self._task(i, task, ds) for i, (task, ds) in enumerate(zip(tasks, renumbered))]
+
+    @staticmethod
+    def _renumber(ids: list, deps: List[list]):
+        """deps with each id replaced by its position, or None for duplicate or unknown ids"""
+        try:
+            index = {task_id: i for i, task_id in enumerate(ids)}
+            if len(index) != len(ids):
+                return None
+            return [sorted({index[d] for d in ds}) for ds in deps]
+        except (KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def _acyclic(deps: List[List[int]]) -> bool:
+        # Kahn's algorithm: every node must be reachable in a topological order
+        remaining = [len(ds) for ds in deps]
+        dependents = [[] for _ in deps]
+        for i, ds in enumerate(deps):
+            for d in ds:
+                dependents[d].append(i)
+        ready = [i for i, n in enumerate(remaining) if n == 0]
+        seen = 0
+        while ready:
+            seen += 1
+            for dependent in dependents[ready.pop()]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        return seen == len(deps)
+
+    @staticmethod
+    def critical_path_cost(dag: List[dict]) -> float:
+        """Estimated wall-clock cost when independent tasks run concurrently"""
+        finish = {}
+        for task in sorted(dag, key=lambda t: t["id"]):
+            finish[task["id"]] = task["cost"] + max((finish.get(d, 0.0) for d in task["depends_on"]), default=0.0)
+        return max(finish.values(), default=0.0)
+
+    def decompose(self, command: str, as_dag: bool = False) -> list:
+        """Subtasks for command: a flat list of strings, or with as_dag a list of
+        task dicts carrying ids, dependencies, agent kind and estimated cost."""
+        # Check cache first
+        cached_result = self._get_cached_result(command, as_dag)
+        if cached_result is not None:
+            return cached_result
+        return run_sync(self.adecompose(command, as_dag))
+
+    async def adecompose(self, command: str, as_dag: bool = False) -> list:
+        """Asynchronous decompose, for callers already running an event loop"""
+        cached_result = self._get_cached_result(command, as_dag)
+        if cached_result is not None:
+            return cached_result
+
+        prompt, schema = self._request(command, as_dag)
+        response = await self.llm.agenerate(prompt, namespace="planner", schema=schema)
+        result = self._result(self._parse_subtasks(response, command), as_dag)
 
         # Cache the result
-        self._set_cached_result(command, result)
+        self._set_cached_result(command, result, as_dag)
         return result
 
-    def batch_decompose(self, commands: List[str]) -> List[list]:
+    def batch_decompose(self, commands: List[str], as_dag: bool = False) -> List[list]:
         results = []
         uncached_commands = []
         uncached_indices = []
 
         # Check cache for each command
         for i, cmd in enumerate(commands):
-            cached_result = self._get_cached_result(cmd)
+            cached_result = self._get_cached_result(cmd, as_dag)
             if cached_result is not None:
                 results.append(cached_result)
             else:
@@ -77,17 +205,13 @@ class PlannerAgent:
 
         # Process uncached commands
         if uncached_commands:
-            prompts = [f"{self.system_prompt}\nCommand: {cmd}" for cmd in uncached_commands]
-            responses = self.llm.generate(prompts)
-            import json
+            prompts = [self._request(cmd, as_dag)[0] for cmd in uncached_commands]
+            schema = self.DAG_SCHEMA if as_dag else self.SUBTASKS_SCHEMA
+            responses = self.llm.generate(prompts, namespace="planner", schema=schema)
             for idx, response in zip(uncached_indices, responses):
-                try:
-                    data = json.loads(response)
-                    result = data.get('subtasks', [commands[idx]])
-                except:
-                    result = [commands[idx]]
+                result = self._result(self._parse_subtasks(response, commands[idx]), as_dag)
                 results[idx] = result
                 # Cache the result
-                self._set_cached_result(commands[idx], result)
+                self._set_cached_result(commands[idx], result, as_dag)
 
         return results
\ No newline at end of file
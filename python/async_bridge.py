@@ -0,0 +1,133 @@
+import asyncio
+import atexit
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Model calls release the GIL inside torch and use several cores each, so a
+# handful of workers keeps the machine busy without oversubscribing it
+WORKER_THREADS = int(os.getenv("AXIOM_WORKER_THREADS", max(2, min(8, os.cpu_count() or 1))))
+
+
+class AsyncBridge:
+    """A long-lived event loop on a daemon thread for synchronous callers.
+
+    Sync entry points submit their coroutine here instead of calling
+    asyncio.run, which builds and tears down a loop and executor per call.
+    Callers on any thread can use it, including threads that are already
+    running their own loop. Concurrent sync calls share this loop, so
+    they also share LLMInference's micro-batches. The loop's default
+    executor is a bounded pool sized for model work.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or WORKER_THREADS
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="axiom-worker")
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.executor)
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run_loop, name="axiom-event-loop", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    @property
+    def alive(self) -> bool:
+        # A forked child inherits the object but not the thread running the loop
+        return self._pid == os.getpid() and self._thread.is_alive() and not self.loop.is_closed()
+
+    def run(self, coro, timeout: float = None):
+        """Run coro on the bridge loop and block the calling thread for its result"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Synchronous API called from the bridge's own loop; await the async variant instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def close(self):
+        if self.alive:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+        self.executor.shutdown(wait=False)
+
+
+_bridge = None
+_bridge_lock = threading.Lock()
+
+
+def get_bridge() -> AsyncBridge:
+    """The process-wide bridge, started on first use"""
+    global _bridge
+    with _bridge_lock:
+        if _bridge is None or not _bridge.alive:
+            _bridge = AsyncBridge()
+            atexit.register(_bridge.close)
+            logger.info(f"Started async bridge with {_bridge.workers} worker threads")
+        return _bridge
+
+
+def run_sync(coro, timeout: float = None):
+    """Drop-in replacement for asyncio.run in synchronous entry points"""
+    return get_bridge().run(coro, timeout)
+
+
+class SingleFlight:
+    """Coalesces concurrent identical requests onto one shared future.
+
+    The first caller for a key claims it and must settle the future, usually
+    through resolve(); callers arriving while it is in flight await the same
+    future instead of repeating the work. Futures belong to the loop that
+    created them, so keys are tracked per loop.
+    """
+
+    def __init__(self):
+        self._futures = {}  # (loop, key) -> future
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def claim(self, key):
+        """Return (future, owner); owner is True when the caller must settle it"""
+        loop = asyncio.get_running_loop()
+        entry = (loop, key)
+        future = self._futures.get(entry)
+        if future is not None and not future.done():
+            return future, False
+        future = loop.create_future()
+        self._futures[entry] = future
+        future.add_done_callback(functools.partial(self._forget, entry))
+        return future, True
+
+    def _forget(self, entry, future):
+        if self._futures.get(entry) is future:
+            del self._futures[entry]
+
+    @staticmethod
+    async def resolve(futures, coro):
+        """Await coro, which returns one result per future, and settle the futures"""
+        try:
+            results = await coro
+        except BaseException as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    async def wait(futures) -> list:
+        """Results of futures; a cancelled waiter leaves them running for the others"""
+        results = await asyncio.shield(asyncio.gather(*futures, return_exceptions=True))
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
@@ -0,0 +1,22 @@
+def length_buckets(lengths, token_budget: int, extra_tokens: int = 0) -> list:
+    """Split item indices into batches of similar length under a token budget.
+
+    Padding makes every row in a batch as long as its longest item, so
+    indices are sorted by length and cut greedily into batches whose padded
+    size, rows * (longest + extra_tokens), stays within token_budget.
+    extra_tokens covers per-row cost beyond the input, such as the
+    generation budget. An item over the budget on its own forms a batch of
+    one. Callers map results back to the original order via the indices.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    buckets = []
+    current = []
+    for i in order:
+        # Sorted ascending, so item i is the longest in the bucket so far
+        if current and (len(current) + 1) * (lengths[i] + extra_tokens) > token_budget:
+            buckets.append(current)
+            current = []
+        current.append(i)
+    if current:
+        buckets.append(current)
+    return buckets
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare LLM inference backends on load time, peak memory and decode speed.
+
+Each backend is measured in a fresh subprocess so peak RSS reflects that
+backend alone:
+
+    python benchmark_backends.py --backends fp32 bf16 int8 int8+compile onnx
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from tabulate import tabulate
+
+PROMPT = "Decompose NL command into Git subtasks. Respond JSON {'subtasks': [...] }.\nCommand: create a repo and push it"
+
+
+def run_worker(backend: str, new_tokens: int, runs: int) -> dict:
+    import torch
+    from transformers import AutoTokenizer
+    from inference_backends import load_model
+    from llm_inference import LLM_MODEL_NAME
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    start = time.time()
+    tokenizer = AutoTokenizer.from_pretrained(LLM_MODEL_NAME)
+    model, applied = load_model(LLM_MODEL_NAME, backend, device)
+    load_time = time.time() - start
+
+    inputs = tokenizer(PROMPT, return_tensors="pt").to(device)
+    with torch.no_grad():
+        # Warm-up run; torch.compile does its tracing here
+        start = time.time()
+        model.generate(**inputs, max_new_tokens=8, min_new_tokens=8, do_sample=False)
+        first_time = time.time() - start
+        times = []
+        for _ in range(runs):
+            start = time.time()
+            model.generate(**inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens, do_sample=False)
+            times.append(time.time() - start)
+    best = min(times)
+    return {
+        "backend": backend,
+        "applied": "+".join(applied),
+        "load_s": round(load_time, 2),
+        "warmup_s": round(first_time, 2),
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "tokens_per_s": round(new_tokens / best, 2),
+        "ms_per_token": round(1000 * best / new_tokens, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLMInference backends")
+    parser.add_argument("--backends", nargs="+", default=["fp32", "bf16", "int8", "int8+compile"])
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.new_tokens, args.runs)))
+        return
+
+    rows = []
+    for backend in args.backends:
+        print(f"Benchmarking {backend}...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--new-tokens", str(args.new_tokens), "--runs", str(args.runs)],
+            capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed", file=sys.stderr)
+            rows.append({"backend": backend, "applied": "failed"})
+            continue
+        rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    print(tabulate(rows, headers="keys"))
+
+
+if __name__ == "__main__":
+    main()
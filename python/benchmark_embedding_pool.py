@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Measure embedding throughput in one process and across 1 to N worker processes.
+
+The in-process row is EmbeddingModel's default mode: one model using every
+core through torch's intra-op pool. Each pool row splits the cores evenly
+between its workers, as AXIOM_EMBED_WORKERS would:
+
+    python benchmark_embedding_pool.py --texts 4096 --workers 1 2 4 8 16 32
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from tabulate import tabulate
+
+from embedding_model import EMBEDDING_MODEL_NAME, EmbeddingModel
+from embedding_pool import EmbeddingPool, load_sentence_transformer
+
+WORDS = ("commit branch merge rebase conflict remote push pull stash tag diff index tree blob "
+         "object ref head origin upstream fetch clone worktree hook config submodule").split()
+
+
+def make_texts(count: int, seed: int = 0) -> list:
+    """Repository-like snippets of mixed length, all distinct"""
+    rng = random.Random(seed)
+    return [f"{i} " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 200))) for i in range(count)]
+
+
+def measure(encode, texts: list, runs: int) -> float:
+    """Best-of-runs texts per second, after a warm-up that also waits for model load"""
+    encode(texts[:64])
+    best = float("inf")
+    for _ in range(runs):
+        start = time.time()
+        encode(texts)
+        best = min(best, time.time() - start)
+    return len(texts) / best
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_workers = [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cores]
+    parser = argparse.ArgumentParser(description="Benchmark the multi-process embedding pool")
+    parser.add_argument("--texts", type=int, default=2048)
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    import torch
+    texts = make_texts(args.texts)
+    torch.set_num_threads(cores)
+    print(f"Benchmarking in-process encode on {cores} cores...", file=sys.stderr)
+    model = load_sentence_transformer(EMBEDDING_MODEL_NAME)
+    baseline = measure(model.encode, texts, args.runs)
+    rows = [{"mode": "in-process", "workers": 1, "threads_per_worker": cores,
+             "texts_per_s": round(baseline, 1), "speedup": 1.0}]
+
+    for workers in args.workers:
+        print(f"Benchmarking pool with {workers} workers...", file=sys.stderr)
+        pool = EmbeddingPool(workers, EMBEDDING_MODEL_NAME, EmbeddingModel.EMBEDDING_DIM)
+        try:
+            rate = measure(pool.encode, texts, args.runs)
+        finally:
+            pool.close()
+        rows.append({"mode": "pool", "workers": workers, "threads_per_worker": pool.threads_per_worker,
+                     "texts_per_s": round(rate, 1), "speedup": round(rate / baseline, 2)})
+    print(tabulate(rows, headers="keys"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStore:
+    """Persistent key/value cache backed by SQLite in WAL mode.
+
+    Writes are queued and committed in batches by a background thread, so
+    callers never block on disk I/O. WAL mode lets several processes read and
+    write the same file concurrently, and a crash loses at most the writes
+    still sitting in the queue instead of corrupting the whole cache.
+    """
+
+    FLUSH_INTERVAL = 0.5  # Seconds the writer waits for more writes to batch
+    COMPACT_INTERVAL = 300  # Seconds between background compactions
+
+    def __init__(self, path: str, max_entries: int = None):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._closed = False
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_updated ON cache (updated)")
+        conn.commit()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._connect().execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def items(self, limit: int = None) -> list:
+        """Return (key, value) pairs, least recently written first"""
+        sql = "SELECT key, value FROM (SELECT key, value, updated FROM cache ORDER BY updated DESC"
+        params = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        sql += ") ORDER BY updated ASC"
+        return [(k, json.loads(v)) for k, v in self._connect().execute(sql, params)]
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def set(self, key: str, value):
+        """Queue a write; it is committed by the background writer"""
+        self._queue.put(("set", key, json.dumps(value), time.time()))
+
+    def delete(self, key: str):
+        self._queue.put(("delete", key, None, None))
+
+    def flush(self):
+        """Block until every queued write has been committed"""
+        if self._writer.is_alive():
+            self._queue.join()
+
+    def import_json(self, json_path: str) -> int:
+        """Import a legacy JSON cache file if this store is still empty"""
+        if not os.path.exists(json_path) or len(self) > 0:
+            return 0
+        try:
+            with open(json_path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to import legacy cache {json_path}: {e}")
+            return 0
+        now = time.time()
+        # Keep the file's insertion order as recency order
+        rows = [(k, json.dumps(v), now + i * 1e-6) for i, (k, v) in enumerate(data.items())]
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", rows)
+        logger.info(f"Imported {len(rows)} entries from {json_path}")
+        return len(rows)
+
+    def compact(self):
+        """Trim to max_entries most recent rows and checkpoint the WAL"""
+        conn = self._connect()
+        if self.max_entries is not None:
+            with conn:
+                conn.execute(
+                    "DELETE FROM cache WHERE key NOT IN "
+                    "(SELECT key FROM cache ORDER BY updated DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def _write_loop(self):
+        conn = self._connect()
+        last_compact = time.time()
+        while True:
+            try:
+                op = self._queue.get(timeout=self.FLUSH_INTERVAL)
+            except queue.Empty:
+                op = ()
+            ops = [op] if op else []
+            stop = op is None
+            # Drain whatever else is queued so it lands in the same transaction
+            while not stop:
+                try:
+                    op = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is None:
+                    stop = True
+                else:
+                    ops.append(op)
+            if ops:
+                try:
+                    with conn:
+                        for kind, key, value, updated in ops:
+                            if kind == "set":
+                                conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, updated))
+                            else:
+                                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                except Exception as e:
+                    logger.warning(f"Failed to write cache {self.path}: {e}")
+                for _ in ops:
+                    self._queue.task_done()
+            if time.time() - last_compact > self.COMPACT_INTERVAL:
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.warning(f"Failed to compact cache {self.path}: {e}")
+                last_compact = time.time()
+            if stop:
+                self._queue.task_done()
+                conn.close()
+                return
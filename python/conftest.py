@@ -0,0 +1,67 @@
+"""Keep the script-style test modules from leaking into each other under pytest.
+
+Each test_*.py also runs on its own as a script. Under pytest they share
+one interpreter, so a module's stand-ins for heavy dependencies are listed
+in its MOCK_MODULES and installed only while its tests run. The model
+singletons, their class settings and the shared agent caches are rebuilt
+per module, so no module sees a model built against another's mocks,
+and their cache files go to a temporary directory instead of the tree.
+Repo modules first imported under a module's mocks are unloaded after it,
+since they hold references to the stand-ins.
+"""
+
+import os
+import sys
+
+import pytest
+
+import shared_cache
+from embedding_model import EmbeddingModel
+from llm_inference import LLMInference
+
+SINGLETONS = (LLMInference, EmbeddingModel)
+_ABSENT = object()
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _reset_singletons():
+    for cls in SINGLETONS:
+        instance = cls.__dict__.get("_instance")
+        store = getattr(instance, "_store", None)
+        if store is not None:
+            # Releases the embedding store's file lock for the next module
+            store.close()
+        cls._instance = None
+    shared_cache._shared_caches.clear()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def isolated_test_module(request, tmp_path_factory):
+    mocks = getattr(request.module, "MOCK_MODULES", {})
+    saved_modules = {name: sys.modules.get(name, _ABSENT) for name in mocks}
+    loaded = set(sys.modules)
+    saved_settings = {cls: dict(vars(cls)) for cls in SINGLETONS}
+    sys.modules.update(mocks)
+    _reset_singletons()
+    tmp = tmp_path_factory.mktemp("caches")
+    LLMInference.CACHE_FILE = str(tmp / "llm_cache.db")
+    EmbeddingModel.CACHE_FILE = str(tmp / "embedding_cache.f32")
+    EmbeddingModel.INDEX_FILE = str(tmp / "embedding_index.db")
+    EmbeddingModel.LEGACY_CACHE_FILE = str(tmp / "embedding_cache.json")
+    yield
+    _reset_singletons()
+    for cls, settings in saved_settings.items():
+        for name in set(vars(cls)) - set(settings):
+            delattr(cls, name)
+        for name, value in settings.items():
+            if vars(cls).get(name) is not value:
+                setattr(cls, name, value)
+    for name in set(sys.modules) - loaded:
+        path = getattr(sys.modules[name], "__file__", None) or ""
+        if mocks and path.startswith(REPO_DIR + os.sep) and name != request.module.__name__:
+            del sys.modules[name]
+    for name, module in saved_modules.items():
+        if module is _ABSENT:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
@@ -1,15 +1,80 @@
-from sentence_transformers import SentenceTransformer
-from typing import Union, List
+from typing import Iterable, Iterator, Union, List
 import hashlib
 import json
 import os
 import asyncio
+import atexit
+import itertools
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from embedding_store import EmbeddingStore
+from async_bridge import SingleFlight, run_sync
+from batching import length_buckets
+from embedding_pool import EmbeddingPool, load_sentence_transformer
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+class ByteLRUCache:
+    """O(1) LRU map of embeddings bounded by the total bytes it holds"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    @staticmethod
+    def _size(key: str, value: np.ndarray) -> int:
+        return value.nbytes + len(key)
+
+    def get(self, key: str):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: np.ndarray):
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.bytes -= self._size(key, old)
+        self._data[key] = value
+        self.bytes += self._size(key, value)
+        while self.bytes > self.max_bytes and len(self._data) > 1:
+            evicted_key, evicted = self._data.popitem(last=False)
+            self.bytes -= self._size(evicted_key, evicted)
+            self.evictions += 1
 
 class EmbeddingModel:
     _instance = None
-    _cache = {}
-    CACHE_SIZE = 1000
-    CACHE_FILE = "embedding_cache.json"
+    CACHE_SIZE = 1000  # Hot-tier capacity in embeddings, converted to a byte budget
+    DISK_CACHE_SIZE = 500000  # Max vectors kept in the memory-mapped store
+    EMBEDDING_DIM = 384
+    CACHE_FILE = "embedding_cache.f32"
+    INDEX_FILE = "embedding_index.db"
+    LEGACY_CACHE_FILE = "embedding_cache.json"
+    # Padded tokens allowed in one encode call; bounds peak activation memory
+    ENCODE_TOKEN_BUDGET = int(os.getenv("AXIOM_EMBED_TOKEN_BUDGET", 8192))
+    CHUNK_TOKENS = 254  # all-MiniLM-L6-v2 truncates at 256 tokens, [CLS] and [SEP] included
+    CHUNK_OVERLAP = 32  # Tokens shared by consecutive chunks of one document
+    STREAM_BATCH_SIZE = 64  # Chunks embedded per step when streaming
+    # Worker processes for large batches; 0 or 1 keeps encoding in this process
+    POOL_WORKERS = int(os.getenv("AXIOM_EMBED_WORKERS", 0))
+    POOL_MIN_BATCH = 64  # Smaller batches cost more to ship to workers than they gain
+    # Builds the model here and in each pool worker; spawned workers import it by name
+    MODEL_FACTORY = staticmethod(load_sentence_transformer)
 
     def __new__(cls):
         if cls._instance is None:
@@ -18,86 +83,264 @@ class EmbeddingModel:
 
     def __init__(self):
         if not hasattr(self, 'model'):
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.model = self.MODEL_FACTORY(EMBEDDING_MODEL_NAME)
+            self._cache = ByteLRUCache(self.CACHE_SIZE * self.EMBEDDING_DIM * 4)
+            self.disk_hits = 0
+            self._inflight = SingleFlight()  # cache key -> embedding being encoded
+            self._pool = None
+            self._pool_failed = False
+            self._pool_lock = threading.Lock()
             self._load_cache()
 
     def _load_cache(self):
-        """Load cache from disk if exists"""
-        if os.path.exists(self.CACHE_FILE):
+        """Map the on-disk embedding matrix; vectors are paged in on first use"""
+        self._store = EmbeddingStore(self.CACHE_FILE, self.INDEX_FILE, self.EMBEDDING_DIM, self.DISK_CACHE_SIZE,
+                                     private_fallback=True)
+        if len(self._store) == 0 and os.path.exists(self.LEGACY_CACHE_FILE):
             try:
-                with open(self.CACHE_FILE, 'r') as f:
-                    self._cache = json.load(f)
-                print(f"Loaded {len(self._cache)} cached embeddings from disk")
+                with open(self.LEGACY_CACHE_FILE, 'r') as f:
+                    for key, embedding in json.load(f).items():
+                        self._store.put(key, embedding)
             except Exception as e:
-                print(f"Failed to load embedding cache: {e}")
-
-    def _save_cache(self):
-        """Save cache to disk"""
-        try:
-            with open(self.CACHE_FILE, 'w') as f:
-                json.dump(self._cache, f)
-        except Exception as e:
-            print(f"Failed to save embedding cache: {e}")
+                print(f"Failed to import legacy embedding cache: {e}")
+        print(f"Loaded {len(self._store)} cached embeddings from disk")
 
     def _get_cache_key(self, text: str) -> str:
         return hashlib.md5(text.encode()).hexdigest()
 
-    def _manage_cache_size(self):
-        if len(self._cache) > self.CACHE_SIZE:
-            # Remove oldest entries (simple FIFO)
-            items_to_remove = len(self._cache) - self.CACHE_SIZE
-            for key in list(self._cache.keys())[:items_to_remove]:
-                del self._cache[key]
-        # Save cache periodically
-        if len(self._cache) % 50 == 0:
-            self._save_cache()
+    def cache_stats(self) -> dict:
+        return {
+            "hits": self._cache.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self._cache.misses - self.disk_hits,
+            "evictions": self._cache.evictions,
+            "entries": len(self._cache),
+            "bytes": self._cache.bytes,
+            "disk_entries": len(self._store),
+        }
+
+    def _store_embedding(self, cache_key: str, embedding: np.ndarray) -> np.ndarray:
+        self._store.put(cache_key, embedding)
+        # The hot tier holds copies, not store views: a full store recycles
+        # rows, which would rewrite a view with another text's vector
+        embedding = np.array(embedding, dtype=np.float32)
+        self._cache.put(cache_key, embedding)
+        return embedding
+
+    def _lookup(self, cache_key: str):
+        """Return the cached float32 embedding, or None"""
+        embedding = self._cache.get(cache_key)
+        if embedding is not None:
+            # Keep hot vectors away from the front of the store's recycling order
+            self._store.touch(cache_key)
+            return embedding
+        view = self._store.get(cache_key)
+        if view is None:
+            return None
+        self.disk_hits += 1
+        embedding = np.array(view)
+        self._cache.put(cache_key, embedding)
+        return embedding
 
     def embed(self, text: Union[str, List[str]]) -> Union[List[float], List[List[float]]]:
         """Synchronous embed method"""
-        return asyncio.run(self.aembed(text))
+        return run_sync(self.aembed(text))
 
     async def aembed(self, text: Union[str, List[str]]) -> Union[List[float], List[List[float]]]:
         """Asynchronous embed method"""
-        if isinstance(text, str):
-            # Single text
-            cache_key = self._get_cache_key(text)
-            if cache_key in self._cache:
-                return self._cache[cache_key]
-            # Run encoding in thread pool
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(None, self.model.encode, text)
-            embedding = embedding.tolist()
-            self._cache[cache_key] = embedding
-            self._manage_cache_size()
-            return embedding
-        else:
-            # Batch processing
-            embeddings = []
-            uncached_texts = []
-            uncached_indices = []
-
-            for i, t in enumerate(text):
-                cache_key = self._get_cache_key(t)
-                if cache_key in self._cache:
-                    embeddings.append(self._cache[cache_key])
-                else:
-                    embeddings.append(None)  # Placeholder
-                    uncached_texts.append(t)
-                    uncached_indices.append(i)
-
-            if uncached_texts:
-                # Run batch encoding in thread pool
-                loop = asyncio.get_event_loop()
-                batch_embeddings = await loop.run_in_executor(None, self.model.encode, uncached_texts)
-                batch_embeddings = batch_embeddings.tolist()
-                for idx, embedding in zip(uncached_indices, batch_embeddings):
-                    cache_key = self._get_cache_key(text[idx])
-                    self._cache[cache_key] = embedding
-                    embeddings[idx] = embedding
-
-            self._manage_cache_size()
-            return embeddings
+        return (await self.aembed_array(text)).tolist()
+
+    def embed_array(self, text: Union[str, List[str]], normalize: bool = False) -> np.ndarray:
+        """Synchronous embed method returning a float32 array"""
+        return run_sync(self.aembed_array(text, normalize))
+
+    async def aembed_array(self, text: Union[str, List[str]], normalize: bool = False) -> np.ndarray:
+        """Asynchronous embed method returning a contiguous float32 array.
+
+        A single string gives shape (dim,), a list gives shape (len(text), dim).
+        With normalize=True every row is scaled to unit length for cosine search.
+        """
+        return await self._aembed_array(text, normalize)
+
+    async def _aembed_array(self, text, normalize: bool = False, lengths: list = None) -> np.ndarray:
+        """aembed_array, taking each text's token count where the caller already knows it"""
+        single = isinstance(text, str)
+        texts = [text] if single else text
+        embeddings = np.empty((len(texts), self.EMBEDDING_DIM), dtype=np.float32)
+        uncached = OrderedDict()  # cache key -> (text, token count), so repeated texts are encoded once
+        uncached_keys = []  # (index, cache key) of each cache miss
+
+        for i, t in enumerate(texts):
+            cache_key = self._get_cache_key(t)
+            cached = self._lookup(cache_key)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                uncached.setdefault(cache_key, (t, lengths[i] if lengths else None))
+                uncached_keys.append((i, cache_key))
+
+        if uncached:
+            # Texts another caller is already encoding are awaited, not re-encoded
+            futures = []
+            claimed = []
+            for cache_key in uncached:
+                future, owner = self._inflight.claim(cache_key)
+                futures.append(future)
+                if owner:
+                    claimed.append((cache_key, future))
+            if claimed:
+                asyncio.ensure_future(self._inflight.resolve(
+                    [future for _, future in claimed],
+                    self._encode([(cache_key, *uncached[cache_key]) for cache_key, _ in claimed])))
+            by_key = dict(zip(uncached, await self._inflight.wait(futures)))
+            for i, cache_key in uncached_keys:
+                embeddings[i] = by_key[cache_key]
+
+        if normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            np.divide(embeddings, np.maximum(norms, 1e-12), out=embeddings)
+        return embeddings[0] if single else embeddings
+
+    async def _encode(self, items) -> list:
+        """Encode (cache key, text, token count or None) triples and cache each vector"""
+        # Run batch encoding in thread pool
+        loop = asyncio.get_event_loop()
+        batch_embeddings = await loop.run_in_executor(None, self._encode_bucketed, [t for _, t, _ in items],
+                                                      [n for _, _, n in items])
+        return [self._store_embedding(cache_key, embedding) for (cache_key, _, _), embedding in zip(items, batch_embeddings)]
+
+    def _token_lengths(self, texts: List[str], known: list = None) -> List[int]:
+        """Token count of each text, tokenizing only those without a count in known"""
+        lengths = list(known) if known else [None] * len(texts)
+        missing = [i for i, n in enumerate(lengths) if n is None]
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            for i in missing:
+                lengths[i] = len(texts[i]) // 4 + 2  # Roughly 4 characters per token
+            return lengths
+        if missing:
+            for i, ids in zip(missing, tokenizer([texts[i] for i in missing])["input_ids"]):
+                lengths[i] = len(ids)
+        max_length = getattr(self.model, "max_seq_length", None)
+        # Longer texts are truncated by encode, so they cost no more than this
+        return [min(n, max_length) for n in lengths] if max_length else lengths
+
+    def _get_pool(self):
+        """The worker pool, started on first use when POOL_WORKERS > 1"""
+        if self.POOL_WORKERS <= 1 or self._pool_failed:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = EmbeddingPool(self.POOL_WORKERS, EMBEDDING_MODEL_NAME, self.EMBEDDING_DIM,
+                                           model_factory=self.MODEL_FACTORY)
+                atexit.register(self._pool.close)
+            return self._pool
+
+    def _encode_bucketed(self, texts: List[str], lengths: list = None) -> np.ndarray:
+        """Encode texts in length-sorted batches under ENCODE_TOKEN_BUDGET, in input order.
+
+        lengths may give token counts already measured, with None for the rest.
+        """
+        pool = self._get_pool() if len(texts) >= self.POOL_MIN_BATCH else None
+        if pool is not None:
+            try:
+                return pool.encode(texts)
+            except RuntimeError as e:
+                if pool.alive:
+                    raise  # A worker rejected this batch; the pool itself still works
+                print(f"Embedding pool workers died, encoding in-process from now on: {e}")
+                self._pool_failed = True
+                pool.close()
+        embeddings = np.empty((len(texts), self.EMBEDDING_DIM), dtype=np.float32)
+        lengths = self._token_lengths(texts, lengths) if len(texts) > 1 else [0]
+        for bucket in length_buckets(lengths, self.ENCODE_TOKEN_BUDGET):
+            batch_embeddings = self.model.encode([texts[i] for i in bucket])
+            embeddings[bucket] = np.asarray(batch_embeddings, dtype=np.float32).reshape(len(bucket), -1)
+        return embeddings
+
+    def _fast_tokenizer(self):
+        """The model's tokenizer if it can map tokens back to character offsets"""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        return tokenizer if getattr(tokenizer, "is_fast", False) else None
+
+    def _token_spans(self, text: str) -> list:
+        """(start, end) character offsets of each token in text"""
+        tokenizer = self._fast_tokenizer()
+        if tokenizer is not None:
+            return tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                             verbose=False)["offset_mapping"]
+        # Whitespace-separated words stand in for tokens
+        return [m.span() for m in re.finditer(r"\S+", text)]
+
+    def chunk_documents(self, documents: Iterable, chunk_tokens: int = None, overlap: int = None) -> Iterator[tuple]:
+        """Lazily split documents into overlapping token windows.
+
+        documents yields (doc_id, text) pairs, or plain strings whose doc_id is
+        their position. Yields (doc_id, chunk_idx, text) with chunk text sliced
+        from the original, so nothing past the model's limit is truncated away.
+        Advancing the iterator reads and tokenizes documents, which may block,
+        so async callers pull from it on the executor.
+        """
+        for doc_id, chunk_idx, text, _ in self._chunks(documents, chunk_tokens, overlap):
+            yield doc_id, chunk_idx, text
+
+    def _chunks(self, documents: Iterable, chunk_tokens: int = None, overlap: int = None) -> Iterator[tuple]:
+        """chunk_documents, plus each chunk's token count as encode will see it,
+        or None when whitespace words stood in for tokens"""
+        tokenizer = self._fast_tokenizer()
+        special_tokens = tokenizer.num_special_tokens_to_add() if tokenizer is not None else 0
+        chunk_tokens = chunk_tokens or self.CHUNK_TOKENS
+        overlap = self.CHUNK_OVERLAP if overlap is None else overlap
+        if not 0 <= overlap < chunk_tokens:
+            raise ValueError("overlap must be at least 0 and smaller than chunk_tokens")
+        for position, document in enumerate(documents):
+            doc_id, text = (position, document) if isinstance(document, str) else document
+            spans = self._token_spans(text)
+            if not spans:
+                yield doc_id, 0, text, special_tokens if tokenizer is not None else None
+                continue
+            starts = range(0, max(len(spans) - overlap, 1), chunk_tokens - overlap)
+            for chunk_idx, start in enumerate(starts):
+                window = spans[start:start + chunk_tokens]
+                length = len(window) + special_tokens if tokenizer is not None else None
+                yield doc_id, chunk_idx, text[window[0][0]:window[-1][1]], length
+
+    def _chunk_batches(self, documents, batch_size, chunk_tokens, overlap) -> Iterator[list]:
+        """Lists of (doc_id, chunk_idx, text, token count) from _chunks"""
+        chunks = self._chunks(documents, chunk_tokens, overlap)
+        while True:
+            batch = list(itertools.islice(chunks, batch_size or self.STREAM_BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+    def embed_stream(self, documents: Iterable, batch_size: int = None, chunk_tokens: int = None,
+                     overlap: int = None) -> Iterator[tuple]:
+        """Synchronous aembed_stream"""
+        for batch in self._chunk_batches(documents, batch_size, chunk_tokens, overlap):
+            # The chunker already counted the tokens, so bucketing need not tokenize again
+            vectors = run_sync(self._aembed_array([text for _, _, text, _ in batch], lengths=[n for *_, n in batch]))
+            for (doc_id, chunk_idx, _, _), vector in zip(batch, vectors):
+                yield doc_id, chunk_idx, vector
+
+    async def aembed_stream(self, documents: Iterable, batch_size: int = None, chunk_tokens: int = None,
+                            overlap: int = None):
+        """Embed documents chunk by chunk, yielding (doc_id, chunk_idx, vector).
+
+        Documents are read and embedded one batch of batch_size chunks at a
+        time, only when the consumer asks for more, so memory stays constant
+        however large the input. See chunk_documents for the input format.
+        """
+        loop = asyncio.get_event_loop()
+        batches = self._chunk_batches(documents, batch_size, chunk_tokens, overlap)
+        while True:
+            batch = await loop.run_in_executor(None, next, batches, None)
+            if batch is None:
+                return
+            vectors = await self._aembed_array([text for _, _, text, _ in batch], lengths=[n for *_, n in batch])
+            for (doc_id, chunk_idx, _, _), vector in zip(batch, vectors):
+                yield doc_id, chunk_idx, vector
 
     @classmethod
     def get_instance(cls):
-        return cls()
\ No newline at end of file
+        return cls()
@@ -0,0 +1,141 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STARTUP_FAILED = "startup"  # Result tag for a worker that could not build its model
+
+
+def load_sentence_transformer(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def _worker_main(model_factory, model_name: str, threads: int, tasks, results):
+    try:
+        import torch
+        # Each worker gets its share of the cores instead of every worker using all of them
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    try:
+        model = model_factory(model_name)
+    except Exception:
+        results.put((STARTUP_FAILED, None, traceback.format_exc()))
+        return
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        call_id, shm_name, shape, start, texts = task
+        try:
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+                out[start:start + len(texts)] = np.asarray(model.encode(texts), dtype=np.float32).reshape(len(texts), -1)
+                del out  # Release the buffer before closing
+            finally:
+                shm.close()
+            results.put((call_id, start, None))
+        except Exception as e:
+            results.put((call_id, start, f"{type(e).__name__}: {e}"))
+
+
+class EmbeddingPool:
+    """Worker processes, each holding its own model, encoding shards of a batch in parallel.
+
+    One process is bound by a single torch intra-op pool and by the GIL
+    around tokenization; N workers with cores/N threads each use the whole
+    machine. Shards are pulled from a shared queue, so faster workers take
+    more of them, and vectors are written straight into a shared-memory
+    output buffer instead of being pickled back.
+    """
+
+    SHARDS_PER_WORKER = 4  # Smaller shards balance load across workers
+    POLL_INTERVAL = 1.0  # Seconds between worker liveness checks while waiting
+
+    def __init__(self, workers: int, model_name: str, dim: int, threads_per_worker: int = None,
+                 model_factory=load_sentence_transformer):
+        self.workers = workers
+        self.dim = dim
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        # Forked children would inherit the parent's torch thread pools in a broken state
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._lock = threading.Lock()  # One batch at a time; each uses every worker
+        self._calls = itertools.count()
+        self._startup_failed = False
+        self._processes = [
+            context.Process(target=_worker_main, name=f"axiom-embed-{i}", daemon=True,
+                            args=(model_factory, model_name, self.threads_per_worker, self._tasks, self._results))
+            for i in range(workers)
+        ]
+        for process in self._processes:
+            process.start()
+        logger.info(f"Started {workers} embedding workers with {self.threads_per_worker} threads each")
+
+    @property
+    def alive(self) -> bool:
+        """False once any worker has died, or failed to start and is on its way out"""
+        return not self._startup_failed and all(process.is_alive() for process in self._processes)
+
+    def encode(self, texts) -> np.ndarray:
+        """Embed texts across the workers, returning shape (len(texts), dim) in input order"""
+        n = len(texts)
+        if n == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        shard = -(-n // (self.workers * self.SHARDS_PER_WORKER))
+        with self._lock:
+            call_id = next(self._calls)
+            shm = shared_memory.SharedMemory(create=True, size=n * self.dim * 4)
+            try:
+                starts = range(0, n, shard)
+                for start in starts:
+                    self._tasks.put((call_id, shm.name, (n, self.dim), start, texts[start:start + shard]))
+                pending = len(starts)
+                while pending:
+                    try:
+                        result_call, _, error = self._results.get(timeout=self.POLL_INTERVAL)
+                    except queue.Empty:
+                        if not self.alive:
+                            raise RuntimeError(f"An embedding worker exited: {self._exit_reason()}")
+                        continue
+                    if result_call == STARTUP_FAILED:
+                        self._startup_failed = True
+                        raise RuntimeError(f"An embedding worker failed to start:\n{error}")
+                    if result_call != call_id:
+                        continue  # Left over from a batch that already failed
+                    if error is not None:
+                        raise RuntimeError(f"Embedding worker failed: {error}")
+                    pending -= 1
+                return np.ndarray((n, self.dim), dtype=np.float32, buffer=shm.buf).copy()
+            finally:
+                shm.close()
+                shm.unlink()
+
+    def _exit_reason(self) -> str:
+        """The startup traceback a dead worker sent, else its exit codes"""
+        try:
+            while True:
+                result_call, _, error = self._results.get(timeout=0.1)
+                if result_call == STARTUP_FAILED:
+                    return f"failed to start:\n{error}"
+        except queue.Empty:
+            return f"exit codes {[process.exitcode for process in self._processes]}"
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
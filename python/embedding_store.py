@@ -0,0 +1,159 @@
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from cache_store import CacheStore
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """Memory-mapped float32 embedding matrix with a persistent key -> row index.
+
+    Vectors live in a raw float32 file mapped with np.memmap, so opening the
+    store only reads the index and lookups return views into the mapping
+    instead of Python float lists. Pages are loaded on demand, which keeps
+    RSS small no matter how many embeddings are stored. The index is a
+    CacheStore so it survives crashes.
+
+    Row allocation lives in this process's key -> row map, so the files are
+    owned by one process at a time through an exclusive lock on the matrix.
+    When another process already owns them, private_fallback=True opens an
+    empty store in a private temporary directory instead, which is deleted
+    on close; otherwise RuntimeError is raised.
+    """
+
+    INITIAL_ROWS = 1024
+
+    def __init__(self, matrix_path: str, index_path: str, dim: int, max_rows: int, private_fallback: bool = False):
+        self.dim = dim
+        self.max_rows = max_rows
+        self._private_dir = None
+        self._lock_fd = self._lock(matrix_path)
+        if self._lock_fd is None:
+            if not private_fallback:
+                raise RuntimeError(f"{matrix_path} is already open in another process or store")
+            self._private_dir = tempfile.mkdtemp(prefix="axiom-store-")
+            logger.warning(f"{matrix_path} is already open elsewhere; using a private store until close")
+            matrix_path = os.path.join(self._private_dir, os.path.basename(matrix_path))
+            index_path = os.path.join(self._private_dir, os.path.basename(index_path))
+            self._lock_fd = self._lock(matrix_path)
+        self.matrix_path = matrix_path
+        self._index = CacheStore(index_path)
+        self._rows = OrderedDict(self._index.items())  # key -> row, oldest first
+        used_rows = set(self._rows.values())
+        self._next_row = max(used_rows, default=-1) + 1
+        self._free = [row for row in range(self._next_row) if row not in used_rows]
+        existing_rows = os.path.getsize(matrix_path) // (dim * 4)
+        self._open(max(self.INITIAL_ROWS, existing_rows, self._next_row))
+
+    @staticmethod
+    def _lock(matrix_path: str):
+        """Open matrix_path and lock it exclusively, or return None if it is already locked"""
+        fd = os.open(matrix_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _open(self, capacity: int):
+        nbytes = capacity * self.dim * 4
+        with open(self.matrix_path, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < nbytes:
+                # Extends the file sparsely; untouched rows take no disk space
+                f.truncate(nbytes)
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def row_of(self, key: str):
+        return self._rows.get(key)
+
+    def rows(self):
+        """(key, row) pairs, least recently used first"""
+        return self._rows.items()
+
+    def free_rows(self) -> list:
+        """Rows below the allocation mark that hold no key, such as deleted ones"""
+        return list(self._free)
+
+    def matrix(self) -> np.ndarray:
+        """View over every row allocated so far, without copying"""
+        return self._matrix[:self._next_row]
+
+    def get(self, key: str):
+        """Return a read-through view of the stored vector, or None"""
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        # Recently read rows are recycled last once the store is full
+        self._rows.move_to_end(key)
+        return self._matrix[row]
+
+    def touch(self, key: str):
+        """Mark key as recently used without reading it"""
+        if key in self._rows:
+            self._rows.move_to_end(key)
+
+    def put(self, key: str, vector) -> np.ndarray:
+        row = self._rows.get(key)
+        if row is None:
+            row = self._allocate()
+        else:
+            self._rows.move_to_end(key)
+        self._matrix[row] = vector
+        self._rows[key] = row
+        self._index.set(key, row)
+        return self._matrix[row]
+
+    def delete(self, key: str):
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._free.append(row)
+            self._index.delete(key)
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._next_row >= self.max_rows:
+            # Full: recycle the row of the oldest stored key
+            key, row = self._rows.popitem(last=False)
+            self._index.delete(key)
+            return row
+        if self._next_row >= self.capacity:
+            self._grow()
+        row = self._next_row
+        self._next_row += 1
+        return row
+
+    def _grow(self):
+        self._matrix.flush()
+        # Views handed out earlier keep the old mapping alive, so they stay valid
+        self._open(min(self.capacity * 2, self.max_rows))
+
+    def flush(self):
+        self._matrix.flush()
+        self._index.flush()
+
+    def close(self):
+        if self._lock_fd is None:
+            return
+        self.flush()
+        self._index.close()
+        os.close(self._lock_fd)  # Also releases the lock
+        self._lock_fd = None
+        if self._private_dir is not None:
+            shutil.rmtree(self._private_dir, ignore_errors=True)
@@ -0,0 +1,109 @@
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Backends that replace the PyTorch model with an exported runtime model
+EXPORT_BACKENDS = ("onnx", "openvino")
+TORCH_OPTIONS = ("fp32", "bf16", "int8", "compile")
+# Exported models are saved here, so only the first start pays for the export
+EXPORT_DIR = os.getenv("AXIOM_EXPORT_DIR", "exported_models")
+
+
+def parse_backend(spec: str) -> list:
+    """Split a spec such as "int8+compile" into validated option names"""
+    options = [part.strip().lower() for part in (spec or "fp32").split("+") if part.strip()]
+    for option in options:
+        if option not in TORCH_OPTIONS + EXPORT_BACKENDS:
+            raise ValueError(f"Unknown LLM backend option {option!r}; choose from {TORCH_OPTIONS + EXPORT_BACKENDS}")
+    exports = [option for option in options if option in EXPORT_BACKENDS]
+    if exports and len(options) > 1:
+        raise ValueError(f"{exports[0]} is a complete backend and can't be combined with {options}")
+    return options or ["fp32"]
+
+
+def bf16_supported(device: str) -> bool:
+    import torch
+    if device == "cuda":
+        return torch.cuda.is_bf16_supported()
+    try:
+        # Without native bf16 instructions CPU matmuls are emulated and slower than fp32
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def export_path(model_name: str, backend: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{model_name.replace('/', '--')}-{backend}")
+
+
+def _load_exported(model_name: str, backend: str):
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForCausalLM as model_class
+    else:
+        from optimum.intel import OVModelForCausalLM as model_class
+    path = export_path(model_name, backend)
+    if os.path.isdir(path):
+        return model_class.from_pretrained(path)
+    logger.info(f"Exporting {model_name} to {backend}; saving it to {path}")
+    model = model_class.from_pretrained(model_name, export=True)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    # Save beside the target and rename, so a crash never leaves a partial export to load
+    staging = tempfile.mkdtemp(prefix=".export-", dir=EXPORT_DIR)
+    try:
+        model.save_pretrained(staging)
+        os.rename(staging, path)
+    except OSError as e:
+        # Another process may have saved it first; either way this start already has the model
+        logger.warning(f"Could not save the exported model to {path}: {e}")
+        shutil.rmtree(staging, ignore_errors=True)
+    return model
+
+
+def load_model(model_name: str, backend: str, device: str):
+    """Load model_name for generation with the requested backend.
+
+    Returns (model, options actually applied). Options that are unavailable
+    on this machine or install are skipped with a warning, so a bad setting
+    degrades to plain fp32 rather than failing to start. Every backend
+    exposes the same generate() interface.
+    """
+    from transformers import AutoModelForCausalLM
+    import torch
+
+    options = parse_backend(backend)
+    if options[0] in EXPORT_BACKENDS:
+        try:
+            return _load_exported(model_name, options[0]), options
+        except ImportError as e:
+            logger.warning(f"{options[0]} backend needs optimum ({e}); falling back to fp32")
+            options = ["fp32"]
+
+    applied = []
+    load_kwargs = {}
+    if "bf16" in options:
+        if bf16_supported(device):
+            load_kwargs["torch_dtype"] = torch.bfloat16
+            applied.append("bf16")
+        else:
+            logger.warning(f"bf16 is not supported on {device}; loading fp32 weights")
+    model = AutoModelForCausalLM.from_pretrained(model_name, **load_kwargs)
+    model.to(device)
+
+    if "int8" in options:
+        if device == "cpu" and "bf16" not in applied:
+            # Linear layers hold nearly all the weights; activations stay float
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            applied.append("int8")
+        else:
+            logger.warning("int8 dynamic quantization needs fp32 weights on CPU; skipping it")
+    if "compile" in options:
+        if hasattr(torch, "compile"):
+            # generate() stays in Python; only the per-token forward pass is compiled
+            model.forward = torch.compile(model.forward, dynamic=True)
+            applied.append("compile")
+        else:
+            logger.warning("torch.compile needs PyTorch 2.0 or newer; skipping it")
+    return model, applied or ["fp32"]
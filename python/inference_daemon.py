@@ -0,0 +1,325 @@
+import asyncio
+import grp
+import json
+import logging
+import os
+import signal
+import socket
+import stat
+import sys
+import tempfile
+import time
+
+from async_bridge import get_bridge
+from llm_inference import LLMInference
+
+logger = logging.getLogger(__name__)
+
+# Members of this group share one daemon and its model; unset, each user runs their own
+DAEMON_GROUP = os.getenv("AXIOM_DAEMON_GROUP")
+
+
+def _group_id():
+    return grp.getgrnam(DAEMON_GROUP).gr_gid if DAEMON_GROUP else None
+
+
+def _private_socket_dir() -> str:
+    """The directory serve() creates for the socket: mode 2770 for DAEMON_GROUP,
+    else $XDG_RUNTIME_DIR or a per-user directory with mode 0700"""
+    if DAEMON_GROUP:
+        return os.path.join(tempfile.gettempdir(), f"axiom-{DAEMON_GROUP}")
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return runtime_dir
+    return os.path.join(tempfile.gettempdir(), f"axiom-{os.getuid()}")
+
+
+# A fixed name in world-writable /tmp could be squatted or spoofed by another user
+SOCKET_PATH = os.getenv("AXIOM_DAEMON_SOCKET") or os.path.join(_private_socket_dir(), "axiom_inference.sock")
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024  # Batched embeddings make for long lines
+
+
+class DaemonError(Exception):
+    """The daemon received the request but it failed"""
+
+
+class DaemonUnavailable(Exception):
+    """No daemon is listening on the socket"""
+
+
+class DaemonTimeout(DaemonError):
+    """The daemon took the request but did not answer in time, e.g. while its model loads"""
+
+
+class InferenceDaemon:
+    """Long-running host for the models, shared by every local client.
+
+    Speaks JSON lines over a Unix socket: each request is
+    {"id": ..., "method": ..., "params": {...}} and gets one response line
+    {"id": ..., "result": ...} or {"id": ..., "error": "..."}. Requests on
+    one connection are served concurrently and may complete out of order,
+    and all clients share one event loop, so concurrent prompts from
+    different CLI calls land in the same LLM micro-batch.
+    """
+
+    SOCKET_MODE = 0o600  # Only the owner may connect
+    GROUP_SOCKET_MODE = 0o660  # With DAEMON_GROUP, its members may too
+    PROBE_TIMEOUT = 2.0  # Seconds to wait for an existing daemon's ping
+
+    def __init__(self, socket_path: str = None):
+        self.socket_path = socket_path or SOCKET_PATH
+        self.started = time.time()
+        self.requests = 0
+        self.llm = None
+        self._planner = None
+        self._memories = {}  # collection -> AsyncQdrantMemory
+        self._server = None
+        self._methods = {
+            "ping": self.ping,
+            "generate": self.generate,
+            "embed": self.embed,
+            "plan": self.plan,
+            "store_context": self.store_context,
+            "search_similar": self.search_similar,
+            "stats": self.stats,
+        }
+
+    async def ping(self) -> dict:
+        return {"pid": os.getpid(), "uptime": time.time() - self.started, "model_ready": self.llm.ready}
+
+    async def generate(self, prompt, namespace: str = "default", schema: dict = None,
+                       max_new_tokens: int = None, stop=None, stop_on_json: bool = None):
+        return await self.llm.agenerate(prompt, namespace, schema, max_new_tokens, stop, stop_on_json)
+
+    async def embed(self, text):
+        from embedding_model import EmbeddingModel
+        return await EmbeddingModel.get_instance().aembed(text)
+
+    async def plan(self, command: str, as_dag: bool = False) -> list:
+        if self._planner is None:
+            from agents.planner_agent import PlannerAgent
+            self._planner = PlannerAgent()
+        return await self._planner.adecompose(command, as_dag)
+
+    def _memory(self, collection: str):
+        if collection not in self._memories:
+            from memory import AsyncQdrantMemory
+            self._memories[collection] = AsyncQdrantMemory(collection)
+        return self._memories[collection]
+
+    async def store_context(self, text: str, context_id: str, payload: dict = None,
+                            collection: str = "sovereign_memory"):
+        return await self._memory(collection).astore_context(text, context_id, payload or {})
+
+    async def search_similar(self, query: str, limit: int = 5, collection: str = "sovereign_memory") -> list:
+        return await self._memory(collection).asearch_similar(query, limit)
+
+    async def stats(self) -> dict:
+        from shared_cache import shared_cache_stats
+        report = {
+            "requests": self.requests,
+            "uptime": time.time() - self.started,
+            "model_ready": self.llm.ready,
+            "llm_cache_entries": len(self.llm.cache),
+            "generation": self.llm.generation_stats(),
+            "agent_caches": shared_cache_stats(),
+        }
+        embedding_module = sys.modules.get("embedding_model")
+        # Only report a model something else built; stats must never load one
+        if embedding_module is not None and embedding_module.EmbeddingModel._instance is not None:
+            report["embedding_cache"] = embedding_module.EmbeddingModel._instance.cache_stats()
+        return report
+
+    async def _respond(self, request: dict, writer, lock: asyncio.Lock):
+        self.requests += 1
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            method = self._methods.get(request.get("method"))
+            if method is None:
+                raise ValueError(f"Unknown method {request.get('method')!r}")
+            response = {"id": request_id, "result": await method(**(request.get("params") or {}))}
+        except Exception as e:
+            response = {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+        line = json.dumps(response, default=_to_json) + "\n"
+        async with lock:
+            writer.write(line.encode())
+            await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        lock = asyncio.Lock()  # One writer per connection
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    request = {"method": None, "params": {}, "id": None}
+                    logger.warning(f"Malformed request: {e}")
+                task = asyncio.ensure_future(self._respond(request, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning(f"Client connection dropped: {e}")
+        finally:
+            writer.close()
+
+    def _already_serving(self) -> bool:
+        probe = DaemonClient(self.socket_path, timeout=self.PROBE_TIMEOUT)
+        try:
+            return probe.available()
+        finally:
+            probe.close()  # An open probe connection would hold up the other daemon's shutdown
+
+    async def serve(self):
+        # Clients are answered from cache while the model loads
+        self.llm = LLMInference.warm_up()
+        loop = asyncio.get_event_loop()
+        _check_socket_dir(os.path.dirname(os.path.abspath(self.socket_path)))
+        if os.path.exists(self.socket_path):
+            if await loop.run_in_executor(None, self._already_serving):
+                raise RuntimeError(f"An inference daemon is already listening on {self.socket_path}")
+            os.unlink(self.socket_path)  # Stale socket from a crashed daemon
+        gid = _group_id()
+        mode = self.SOCKET_MODE if gid is None else self.GROUP_SOCKET_MODE
+        # Bind with the final permissions, so the socket is never briefly more open
+        old_umask = os.umask(0o777 & ~mode)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path,
+                                                           limit=MAX_MESSAGE_BYTES)
+        finally:
+            os.umask(old_umask)
+        if gid is not None:
+            os.chown(self.socket_path, -1, gid)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._server.close)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Not on the main thread; run() handles signals then
+        logger.info(f"Inference daemon listening on {self.socket_path}")
+        try:
+            await self._server.wait_closed()
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    def run(self):
+        """Serve on the shared bridge loop, so in-process sync calls batch with clients"""
+        loop = get_bridge().loop
+        future = asyncio.run_coroutine_threadsafe(self.serve(), loop)
+        signal.signal(signal.SIGTERM, lambda *_: loop.call_soon_threadsafe(self.close))
+        try:
+            future.result()
+        except KeyboardInterrupt:
+            loop.call_soon_threadsafe(self.close)
+            # Let serve() remove the socket before the process exits
+            future.result(timeout=5)
+
+
+class DaemonClient:
+    """Blocking client for InferenceDaemon, one request at a time"""
+
+    TIMEOUT = 120.0  # Seconds per request; covers a full CPU generation, and a wedged daemon fails
+
+    def __init__(self, socket_path: str = None, timeout: float = None):
+        self.socket_path = socket_path or SOCKET_PATH
+        self.timeout = timeout or self.TIMEOUT
+        self._sock = None
+        self._file = None
+        self._next_id = 0
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                if not _trusted(os.stat(self.socket_path)):
+                    raise DaemonUnavailable(f"{self.socket_path} belongs to another user")
+                sock.connect(self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                sock.close()
+                raise DaemonUnavailable(f"No inference daemon on {self.socket_path}") from e
+            except DaemonUnavailable:
+                sock.close()
+                raise
+            self._sock = sock
+            self._file = sock.makefile("rb")
+
+    def available(self) -> bool:
+        try:
+            self.call("ping")
+            return True
+        except DaemonTimeout:
+            return True  # Listening, just busy
+        except (DaemonUnavailable, OSError):
+            return False
+
+    def call(self, method: str, **params):
+        self._connect()
+        self._next_id += 1
+        request = {"id": self._next_id, "method": method, "params": params}
+        try:
+            self._sock.sendall((json.dumps(request) + "\n").encode())
+            line = self._file.readline()
+        except socket.timeout as e:
+            # The connection may still deliver this answer later, so it can't be reused
+            self.close()
+            raise DaemonTimeout(f"Inference daemon did not answer within {self.timeout}s") from e
+        if not line:
+            self.close()
+            raise DaemonUnavailable("Inference daemon closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise DaemonError(response["error"])
+        return response["result"]
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+
+def _trusted(info: os.stat_result) -> bool:
+    """Whether a file is ours, or shared through DAEMON_GROUP"""
+    gid = _group_id()
+    return info.st_uid == os.getuid() or (gid is not None and info.st_gid == gid)
+
+
+def _check_socket_dir(directory: str):
+    """Create directory for the socket, refusing one anyone outside DAEMON_GROUP could tamper with"""
+    gid = _group_id()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if gid is not None and info.st_uid == os.getuid() and (info.st_gid, stat.S_IMODE(info.st_mode)) != (gid, 0o2770):
+        # Files created inside inherit the group
+        os.chown(directory, -1, gid)
+        os.chmod(directory, 0o2770)
+        info = os.stat(directory)
+    in_group = gid is not None and info.st_gid == gid
+    foreign = info.st_uid not in (os.getuid(), 0) and not in_group
+    writable = info.st_mode & (0o002 if in_group else 0o022)
+    if foreign or (writable and not info.st_mode & stat.S_ISVTX):
+        raise RuntimeError(f"Refusing to serve from {directory}: other users can replace the socket there")
+
+
+def _to_json(value):
+    # numpy arrays and scalars from the embedding and memory layers
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    InferenceDaemon(sys.argv[1] if len(sys.argv) > 1 else None).run()
@@ -0,0 +1,261 @@
+import json
+
+WHITESPACE = " \t\n\r"
+STRING_ESCAPES = '"\\/bfnrt'
+
+
+class JSONSchemaAutomaton:
+    """Character-level recogniser for JSON documents matching a small schema.
+
+    Supports non-recursive schemas built from "object" (every property
+    required, emitted in declared order), "array", "string", "integer" and
+    "boolean". States are hashable tuples: a stack of frames plus the length
+    of the current whitespace run, which is capped so generation cannot stall
+    on whitespace. Because the schema is not recursive the state space is
+    finite, which lets callers memoise work per state.
+    """
+
+    MAX_WHITESPACE = 4  # Longest whitespace run allowed between tokens
+    MAX_INTEGER_DIGITS = 9
+
+    def __init__(self, schema: dict):
+        self._nodes = []  # node index -> (type, children)
+        self._root = self._compile(schema)
+
+    def _compile(self, schema: dict) -> int:
+        kind = schema.get("type")
+        if kind == "object":
+            children = tuple((name, self._compile(sub)) for name, sub in schema.get("properties", {}).items())
+        elif kind == "array":
+            children = self._compile(schema.get("items", {"type": "string"}))
+        elif kind in ("string", "integer", "boolean"):
+            children = None
+        else:
+            raise ValueError(f"Unsupported schema type for constrained decoding: {kind!r}")
+        self._nodes.append((kind, children))
+        return len(self._nodes) - 1
+
+    @property
+    def initial(self):
+        return ((("value", self._root),), 0)
+
+    @staticmethod
+    def is_complete(state) -> bool:
+        return not state[0]
+
+    def step(self, state, ch: str):
+        """State after consuming ch, or None if ch is not allowed here"""
+        frames, ws = state
+        if not frames:
+            return None
+        top = frames[-1]
+        rest = frames[:-1]
+        kind = top[0]
+
+        if kind == "lit":
+            _, text, i = top
+            if ch != text[i]:
+                return None
+            return (rest + (("lit", text, i + 1),) if i + 1 < len(text) else rest, 0)
+
+        if kind == "str":
+            if top[1]:  # After a backslash
+                return (rest + (("str", False),), 0) if ch in STRING_ESCAPES else None
+            if ch == '"':
+                return (rest, 0)
+            if ch == "\\":
+                return (rest + (("str", True),), 0)
+            return (frames, 0) if ch >= " " else None
+
+        if kind == "int":
+            digits = top[1]
+            if ch.isdigit() and ch.isascii() and digits < self.MAX_INTEGER_DIGITS:
+                return (rest + (("int", digits + 1),), 0)
+            if digits == 0:
+                return None
+            # The number ended; ch belongs to the enclosing value
+            return self.step((rest, 0), ch)
+
+        if ch in WHITESPACE:
+            return (frames, ws + 1) if ws < self.MAX_WHITESPACE else None
+
+        if kind == "value":
+            node_kind, children = self._nodes[top[1]]
+            if node_kind == "string":
+                return (rest + (("str", False),), 0) if ch == '"' else None
+            if node_kind == "integer":
+                if ch == "-":
+                    return (rest + (("int", 0),), 0)
+                return self.step((rest + (("int", 0),), 0), ch)
+            if node_kind == "boolean":
+                if ch == "t":
+                    return (rest + (("lit", "rue", 0),), 0)
+                if ch == "f":
+                    return (rest + (("lit", "alse", 0),), 0)
+                return None
+            if node_kind == "object":
+                return (rest + (("obj", top[1], 0, False),), 0) if ch == "{" else None
+            return (rest + (("arr", top[1], "first"),), 0) if ch == "[" else None
+
+        if kind == "obj":
+            _, node, i, need_comma = top
+            properties = self._nodes[node][1]
+            if i == len(properties):
+                return (rest, 0) if ch == "}" else None
+            if need_comma:
+                return (rest + (("obj", node, i, False),), 0) if ch == "," else None
+            if ch != '"':
+                return None
+            name, child = properties[i]
+            # The key and colon are fixed text; the value may be preceded by whitespace
+            return (rest + (("obj", node, i + 1, True), ("value", child), ("lit", json.dumps(name)[1:] + ":", 0)), 0)
+
+        if kind == "arr":
+            _, node, phase = top
+            if phase == "after":
+                if ch == ",":
+                    return (rest + (("arr", node, "item"),), 0)
+                return (rest, 0) if ch == "]" else None
+            if phase == "first" and ch == "]":
+                return (rest, 0)
+            return self.step((rest + (("arr", node, "after"), ("value", self._nodes[node][1])), 0), ch)
+
+        return None
+
+    def step_text(self, state, text: str):
+        for ch in text:
+            state = self.step(state, ch)
+            if state is None:
+                return None
+        return state
+
+
+def token_texts(tokenizer) -> dict:
+    """Map token id -> the text it contributes, skipping special and partial-byte tokens"""
+    vocab = tokenizer.get_vocab()
+    special = set(getattr(tokenizer, "all_special_ids", []))
+    # SentencePiece vocabularies mark word starts with U+2581 instead of a space
+    sentencepiece = any(token.startswith("▁") for token in vocab)
+    texts = {}
+    for token, token_id in vocab.items():
+        if token_id in special:
+            continue
+        if len(token) == 6 and token.startswith("<0x") and token.endswith(">"):
+            byte = int(token[3:5], 16)
+            # Lone bytes of multi-byte UTF-8 characters can't be checked one at a time
+            if byte < 0x80:
+                texts[token_id] = chr(byte)
+            continue
+        text = token.replace("▁", " ") if sentencepiece else tokenizer.convert_tokens_to_string([token])
+        if text:
+            texts[token_id] = text
+    return texts
+
+
+class JSONConstraint:
+    """Allowed-token sets for one schema over one tokenizer's vocabulary.
+
+    The vocabulary is stored as a character trie and walked together with the
+    automaton, so whole subtrees are pruned on the first invalid character.
+    Results are memoised per automaton state, so after warm-up each decoding
+    step is a dictionary lookup. Only each token's own characters are checked,
+    which assumes every ASCII character is itself a token (true of byte-fallback
+    vocabularies such as Phi-3's), so no allowed token leads to a dead end.
+    """
+
+    def __init__(self, tokenizer, schema: dict):
+        self.automaton = JSONSchemaAutomaton(schema)
+        self.eos_token_id = tokenizer.eos_token_id
+        self.texts = token_texts(tokenizer)
+        self._trie = {}
+        for token_id, text in self.texts.items():
+            node = self._trie
+            for ch in text:
+                node = node.setdefault(ch, {})
+            node.setdefault(None, []).append(token_id)
+        self._allowed = {}  # state -> list of token ids
+        self._index = {}  # (state, device, vocab size) -> index tensor
+
+    def allowed_token_ids(self, state) -> list:
+        allowed = self._allowed.get(state)
+        if allowed is None:
+            if self.automaton.is_complete(state):
+                allowed = [self.eos_token_id]
+            else:
+                allowed = []
+                stack = [(self._trie, state)]
+                while stack:
+                    node, node_state = stack.pop()
+                    for ch, child in node.items():
+                        if ch is None:
+                            continue
+                        next_state = self.automaton.step(node_state, ch)
+                        if next_state is not None:
+                            allowed.extend(child.get(None, ()))
+                            stack.append((child, next_state))
+                allowed.sort()
+            self._allowed[state] = allowed
+        return allowed
+
+    def processor(self, prompt_length: int):
+        return JSONLogitsProcessor(self, prompt_length)
+
+
+class JSONLogitsProcessor:
+    """generate() logits processor that masks every token the schema forbids.
+
+    Also usable as a stopping criterion: it returns True once every row has
+    closed its JSON document, so no tokens are spent after the final brace.
+    """
+
+    def __init__(self, constraint: JSONConstraint, prompt_length: int):
+        self.constraint = constraint
+        self.prompt_length = prompt_length
+        self._rows = []  # per row: [tokens consumed, automaton state]
+
+    def update(self, input_ids):
+        automaton = self.constraint.automaton
+        for row in range(len(input_ids)):
+            if row == len(self._rows):
+                self._rows.append([0, automaton.initial])
+            consumed, state = self._rows[row]
+            generated = input_ids[row][self.prompt_length:]
+            for token_id in generated[consumed:]:
+                if state is not None and not automaton.is_complete(state):
+                    state = automaton.step_text(state, self.constraint.texts.get(int(token_id), "\0"))
+                consumed += 1
+            self._rows[row] = [consumed, state]
+
+    def complete(self, row: int) -> bool:
+        """Whether row produced a complete document"""
+        if row >= len(self._rows) or self._rows[row][1] is None:
+            return False
+        return self.constraint.automaton.is_complete(self._rows[row][1])
+
+    def done(self) -> bool:
+        return bool(self._rows) and all(
+            state is None or self.constraint.automaton.is_complete(state) for _, state in self._rows)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        self.update(input_ids)
+        mask = torch.full_like(scores, float("-inf"))
+        for row, (_, state) in enumerate(self._rows):
+            if state is None:
+                # Only reachable if generate() bypassed the mask; stop constraining the row
+                mask[row] = 0
+                continue
+            key = (state, str(getattr(scores, "device", "")), scores.shape[-1])
+            index = self.constraint._index.get(key)
+            if index is None:
+                ids = [i for i in self.constraint.allowed_token_ids(state) if i < scores.shape[-1]]
+                index = torch.tensor(ids, dtype=torch.long)
+                if hasattr(index, 'to'):
+                    index = index.to(scores.device)
+                self.constraint._index[key] = index
+            mask[row, index] = 0
+        return scores + mask
+
+    def stopping_criterion(self, input_ids, scores, **kwargs) -> bool:
+        self.update(input_ids)
+        return self.done()
@@ -1,79 +1,334 @@
-try:
-    from transformers import AutoModelForCausalLM, AutoTokenizer
-    import torch
-    import time
-    import logging
-    import hashlib
-    import json
-    import os
-    from collections import OrderedDict
-    import asyncio
-except ImportError:
-    import os
-    os.system("pip install transformers torch")
-    from transformers import AutoModelForCausalLM, AutoTokenizer
-    import torch
-    import time
-    import logging
-    import hashlib
-    import json
-    import os
-    from collections import OrderedDict
-    import asyncio
+import time
+import logging
+import hashlib
+import json
+import os
+from collections import OrderedDict
+import asyncio
+import copy
+import functools
+import threading
+from cache_store import CacheStore
+from json_constraint import JSONConstraint
+from stop_criteria import StopCriteria, valid_json
+from async_bridge import SingleFlight, run_sync
+from batching import length_buckets
+
+# torch and transformers take seconds to import, so they are only imported
+# where the model is loaded or run; cache hits never touch them
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 LLM_MODEL_NAME = "microsoft/Phi-3-mini-4k-instruct"
 
+
+def _kv_nbytes(past_key_values) -> int:
+    """Approximate memory held by a past_key_values object"""
+    if hasattr(past_key_values, 'to_legacy_cache'):
+        past_key_values = past_key_values.to_legacy_cache()
+    total = 0
+    for layer in past_key_values:
+        for tensor in layer:
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class PrefixCache:
+    """LRU cache of past_key_values for shared prompt prefixes, bounded by bytes"""
+
+    MIN_HITS = 3  # Times an unregistered prefix must be seen before it is cached
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # prefix -> (prefix token ids, past_key_values, nbytes)
+        self._bytes = 0
+        self._registered = set()
+        self._seen = {}  # candidate prefix -> times seen
+        self._failed = set()  # prefixes whose prefill could not be reused
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, prefix: str):
+        self._registered.add(prefix)
+
+    def longest_registered(self, prompt: str):
+        best = None
+        for prefix in self._registered:
+            if len(prefix) < len(prompt) and prompt.startswith(prefix):
+                if best is None or len(prefix) > len(best):
+                    best = prefix
+        return best
+
+    def match(self, prompt: str):
+        """Return the longest known prefix of prompt worth reusing, if any"""
+        best = self.longest_registered(prompt)
+        if best is None and "\n" in prompt:
+            # Fall back to the first line for prompts built from a recurring header
+            candidate = prompt[:prompt.index("\n") + 1]
+            if len(self._seen) >= 1000 and candidate not in self._seen:
+                self._seen.clear()
+            self._seen[candidate] = self._seen.get(candidate, 0) + 1
+            if self._seen[candidate] >= self.MIN_HITS:
+                best = candidate
+        if best in self._failed:
+            return None
+        return best
+
+    def get(self, prefix: str):
+        entry = self._entries.get(prefix)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(prefix)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, prefix: str, token_ids, past_key_values):
+        nbytes = _kv_nbytes(past_key_values)
+        if nbytes > self.max_bytes:
+            self._failed.add(prefix)
+            return
+        if prefix in self._entries:
+            self._bytes -= self._entries.pop(prefix)[2]
+        while self._entries and self._bytes + nbytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+        self._entries[prefix] = (token_ids, past_key_values, nbytes)
+        self._bytes += nbytes
+
+    def mark_failed(self, prefix: str):
+        self._failed.add(prefix)
+        if prefix in self._entries:
+            self._bytes -= self._entries.pop(prefix)[2]
+
 class LLMInference:
     _instance = None
-    CACHE_SIZE = 100  # Max cache size
-    CACHE_FILE = "llm_cache.json"
+    CACHE_SIZE = 100  # Max in-memory cache size
+    DISK_CACHE_SIZE = 10000  # Max entries kept on disk after compaction
+    CACHE_FILE = "llm_cache.db"
+    # Part of every cache key; bump it when cached responses change shape so
+    # older entries stop matching and age out. 2: completion only, no prompt echo
+    RESPONSE_FORMAT = 2
+    BATCH_WINDOW = 0.01  # Seconds to collect concurrent prompts into one batch
+    MAX_BATCH_SIZE = 8  # Flush the pending batch early once this many prompts queue up
+    # Padded tokens (prompt plus max_new_tokens per row) allowed in one generate call
+    BATCH_TOKEN_BUDGET = int(os.getenv("AXIOM_LLM_TOKEN_BUDGET", 8192))
+    PREFIX_CACHE_BYTES = 512 * 1024 * 1024  # Memory budget for cached prefix KV states
+    SEMANTIC_CACHE = os.getenv("AXIOM_SEMANTIC_CACHE") == "1"  # Serve near-duplicate prompts from cache
+    # "fp32", "bf16", "int8", "compile" (combinable with +, e.g. "int8+compile"), "onnx" or "openvino"
+    BACKEND = os.getenv("AXIOM_LLM_BACKEND", "fp32")
+    BACKGROUND_LOAD = os.getenv("AXIOM_BACKGROUND_LOAD") == "1"  # Load the model off the constructor's thread
+    MAX_NEW_TOKENS = 512  # Default generation budget; the prompt does not count against it
+    # Per-namespace defaults; planner and debug answers rarely need 100 tokens
+    GENERATION_BUDGETS = {
+        "planner": {"max_new_tokens": 128, "stop_on_json": True},
+        "debug": {"max_new_tokens": 128},
+    }
 
-    def __new__(cls):
+    def __new__(cls, background: bool = None):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, background: bool = None):
+        """background loads the model on a daemon thread; cached prompts are
+        answered meanwhile, and anything needing the model waits for it.
+        Only the first construction of the singleton takes effect."""
         if not hasattr(self, '_initialized'):
-            start_time = time.time()
-            self.tokenizer = AutoTokenizer.from_pretrained(LLM_MODEL_NAME)
-            if self.tokenizer.pad_token is None:
-                self.tokenizer.pad_token = self.tokenizer.eos_token
-            self.model = AutoModelForCausalLM.from_pretrained(LLM_MODEL_NAME)
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model.to(self.device)
-            load_time = time.time() - start_time
-            logger.info(f"LLM model load time: {load_time:.2f}s")
             self._initialized = True
+            self._ready = threading.Event()
+            self._load_error = None
             self.cache = OrderedDict()  # LRU cache
+            # loop -> [pending requests, flush timer]; futures never cross loops
+            self._pending = {}
+            self._inflight = SingleFlight()  # cache prompt -> response being generated
+            self.prefix_cache = PrefixCache(self.PREFIX_CACHE_BYTES)
+            self.semantic_cache = None
+            self._constraints = {}  # schema key -> JSONConstraint
+            self._generation_stats = {}  # namespace -> token counts and stop reasons
+            if self.SEMANTIC_CACHE:
+                self.enable_semantic_cache()
             self._load_cache()
+            if self.BACKGROUND_LOAD if background is None else background:
+                threading.Thread(target=self._load_model, name="llm-model-load", daemon=True).start()
+            else:
+                self._load_model()
+                if self._load_error is not None:
+                    # Leave the singleton unbuilt so the next construction retries the load
+                    self._store.close()
+                    del self._initialized
+                    raise self._load_error
+
+    @classmethod
+    def warm_up(cls) -> "LLMInference":
+        """Return the instance at once, loading the model in the background"""
+        return cls(background=True)
+
+    def _load_model(self):
+        try:
+            import torch
+            from transformers import AutoTokenizer
+            from inference_backends import load_model
+            start_time = time.time()
+            tokenizer = AutoTokenizer.from_pretrained(LLM_MODEL_NAME)
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            # Decoder-only models must be left-padded for batched generation
+            tokenizer.padding_side = "left"
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+            self._model, self.backend = load_model(LLM_MODEL_NAME, self.BACKEND, self._device)
+            self._tokenizer = tokenizer
+            load_time = time.time() - start_time
+            logger.info(f"LLM model load time: {load_time:.2f}s (backend {'+'.join(self.backend)})")
+        except Exception as e:
+            logger.error(f"LLM model load failed: {e}")
+            self._load_error = e
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        """True once the model has loaded (or failed to)"""
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        """Block until the model is loaded; raises if loading failed"""
+        if not self._ready.wait(timeout):
+            return False
+        if self._load_error is not None:
+            raise RuntimeError(f"LLM model failed to load: {self._load_error}") from self._load_error
+        return True
+
+    async def _await_ready(self):
+        if not self._ready.is_set():
+            await asyncio.get_event_loop().run_in_executor(None, self._ready.wait)
+        self.wait_until_ready()
+
+    @property
+    def model(self):
+        self.wait_until_ready()
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    @property
+    def tokenizer(self):
+        self.wait_until_ready()
+        return self._tokenizer
+
+    @tokenizer.setter
+    def tokenizer(self, tokenizer):
+        self._tokenizer = tokenizer
+
+    @property
+    def device(self) -> str:
+        self.wait_until_ready()
+        return self._device
+
+    def enable_semantic_cache(self, thresholds: dict = None):
+        """Also answer prompts that paraphrase an earlier one, per-namespace thresholds"""
+        from embedding_model import EmbeddingModel
+        from semantic_cache import SemanticCache
+        self.semantic_cache = SemanticCache(EmbeddingModel.get_instance(), thresholds)
 
     def _load_cache(self):
-        """Load cache from disk if exists"""
-        if os.path.exists(self.CACHE_FILE):
-            try:
-                with open(self.CACHE_FILE, 'r') as f:
-                    data = json.load(f)
-                    # Convert back to OrderedDict, keeping recent items
-                    for key, value in list(data.items())[-self.CACHE_SIZE:]:
-                        self.cache[key] = value
-                logger.info(f"Loaded {len(self.cache)} cached responses from disk")
-            except Exception as e:
-                logger.warning(f"Failed to load cache: {e}")
+        """Open the on-disk cache and warm memory with the most recent entries"""
+        self._store = CacheStore(self.CACHE_FILE, max_entries=self.DISK_CACHE_SIZE)
+        try:
+            for key, value in self._store.items(limit=self.CACHE_SIZE):
+                self.cache[key] = value
+            logger.info(f"Loaded {len(self.cache)} cached responses from disk")
+        except Exception as e:
+            logger.warning(f"Failed to load cache: {e}")
 
-    def _save_cache(self):
-        """Save cache to disk"""
+    def register_prefix(self, prefix: str):
+        """Keep the KV state for prompts starting with prefix so its prefill runs once"""
+        self.prefix_cache.register(prefix)
+
+    def _prefix_kwargs(self, prompt: str, inputs) -> dict:
+        """Extra generate kwargs reusing a cached prefix KV state for a single prompt"""
+        prefix = self.prefix_cache.match(prompt)
+        if prefix is None:
+            return {}
+        import torch
         try:
-            with open(self.CACHE_FILE, 'w') as f:
-                json.dump(dict(list(self.cache.items())), f)
+            entry = self.prefix_cache.get(prefix)
+            if entry is None:
+                prefix_ids = self.tokenizer(prefix, return_tensors="pt")["input_ids"].to(self.device)
+                # Drop the last token: it may merge with the text that follows the prefix
+                prefix_ids = prefix_ids[:, :-1]
+                with torch.no_grad():
+                    past_key_values = self.model(input_ids=prefix_ids, use_cache=True).past_key_values
+                self.prefix_cache.put(prefix, prefix_ids, past_key_values)
+                entry = (prefix_ids, past_key_values)
+            prefix_ids, past_key_values = entry
+            input_ids = inputs["input_ids"]
+            n = prefix_ids.shape[1]
+            if input_ids.shape[1] <= n or not torch.equal(input_ids[:, :n], prefix_ids):
+                return {}
+            # generate() extends the cache in place, so every call gets its own copy
+            return {"past_key_values": copy.deepcopy(past_key_values)}
         except Exception as e:
-            logger.warning(f"Failed to save cache: {e}")
+            logger.warning(f"Prefix cache disabled for prefix length {len(prefix)}: {e}")
+            self.prefix_cache.mark_failed(prefix)
+            return {}
+
+    def _semantic_text(self, prompt: str) -> str:
+        """The part of prompt that varies; a shared header would inflate similarity"""
+        prefix = self.prefix_cache.longest_registered(prompt)
+        return prompt[len(prefix):] if prefix else prompt
+
+    async def _semantic_lookup(self, prompts, namespace, schema: dict = None, options: dict = None):
+        if self.semantic_cache is None:
+            return [None] * len(prompts)
+        texts = [self._semantic_text(p) for p in prompts]
+        # A response only answers paraphrases asking for the same schema and budget
+        return await self.semantic_cache.alookup(texts, namespace, self._request_key(schema, options))
+
+    async def _semantic_add(self, prompts, responses, namespace, schema: dict = None, options: dict = None):
+        if self.semantic_cache is not None:
+            await self.semantic_cache.aadd([self._semantic_text(p) for p in prompts], responses, namespace,
+                                           self._request_key(schema, options))
+
+    @staticmethod
+    def _schema_key(schema: dict) -> str:
+        return json.dumps(schema, sort_keys=True)
+
+    def _generation_options(self, namespace: str, max_new_tokens: int = None, stop=None, stop_on_json: bool = None) -> dict:
+        """Per-call settings, falling back to the namespace budget, then the defaults"""
+        budget = self.GENERATION_BUDGETS.get(namespace, {})
+        return {
+            "max_new_tokens": max_new_tokens or budget.get("max_new_tokens", self.MAX_NEW_TOKENS),
+            "stop": sorted(set(budget.get("stop", []) if stop is None else stop)),
+            "stop_on_json": budget.get("stop_on_json", False) if stop_on_json is None else stop_on_json,
+        }
+
+    def _request_key(self, schema: dict = None, options: dict = None) -> str:
+        """Everything besides the prompt that changes the output; empty for defaults"""
+        defaults = {"max_new_tokens": self.MAX_NEW_TOKENS, "stop": [], "stop_on_json": False}
+        overrides = {k: v for k, v in (options or {}).items() if defaults.get(k) != v}
+        if schema is None and not overrides:
+            return ""
+        return json.dumps({"schema": schema, "options": overrides}, sort_keys=True)
+
+    def _cache_prompt(self, prompt: str, schema: dict = None, options: dict = None) -> str:
+        """Cache identity of a request; constrained or budgeted output differs from free text"""
+        key = self._request_key(schema, options)
+        return f"{prompt}\0{key}" if key else prompt
+
+    def _constraint(self, schema: dict) -> JSONConstraint:
+        key = self._schema_key(schema)
+        constraint = self._constraints.get(key)
+        if constraint is None:
+            # Walking the vocabulary takes a moment, so it happens once per schema
+            constraint = self._constraints[key] = JSONConstraint(self.tokenizer, schema)
+        return constraint
 
     def _get_cache_key(self, prompt: str) -> str:
-        return hashlib.md5(prompt.encode()).hexdigest()
+        return hashlib.md5(f"{self.RESPONSE_FORMAT}\0{prompt}".encode()).hexdigest()
 
     def _get_cached_response(self, prompt: str):
         key = self._get_cache_key(prompt)
@@ -81,82 +336,354 @@ class LLMInference:
             # Move to end (most recently used)
             self.cache.move_to_end(key)
             return self.cache[key]
-        return None
+        # Fall back to entries evicted from memory but still on disk
+        response = self._store.get(key)
+        if response is not None:
+            self._remember(key, response)
+        return response
 
-    def _set_cached_response(self, prompt: str, response: str):
-        key = self._get_cache_key(prompt)
+    def _remember(self, key: str, response):
         if key in self.cache:
             self.cache.move_to_end(key)
         else:
             if len(self.cache) >= self.CACHE_SIZE:
                 self.cache.popitem(last=False)  # Remove least recently used
         self.cache[key] = response
-        # Save cache periodically (every 10 additions)
-        if len(self.cache) % 10 == 0:
-            self._save_cache()
 
-    def generate(self, prompt):
+    def _set_cached_response(self, prompt: str, response: str):
+        key = self._get_cache_key(prompt)
+        self._remember(key, response)
+        self._store.set(key, response)
+
+    def generate(self, prompt, namespace: str = "default", schema: dict = None,
+                 max_new_tokens: int = None, stop=None, stop_on_json: bool = None):
         """Synchronous generate method"""
-        return asyncio.run(self.agenerate(prompt))
+        return run_sync(self.agenerate(prompt, namespace, schema, max_new_tokens, stop, stop_on_json))
+
+    def stream(self, prompt: str):
+        """Synchronous streaming method, yields decoded text increments"""
+        cached = self._get_cached_response(prompt)
+        if cached:
+            yield cached
+            return
+        streamer, cancel, failure = self._start_stream(prompt)
+        chunks = []
+        try:
+            for chunk in streamer:
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            cancel.set()
+        if failure:
+            raise failure[0]
+        self._set_cached_response(prompt, "".join(chunks))
+
+    async def astream(self, prompt: str):
+        """Asynchronous streaming method, yields decoded text increments"""
+        cached = self._get_cached_response(prompt)
+        if cached:
+            yield cached
+            return
+        loop = asyncio.get_event_loop()
+        streamer, cancel, failure = await loop.run_in_executor(None, self._start_stream, prompt)
+        chunks = []
+        done = object()
+        try:
+            while True:
+                # The streamer blocks on a queue, so pull each increment off-loop
+                chunk = await loop.run_in_executor(None, next, streamer, done)
+                if chunk is done:
+                    break
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # Stops generation on the next token if the consumer broke out early
+            cancel.set()
+        if failure:
+            raise failure[0]
+        self._set_cached_response(prompt, "".join(chunks))
 
-    async def agenerate(self, prompt):
-        """Asynchronous generate method"""
-        from typing import Union, List
+    def _start_stream(self, prompt: str):
+        """Start generate on a background thread feeding a text streamer.
+
+        Returns (streamer, cancel event, failure list); the list holds the
+        exception generation raised, if any, once the streamer is exhausted.
+        """
+        from transformers import StoppingCriteriaList, TextIteratorStreamer
+        start_time = time.time()
+        inputs = self.tokenizer(prompt, return_tensors="pt")
+        if hasattr(inputs, 'to'):
+            inputs = inputs.to(self.device)
+        prefix_kwargs = self._prefix_kwargs(prompt, inputs)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancel = threading.Event()
+        stopping_criteria = StoppingCriteriaList([lambda input_ids, scores, **kwargs: cancel.is_set()])
+        failure = []
+
+        def run():
+            try:
+                self.model.generate(**inputs, max_new_tokens=self.MAX_NEW_TOKENS, streamer=streamer,
+                                    stopping_criteria=stopping_criteria, **prefix_kwargs)
+                logger.info(f"LLM stream time for prompt length {len(prompt)}: {time.time() - start_time:.2f}s")
+            except Exception as e:
+                logger.warning(f"LLM stream failed: {e}")
+                # Set before end() so the consumer sees it as soon as the stream stops
+                failure.append(e)
+                # Unblock the consumer, which would otherwise wait on the streamer forever
+                streamer.end()
+
+        threading.Thread(target=run, daemon=True).start()
+        return streamer, cancel, failure
+
+    async def agenerate(self, prompt, namespace: str = "default", schema: dict = None,
+                        max_new_tokens: int = None, stop=None, stop_on_json: bool = None):
+        """Asynchronous generate method.
+
+        namespace selects the semantic cache partition and threshold, one per agent,
+        and the default generation budget from GENERATION_BUDGETS. With a JSON
+        schema, decoding is constrained so only the JSON document is produced
+        and generation stops as soon as it closes. max_new_tokens, stop strings
+        (kept in the output, text after them is dropped) and stop_on_json
+        override the namespace budget for this call.
+        """
+        options = self._generation_options(namespace, max_new_tokens, stop, stop_on_json)
         if isinstance(prompt, str):
             # Single prompt
-            cached = self._get_cached_response(prompt)
+            key = self._cache_prompt(prompt, schema, options)
+            cached = self._get_cached_response(key)
             if cached:
                 logger.info(f"Cache hit for prompt length {len(prompt)}")
                 return cached
-            start_time = time.time()
-            # Run model inference in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            inputs = await loop.run_in_executor(None, self.tokenizer, prompt, {"return_tensors": "pt"})
-            if hasattr(inputs, 'to'):
-                inputs = inputs.to(self.device)
-            outputs = await loop.run_in_executor(None, self.model.generate, inputs, {"max_length": 512})
-            if hasattr(outputs, '__getitem__'):
-                response = await loop.run_in_executor(None, self.tokenizer.decode, outputs[0], {"skip_special_tokens": True})
-            else:
-                response = await loop.run_in_executor(None, self.tokenizer.decode, outputs, {"skip_special_tokens": True})
-            gen_time = time.time() - start_time
-            logger.info(f"LLM generate time for prompt length {len(prompt)}: {gen_time:.2f}s")
-            self._set_cached_response(prompt, response)
-            return response
+            # Identical requests already in flight share their response
+            future, owner = self._inflight.claim(key)
+            if owner:
+                asyncio.ensure_future(self._inflight.resolve(
+                    [future], self._generate_uncached(prompt, schema, options, namespace)))
+            return (await self._inflight.wait([future]))[0]
         elif isinstance(prompt, list):
             # Batch prompts
-            responses = []
-            uncached_prompts = []
-            uncached_indices = []
+            responses = [None] * len(prompt)
+            uncached = OrderedDict()  # cache prompt -> prompt, once per distinct request
+            uncached_keys = []  # (index, cache prompt) of each cache miss
             for i, p in enumerate(prompt):
-                cached = self._get_cached_response(p)
+                key = self._cache_prompt(p, schema, options)
+                cached = self._get_cached_response(key)
                 if cached:
-                    responses.append(cached)
-                else:
-                    responses.append(None)  # Placeholder
-                    uncached_prompts.append(p)
-                    uncached_indices.append(i)
-            if uncached_prompts:
-                start_time = time.time()
-                loop = asyncio.get_event_loop()
-                inputs = await loop.run_in_executor(None, self.tokenizer, uncached_prompts, {"return_tensors": "pt", "padding": True})
-                if hasattr(inputs, 'to'):
-                    inputs = inputs.to(self.device)
-                outputs = await loop.run_in_executor(None, self.model.generate, inputs, {"max_length": 512})
-                batch_responses = []
-                if hasattr(outputs, '__iter__'):
-                    for output in outputs:
-                        resp = await loop.run_in_executor(None, self.tokenizer.decode, output, {"skip_special_tokens": True})
-                        batch_responses.append(resp)
+                    responses[i] = cached
                 else:
-                    # Single output case
-                    resp = await loop.run_in_executor(None, self.tokenizer.decode, outputs, {"skip_special_tokens": True})
-                    batch_responses = [resp] * len(uncached_prompts)
-                gen_time = time.time() - start_time
-                logger.info(f"LLM batch generate time for {len(uncached_prompts)} prompts: {gen_time:.2f}s")
-                for idx, resp in zip(uncached_indices, batch_responses):
-                    responses[idx] = resp
-                    self._set_cached_response(prompt[idx], resp)
+                    uncached.setdefault(key, p)
+                    uncached_keys.append((i, key))
+            if uncached:
+                futures = []
+                claimed = []
+                for key in uncached:
+                    future, owner = self._inflight.claim(key)
+                    futures.append(future)
+                    if owner:
+                        claimed.append((key, future))
+                if claimed:
+                    asyncio.ensure_future(self._inflight.resolve(
+                        [future for _, future in claimed],
+                        self._generate_claimed([key for key, _ in claimed], uncached, schema, options, namespace)))
+                by_key = dict(zip(uncached, await self._inflight.wait(futures)))
+                for i, key in uncached_keys:
+                    responses[i] = by_key[key]
             return responses
         else:
-            raise ValueError("Prompt must be str or list[str]")
\ No newline at end of file
+            raise ValueError("Prompt must be str or list[str]")
+
+    async def _generate_uncached(self, prompt: str, schema: dict, options: dict, namespace: str) -> list:
+        """Answer one cache miss from the semantic cache or the micro-batch queue"""
+        similar = (await self._semantic_lookup([prompt], namespace, schema, options))[0]
+        if similar is not None:
+            logger.info(f"Semantic cache hit for prompt length {len(prompt)}")
+            return [similar]
+        # Queue for micro-batching with other concurrent callers
+        response = await self._enqueue(prompt, schema, options, namespace)
+        await self._semantic_add([prompt], [response], namespace, schema, options)
+        return [response]
+
+    async def _generate_claimed(self, keys, prompts: dict, schema: dict, options: dict, namespace: str) -> list:
+        """Responses for the distinct cache prompts in keys, generated as one batch"""
+        batch = [prompts[key] for key in keys]
+        responses = list(await self._semantic_lookup(batch, namespace, schema, options))
+        missing = [i for i, resp in enumerate(responses) if resp is None]
+        if missing:
+            generated = await self._generate_batch([batch[i] for i in missing], schema, options, [namespace] * len(missing))
+            await self._semantic_add([batch[i] for i in missing], generated, namespace, schema, options)
+            for i, resp in zip(missing, generated):
+                responses[i] = resp
+                self._set_cached_response(keys[i], resp)
+        return responses
+
+    async def _generate_batch(self, prompts, schema: dict = None, options: dict = None, namespaces=None):
+        """Generate for prompts in length-sorted sub-batches, returned in input order.
+
+        Prompts of similar token length run together, so one long prompt no
+        longer pads the whole batch, and each generate call stays within
+        BATCH_TOKEN_BUDGET to bound peak memory.
+        """
+        options = options or self._generation_options("default")
+        namespaces = namespaces or ["default"] * len(prompts)
+        if len(prompts) == 1:
+            return await self._generate_bucket(prompts, schema, options, namespaces)
+        await self._await_ready()
+        loop = asyncio.get_event_loop()
+        lengths = await loop.run_in_executor(None, self._token_lengths, prompts)
+        responses = [None] * len(prompts)
+        for bucket in length_buckets(lengths, self.BATCH_TOKEN_BUDGET, options["max_new_tokens"]):
+            generated = await self._generate_bucket(
+                [prompts[i] for i in bucket], schema, options, [namespaces[i] for i in bucket])
+            for i, resp in zip(bucket, generated):
+                responses[i] = resp
+        return responses
+
+    def _token_lengths(self, prompts) -> list:
+        return [len(ids) for ids in self.tokenizer(prompts)["input_ids"]]
+
+    async def _generate_bucket(self, prompts, schema: dict, options: dict, namespaces):
+        """Run one padded generate over prompts and decode each row"""
+        await self._await_ready()
+        start_time = time.time()
+        loop = asyncio.get_event_loop()
+        inputs = await loop.run_in_executor(
+            None, functools.partial(self.tokenizer, prompts, return_tensors="pt", padding=True))
+        if hasattr(inputs, 'to'):
+            inputs = inputs.to(self.device)
+        prompt_length = len(inputs["input_ids"][0])
+        # Left padding shifts positions per row, so prefix reuse only applies to lone prompts
+        prefix_kwargs = {}
+        if len(prompts) == 1:
+            prefix_kwargs = await loop.run_in_executor(None, self._prefix_kwargs, prompts[0], inputs)
+        json_processor = None
+        if schema is not None:
+            json_processor = await loop.run_in_executor(None, self._json_processor, schema, prompt_length)
+        stop_criteria = StopCriteria(self.tokenizer, prompt_length, options["stop"],
+                                     [valid_json] if options["stop_on_json"] else [])
+        control_kwargs = self._control_kwargs(stop_criteria, json_processor)
+        outputs = await loop.run_in_executor(
+            None, functools.partial(self.model.generate, **inputs, max_new_tokens=options["max_new_tokens"],
+                                    **prefix_kwargs, **control_kwargs))
+        responses = []
+        for i in range(len(prompts)):
+            # Decode only what was generated, never the echoed prompt
+            row = outputs[i][prompt_length:]
+            resp = await loop.run_in_executor(
+                None, functools.partial(self.tokenizer.decode, row, skip_special_tokens=True))
+            resp, reason = stop_criteria.finish(i, resp)
+            tokens = self._generated_length(row)
+            if reason is None:
+                if json_processor is not None and json_processor.complete(i):
+                    reason = "schema"
+                elif tokens >= options["max_new_tokens"]:
+                    reason = "max_new_tokens"
+                else:
+                    reason = "eos"
+            self._record_generation(namespaces[i], tokens, reason)
+            responses.append(resp)
+        gen_time = time.time() - start_time
+        logger.info(f"LLM batch generate time for {len(prompts)} prompts: {gen_time:.2f}s")
+        return responses
+
+    def _json_processor(self, schema: dict, prompt_length: int):
+        """Logits processor constraining output to schema, or None if it can't be built"""
+        try:
+            return self._constraint(schema).processor(prompt_length)
+        except Exception as e:
+            # Callers still validate the output, so fall back to free decoding
+            logger.warning(f"Constrained decoding unavailable, generating unconstrained: {e}")
+            return None
+
+    def _control_kwargs(self, stop_criteria: StopCriteria, json_processor) -> dict:
+        """generate kwargs for the stop conditions and schema constraint in use"""
+        criteria = []
+        kwargs = {}
+        if stop_criteria.stop or stop_criteria.callbacks:
+            criteria.append(stop_criteria)
+        if json_processor is not None:
+            from transformers import LogitsProcessorList
+            kwargs["logits_processor"] = LogitsProcessorList([json_processor])
+            # Stop as soon as every row's JSON closes
+            criteria.append(json_processor.stopping_criterion)
+        if criteria:
+            from transformers import StoppingCriteriaList
+            kwargs["stopping_criteria"] = StoppingCriteriaList(criteria)
+        return kwargs
+
+    def _generated_length(self, row) -> int:
+        """Tokens generated for a row, not counting padding after it finished early"""
+        ids = [int(t) for t in row]
+        pad = getattr(self.tokenizer, "pad_token_id", None)
+        n = len(ids)
+        while n and ids[n - 1] == pad:
+            n -= 1
+        return n
+
+    def _record_generation(self, namespace: str, tokens: int, reason: str):
+        stats = self._generation_stats.setdefault(
+            namespace, {"generations": 0, "tokens": 0, "max_tokens": 0, "stop_reasons": {}})
+        stats["generations"] += 1
+        stats["tokens"] += tokens
+        stats["max_tokens"] = max(stats["max_tokens"], tokens)
+        stats["stop_reasons"][reason] = stats["stop_reasons"].get(reason, 0) + 1
+
+    def generation_stats(self) -> dict:
+        """Per-namespace generated token counts and why generations stopped"""
+        return {
+            namespace: {**stats, "stop_reasons": dict(stats["stop_reasons"]),
+                        "mean_tokens": stats["tokens"] / stats["generations"]}
+            for namespace, stats in self._generation_stats.items()
+        }
+
+    async def _enqueue(self, prompt, schema: dict = None, options: dict = None, namespace: str = "default"):
+        """Add a single prompt to the pending micro-batch and await its response"""
+        loop = asyncio.get_running_loop()
+        state = self._pending.setdefault(loop, [[], None])
+        future = loop.create_future()
+        state[0].append((prompt, schema, options, namespace, future))
+        if len(state[0]) >= self.MAX_BATCH_SIZE:
+            self._flush_pending(loop)
+        elif state[1] is None:
+            state[1] = loop.call_later(self.BATCH_WINDOW, self._flush_pending, loop)
+        return await future
+
+    def _flush_pending(self, loop):
+        """Hand the prompts collected on loop to a batch run"""
+        state = self._pending.pop(loop, None)
+        if state is None:
+            return
+        batch, flush_handle = state
+        if flush_handle is not None:
+            flush_handle.cancel()
+        if batch:
+            asyncio.ensure_future(self._run_pending_batch(batch), loop=loop)
+
+    async def _run_pending_batch(self, batch):
+        # Prompts sharing a schema and generation settings run as one generate call
+        groups = OrderedDict()
+        for p, schema, options, namespace, future in batch:
+            key = self._request_key(schema, options)
+            groups.setdefault(key, (schema, options, []))[2].append((p, namespace, future))
+        for schema, options, entries in groups.values():
+            await self._run_pending_group(entries, schema, options)
+
+    async def _run_pending_group(self, batch, schema, options):
+        # Identical prompts queued in the same window share one row
+        namespaces = OrderedDict()
+        for p, namespace, _ in batch:
+            namespaces.setdefault(p, namespace)
+        unique_prompts = list(namespaces)
+        batch = [(p, future) for p, _, future in batch]
+        try:
+            responses = await self._generate_batch(unique_prompts, schema, options, list(namespaces.values()))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_prompt = dict(zip(unique_prompts, responses))
+        for p, resp in by_prompt.items():
+            self._set_cached_response(self._cache_prompt(p, schema, options), resp)
+        for p, future in batch:
+            if not future.done():
+                future.set_result(by_prompt[p])
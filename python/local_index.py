@@ -0,0 +1,167 @@
+import logging
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from cache_store import CacheStore
+from embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+# Mirrors the fields QdrantMemory reads from qdrant_client's ScoredPoint
+LocalHit = namedtuple("LocalHit", ["id", "score", "payload"])
+
+
+class LocalVectorIndex:
+    """In-process cosine vector index, a server-free stand-in for a Qdrant collection.
+
+    Unit-normalised vectors live in a memory-mapped EmbeddingStore and payloads
+    in a CacheStore, so the index reopens instantly. Small indexes are searched
+    exactly with one matrix-vector product; once an index reaches
+    IVF_MIN_POINTS it is clustered with k-means (IVF) and queries only scan
+    the NPROBE closest clusters. Points upserted after training join their
+    nearest cluster right away. Only one process can open an index at a
+    time; opening it from a second raises RuntimeError. Threads may upsert
+    and search concurrently.
+    """
+
+    IVF_MIN_POINTS = 4096  # Below this an exact scan is already sub-millisecond
+    NPROBE = 8  # Clusters scanned per query
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLE = 20000  # Points used to train centroids
+    RETRAIN_GROWTH = 2.0  # Retrain once the index grows this much past the last training
+
+    def __init__(self, path: str, dim: int = 384, max_points: int = 1000000):
+        self.dim = dim
+        self._vectors = EmbeddingStore(path + ".f32", path + "_index.db", dim, max_points)
+        self._payloads = CacheStore(path + "_payloads.db")
+        self._ids_by_row = {row: point_id for point_id, row in self._vectors.rows()}
+        self._centroids = None
+        self._lists = None  # cluster -> array of rows; may hold rows that moved or were freed
+        self._labels = None  # row -> cluster, -1 for free rows
+        self._appended = None  # cluster -> rows assigned since its list was last merged
+        self._trained_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def upsert(self, ids, vectors, payloads):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            rows = []
+            for point_id, vector, payload in zip(ids, vectors, payloads):
+                self._vectors.put(point_id, vector)
+                row = self._vectors.row_of(point_id)
+                # A full store recycles its oldest row; that point is gone, so is its payload
+                recycled = self._ids_by_row.get(row)
+                if recycled is not None and recycled != point_id:
+                    self._payloads.delete(recycled)
+                self._ids_by_row[row] = point_id
+                self._payloads.set(point_id, payload)
+                rows.append(row)
+            if self._lists is not None:
+                self._add_to_lists(np.array(rows), vectors)
+
+    def delete(self, ids):
+        with self._lock:
+            for point_id in ids:
+                row = self._vectors.row_of(point_id)
+                if row is None:
+                    continue
+                self._vectors.delete(point_id)
+                del self._ids_by_row[row]
+                self._payloads.delete(point_id)
+                if self._lists is not None:
+                    self._labels[row] = -1
+
+    def search(self, vector, limit: int = 5):
+        query = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            if len(self) == 0:
+                return []
+            matrix = self._vectors.matrix()
+            candidates = self._candidate_rows(matrix, query)
+            if candidates is None:
+                scores = matrix @ query
+                # Rows freed by delete() still hold their old vectors
+                scores[self._vectors.free_rows()] = -np.inf
+                rows = np.arange(len(matrix))
+            else:
+                scores = matrix[candidates] @ query
+                rows = candidates
+            limit = min(limit, len(self), len(scores))
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top])]
+            hits = [(self._ids_by_row.get(int(rows[i])), float(scores[i])) for i in top]
+        self._payloads.flush()
+        return [LocalHit(point_id, score, self._payloads.get(point_id) or {})
+                for point_id, score in hits if point_id is not None]
+
+    def _candidate_rows(self, matrix: np.ndarray, query: np.ndarray):
+        """Rows in the clusters nearest to query, or None for an exact scan"""
+        if len(matrix) < self.IVF_MIN_POINTS:
+            return None
+        if self._centroids is None or len(matrix) > self._trained_size * self.RETRAIN_GROWTH:
+            self._train(matrix)
+        if self._lists is None:
+            self._assign(matrix)
+        nearest = np.argsort(-(self._centroids @ query))[:self.NPROBE]
+        candidates = []
+        for c in nearest:
+            if self._appended[c]:
+                self._merge(c)
+            rows = self._lists[c]
+            # Skip rows that were since recycled into another cluster or freed
+            candidates.append(rows[self._labels[rows] == c])
+        return np.concatenate(candidates)
+
+    def _add_to_lists(self, rows: np.ndarray, vectors: np.ndarray):
+        """Put upserted rows in their nearest clusters instead of reassigning every row"""
+        if len(self._labels) <= rows.max():
+            self._labels = np.concatenate([self._labels, np.full(len(self._vectors.matrix()) - len(self._labels), -1)])
+        labels = np.argmax(vectors @ self._centroids.T, axis=1)
+        self._labels[rows] = labels
+        for row, c in zip(rows.tolist(), labels.tolist()):
+            self._appended[c].append(row)
+
+    def _merge(self, c: int):
+        rows = np.concatenate([self._lists[c], np.array(self._appended[c], dtype=np.int64)])
+        self._lists[c] = np.unique(rows[self._labels[rows] == c])
+        self._appended[c] = []
+
+    def _train(self, matrix: np.ndarray):
+        nlist = int(np.sqrt(len(matrix)))
+        rng = np.random.default_rng(0)
+        sample = matrix[rng.choice(len(matrix), min(len(matrix), self.KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        self._centroids = centroids
+        self._trained_size = len(matrix)
+        self._lists = None
+        logger.info(f"Trained {nlist} IVF clusters over {len(matrix)} points")
+
+    def _assign(self, matrix: np.ndarray, chunk: int = 65536):
+        labels = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), chunk):
+            labels[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ self._centroids.T, axis=1)
+        # Free rows sort before cluster 0 and stay out of every list
+        labels[np.setdiff1d(np.arange(len(matrix)), np.fromiter(self._ids_by_row, dtype=np.int64))] = -1
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))]
+        self._appended = [[] for _ in self._centroids]
+        self._labels = labels
+
+    def close(self):
+        self._vectors.close()
+        self._payloads.close()
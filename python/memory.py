@@ -1,17 +1,57 @@
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct
-from .embedding_model import EmbeddingModel
+from embedding_model import EmbeddingModel
+from local_index import LocalVectorIndex
+from async_bridge import run_sync
+from typing import Iterable, List
+import numpy as np
+import asyncio
+import functools
+import itertools
+import os
+import time
 import uuid
+import weakref
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+MEMORY_BACKEND = os.getenv("AXIOM_MEMORY_BACKEND", "qdrant")  # "qdrant" or "local"
+LOCAL_INDEX_DIR = os.getenv("AXIOM_LOCAL_INDEX_DIR", ".")
+
+
+def _format_hits(search_result) -> list:
+    return [
+        {
+            "text": hit.payload.get("text", ""),
+            "context_id": hit.payload.get("context_id", ""),
+            "score": hit.score,
+            "payload": hit.payload
+        }
+        for hit in search_result
+    ]
 
 class QdrantMemory:
-    def __init__(self, collection_name="sovereign_memory"):
-        self.client = QdrantClient("localhost", port=6333)
+    EMBED_BATCH_SIZE = 64  # Texts per embedding call during bulk ingestion
+    UPSERT_CHUNK_SIZE = 256  # Points per upsert request during bulk ingestion
+
+    def __init__(self, collection_name="sovereign_memory", backend: str = None):
+        backend = backend or MEMORY_BACKEND
         self.embedding_model = EmbeddingModel.get_instance()
         self.collection_name = collection_name
+        self.client = None
+        self.index = None
+        if backend == "local":
+            # In-process index: no Qdrant server and no network hop per search
+            self.index = LocalVectorIndex(os.path.join(LOCAL_INDEX_DIR, collection_name))
+        else:
+            self.client = QdrantClient(QDRANT_HOST, port=QDRANT_PORT)
         self._ensure_collection()
 
     def _ensure_collection(self):
         """Create collection if it doesn't exist"""
+        if self.index is not None:
+            return
         try:
             self.client.get_collection(self.collection_name)
         except:
@@ -26,12 +66,16 @@ class QdrantMemory:
         """Store context with embedding in Qdrant"""
         try:
             # Generate embedding for the text
-            embedding = self.embedding_model.embed(text)
+            embedding = self.embedding_model.embed_array(text)
+            if self.index is not None:
+                ids = self.store_vectors([text], embedding[None, :], [context_id], [payload])
+                print(f"Stored context '{text[:50]}...' with ID {ids[0]}")
+                return
 
             # Prepare point for upsert
             point = PointStruct(
                 id=str(uuid.uuid4()),
-                vector=embedding,
+                vector=embedding.tolist(),
                 payload={
                     "text": text,
                     "context_id": context_id,
@@ -48,31 +92,264 @@ class QdrantMemory:
         except Exception as e:
             print(f"Failed to store context: {e}")
 
+    def store_vectors(self, texts: List[str], vectors: np.ndarray, context_ids: List[str], payloads: List[dict] = None):
+        """Store precomputed embeddings, handing the array to the client without per-float boxing"""
+        payloads = payloads or [{} for _ in texts]
+        ids = [str(uuid.uuid4()) for _ in texts]
+        if self.index is not None:
+            self.index.upsert(ids, vectors, [
+                {"text": text, "context_id": context_id, **payload}
+                for text, context_id, payload in zip(texts, context_ids, payloads)
+            ])
+            return ids
+        self.client.upload_collection(
+            collection_name=self.collection_name,
+            vectors=np.ascontiguousarray(vectors, dtype=np.float32),
+            payload=[
+                {"text": text, "context_id": context_id, **payload}
+                for text, context_id, payload in zip(texts, context_ids, payloads)
+            ],
+            ids=ids,
+            wait=True
+        )
+        return ids
+
+    def store_contexts(self, texts: List[str], context_ids: List[str], payloads: List[dict] = None,
+                       embed_batch_size: int = None, upsert_chunk_size: int = None) -> dict:
+        """Bulk-store contexts, embedding the next batch while the previous one uploads"""
+        return run_sync(self._astore_contexts(texts, context_ids, payloads, embed_batch_size, upsert_chunk_size))
+
+    async def _astore_contexts(self, texts, context_ids, payloads, embed_batch_size, upsert_chunk_size) -> dict:
+        embed_batch_size = embed_batch_size or self.EMBED_BATCH_SIZE
+        payloads = payloads or [{} for _ in texts]
+
+        async def batches():
+            for start in range(0, len(texts), embed_batch_size):
+                end = start + embed_batch_size
+                yield texts[start:end], context_ids[start:end], payloads[start:end]
+
+        return await self._astore_batches(batches(), upsert_chunk_size)
+
+    def store_documents(self, documents: Iterable, payload: dict = None, embed_batch_size: int = None,
+                        upsert_chunk_size: int = None, chunk_tokens: int = None, overlap: int = None) -> dict:
+        """Index documents of any length and number in constant memory.
+
+        documents is an iterable of (doc_id, text) pairs or plain strings, read
+        lazily. Each document is split into overlapping chunks (see
+        EmbeddingModel.chunk_documents), stored with context_id doc_id and
+        doc_id/chunk_idx in the payload. Point ids are not collected.
+        """
+        return run_sync(self._astore_documents(documents, payload or {}, embed_batch_size,
+                                               upsert_chunk_size, chunk_tokens, overlap))
+
+    async def _astore_documents(self, documents, payload, embed_batch_size, upsert_chunk_size,
+                                chunk_tokens, overlap) -> dict:
+        chunks = self.embedding_model.chunk_documents(documents, chunk_tokens, overlap)
+        embed_batch_size = embed_batch_size or self.EMBED_BATCH_SIZE
+        loop = asyncio.get_event_loop()
+
+        async def batches():
+            while True:
+                batch = await loop.run_in_executor(None, list, itertools.islice(chunks, embed_batch_size))
+                if not batch:
+                    return
+                yield ([text for _, _, text in batch], [str(doc_id) for doc_id, _, _ in batch],
+                       [{"doc_id": doc_id, "chunk_idx": chunk_idx, **payload} for doc_id, chunk_idx, _ in batch])
+
+        return await self._astore_batches(batches(), upsert_chunk_size, keep_ids=False)
+
+    async def _astore_batches(self, batches, upsert_chunk_size, keep_ids: bool = True) -> dict:
+        """Store (texts, context_ids, payloads) batches, embedding each while the previous one uploads"""
+        upsert_chunk_size = upsert_chunk_size or self.UPSERT_CHUNK_SIZE
+        start_time = time.time()
+        loop = asyncio.get_event_loop()
+        upload = None
+        ids = []
+        stored = 0
+        async for texts, context_ids, payloads in batches:
+            vectors = await self.embedding_model.aembed_array(texts)
+            if upload is not None:
+                batch_ids = await upload
+                stored += len(batch_ids)
+                if keep_ids:
+                    ids.extend(batch_ids)
+            upload = loop.run_in_executor(
+                None, self._upload_chunks, texts, vectors, context_ids, payloads, upsert_chunk_size
+            )
+        if upload is not None:
+            batch_ids = await upload
+            stored += len(batch_ids)
+            if keep_ids:
+                ids.extend(batch_ids)
+        elapsed = time.time() - start_time
+        rate = stored / elapsed if elapsed > 0 else float("inf")
+        print(f"Stored {stored} contexts in {elapsed:.2f}s ({rate:.1f} contexts/s)")
+        result = {"stored": stored, "seconds": elapsed, "contexts_per_second": rate}
+        if keep_ids:
+            result["ids"] = ids
+        return result
+
+    def _upload_chunks(self, texts, vectors, context_ids, payloads, chunk_size) -> List[str]:
+        ids = []
+        for start in range(0, len(texts), chunk_size):
+            end = start + chunk_size
+            ids.extend(self.store_vectors(texts[start:end], vectors[start:end], context_ids[start:end], payloads[start:end]))
+        return ids
+
     def search_similar(self, query: str, limit: int = 5):
         """Search for similar contexts using vector similarity"""
         try:
             # Generate embedding for query
-            query_embedding = self.embedding_model.embed(query)
+            query_embedding = self.embedding_model.embed_array(query)
 
             # Perform vector search
-            search_result = self.client.search(
+            if self.index is not None:
+                search_result = self.index.search(query_embedding, limit)
+            else:
+                search_result = self.client.search(
+                    collection_name=self.collection_name,
+                    query_vector=query_embedding,
+                    limit=limit
+                )
+
+            # Extract results
+            results = _format_hits(search_result)
+
+            print(f"Found {len(results)} similar contexts for query '{query[:50]}...'")
+            return results
+        except Exception as e:
+            print(f"Failed to search contexts: {e}")
+            return []
+
+
+class AsyncQdrantMemory:
+    """QdrantMemory for use inside an event loop, backed by AsyncQdrantClient.
+
+    Clients are shared per (event loop, host, port, transport), so instances
+    on one loop reuse one pooled connection instead of opening their own.
+    A client's connections belong to the loop that opened them, so each
+    loop gets its own, dropped once the loop is garbage collected.
+    """
+
+    EMBED_BATCH_SIZE = QdrantMemory.EMBED_BATCH_SIZE
+    UPSERT_CHUNK_SIZE = QdrantMemory.UPSERT_CHUNK_SIZE
+    _clients = weakref.WeakKeyDictionary()  # event loop -> {(host, port, prefer_grpc): client}
+
+    def __init__(self, collection_name="sovereign_memory", prefer_grpc: bool = False):
+        self.prefer_grpc = prefer_grpc
+        self.embedding_model = EmbeddingModel.get_instance()
+        self.collection_name = collection_name
+        self._collection_ready = False
+
+    @property
+    def client(self):
+        """The running event loop's shared client"""
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        key = (QDRANT_HOST, QDRANT_PORT, self.prefer_grpc)
+        if key not in clients:
+            clients[key] = AsyncQdrantClient(
+                QDRANT_HOST, port=QDRANT_PORT, grpc_port=QDRANT_GRPC_PORT, prefer_grpc=self.prefer_grpc
+            )
+        return clients[key]
+
+    async def _ensure_collection(self):
+        """Create collection if it doesn't exist"""
+        if self._collection_ready:
+            return
+        if not await self.client.collection_exists(self.collection_name):
+            await self.client.create_collection(
                 collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit
+                vectors_config=VectorParams(size=384, distance=Distance.COSINE)
             )
+            print(f"Created Qdrant collection: {self.collection_name}")
+        self._collection_ready = True
 
-            # Extract results
-            results = []
-            for hit in search_result:
-                results.append({
-                    "text": hit.payload.get("text", ""),
-                    "context_id": hit.payload.get("context_id", ""),
-                    "score": hit.score,
-                    "payload": hit.payload
-                })
+    async def astore_context(self, text: str, context_id: str, payload: dict):
+        """Store context with embedding in Qdrant"""
+        try:
+            ids = await self.astore_vectors([text], await self.embedding_model.aembed_array([text]), [context_id], [payload])
+            print(f"Stored context '{text[:50]}...' with ID {ids[0]}")
+        except Exception as e:
+            print(f"Failed to store context: {e}")
+
+    async def astore_vectors(self, texts: List[str], vectors: np.ndarray, context_ids: List[str],
+                             payloads: List[dict] = None) -> List[str]:
+        """Store precomputed embeddings, handing the array to the client without per-float boxing"""
+        await self._ensure_collection()
+        payloads = payloads or [{} for _ in texts]
+        ids = [str(uuid.uuid4()) for _ in texts]
+        # upload_collection is a blocking method even on AsyncQdrantClient
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+            self.client.upload_collection,
+            collection_name=self.collection_name,
+            vectors=np.ascontiguousarray(vectors, dtype=np.float32),
+            payload=[
+                {"text": text, "context_id": context_id, **payload}
+                for text, context_id, payload in zip(texts, context_ids, payloads)
+            ],
+            ids=ids,
+            wait=True
+        ))
+        return ids
 
+    async def astore_contexts(self, texts: List[str], context_ids: List[str], payloads: List[dict] = None,
+                              embed_batch_size: int = None, upsert_chunk_size: int = None) -> dict:
+        """Bulk-store contexts, embedding the next batch while the previous one uploads"""
+        embed_batch_size = embed_batch_size or self.EMBED_BATCH_SIZE
+        upsert_chunk_size = upsert_chunk_size or self.UPSERT_CHUNK_SIZE
+        payloads = payloads or [{} for _ in texts]
+        start_time = time.time()
+        upload = None
+        ids = []
+        for start in range(0, len(texts), embed_batch_size):
+            end = start + embed_batch_size
+            vectors = await self.embedding_model.aembed_array(texts[start:end])
+            if upload is not None:
+                ids.extend(await upload)
+            upload = asyncio.ensure_future(self._upload_chunks(
+                texts[start:end], vectors, context_ids[start:end], payloads[start:end], upsert_chunk_size
+            ))
+        if upload is not None:
+            ids.extend(await upload)
+        elapsed = time.time() - start_time
+        rate = len(ids) / elapsed if elapsed > 0 else float("inf")
+        print(f"Stored {len(ids)} contexts in {elapsed:.2f}s ({rate:.1f} contexts/s)")
+        return {"ids": ids, "stored": len(ids), "seconds": elapsed, "contexts_per_second": rate}
+
+    async def _upload_chunks(self, texts, vectors, context_ids, payloads, chunk_size) -> List[str]:
+        chunks = [
+            self.astore_vectors(texts[i:i + chunk_size], vectors[i:i + chunk_size],
+                                context_ids[i:i + chunk_size], payloads[i:i + chunk_size])
+            for i in range(0, len(texts), chunk_size)
+        ]
+        ids = []
+        for chunk_ids in await asyncio.gather(*chunks):
+            ids.extend(chunk_ids)
+        return ids
+
+    async def asearch_similar(self, query: str, limit: int = 5):
+        """Search for similar contexts using vector similarity"""
+        try:
+            await self._ensure_collection()
+            query_embedding = await self.embedding_model.aembed_array(query)
+            search_result = await self.client.search(
+                collection_name=self.collection_name,
+                query_vector=query_embedding,
+                limit=limit
+            )
+            results = _format_hits(search_result)
             print(f"Found {len(results)} similar contexts for query '{query[:50]}...'")
             return results
         except Exception as e:
             print(f"Failed to search contexts: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    async def abatch_search_similar(self, queries: List[str], limit: int = 5) -> List[list]:
+        """Embed all queries in one call and run their searches concurrently"""
+        await self._ensure_collection()
+        query_embeddings = await self.embedding_model.aembed_array(queries)
+        search_results = await asyncio.gather(*(
+            self.client.search(collection_name=self.collection_name, query_vector=vector, limit=limit)
+            for vector in query_embeddings
+        ))
+        return [_format_hits(result) for result in search_results]
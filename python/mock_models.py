@@ -0,0 +1,44 @@
+"""Importable stand-ins for the embedding model.
+
+Spawned pool workers import their model factory by module path and never
+run a test module's sys.modules patches, so factories used with
+EmbeddingPool must live in a module like this one.
+"""
+
+import os
+import zlib
+
+import numpy as np
+
+
+class MockSentenceTransformer:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def encode(self, texts):
+        if any(t == "poison" for t in texts):
+            raise ValueError("cannot encode poison")
+        # Rows carry the text length and encoding pid so order and sharding are visible
+        return np.array([[len(t), os.getpid()] + [0.0] * 382 for t in texts], dtype=np.float32)
+
+
+def mock_sentence_transformer(model_name):
+    return MockSentenceTransformer(model_name)
+
+
+def broken_sentence_transformer(model_name):
+    raise OSError(f"model files for {model_name} are missing")
+
+
+class HashingSentenceTransformer:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def encode(self, texts):
+        # A fixed random direction per text, so equal texts are nearest neighbours
+        return np.array([np.random.default_rng(zlib.crc32(t.encode())).standard_normal(384) for t in texts],
+                        dtype=np.float32)
+
+
+def hashing_sentence_transformer(model_name):
+    return HashingSentenceTransformer(model_name)
@@ -0,0 +1,111 @@
+from typing import List
+
+import numpy as np
+
+
+class SemanticCache:
+    """Response cache matched by prompt embedding similarity instead of exact text.
+
+    Entries are kept per namespace (one per agent) in a fixed-size ring of
+    unit vectors, so a lookup is one matrix-vector product. A lookup hits when
+    the best cosine similarity reaches that namespace's threshold. Within a
+    namespace, entries are further split by partition, the fingerprint of
+    whatever besides the prompt shapes a response (schema, budget), so a
+    paraphrase never gets an answer produced under different settings.
+    """
+
+    DEFAULT_THRESHOLD = 0.92
+    # Planner commands are short paraphrases; debug re-plans must match more tightly
+    THRESHOLDS = {"planner": 0.9, "debug": 0.95}
+    MAX_ENTRIES = 5000  # Per namespace and partition; the oldest entry is overwritten when full
+    NEAR_MISS_MARGIN = 0.05  # Misses this close to the threshold are counted for tuning
+
+    def __init__(self, embedding_model, thresholds: dict = None, max_entries: int = None):
+        self.embedding_model = embedding_model
+        self.thresholds = {**self.THRESHOLDS, **(thresholds or {})}
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self._namespaces = {}
+
+    def set_threshold(self, namespace: str, threshold: float):
+        self.thresholds[namespace] = threshold
+
+    def _namespace(self, namespace: str) -> dict:
+        if namespace not in self._namespaces:
+            self._namespaces[namespace] = {
+                "partitions": {},
+                "lookups": 0,
+                "hits": 0,
+                "near_misses": 0,
+                "hit_similarity_sum": 0.0,
+                "min_hit_similarity": None,
+            }
+        return self._namespaces[namespace]
+
+    def _partition(self, ns: dict, partition: str) -> dict:
+        if partition not in ns["partitions"]:
+            ns["partitions"][partition] = {
+                "vectors": np.zeros((0, self.embedding_model.EMBEDDING_DIM), dtype=np.float32),
+                "responses": [],
+                "next": 0,
+            }
+        return ns["partitions"][partition]
+
+    async def alookup(self, texts: List[str], namespace: str = "default", partition: str = "") -> list:
+        """Return the cached response for each text, or None where nothing is close enough"""
+        ns = self._namespace(namespace)
+        ns["lookups"] += len(texts)
+        entries = self._partition(ns, partition)
+        if not len(entries["responses"]):
+            return [None] * len(texts)
+        threshold = self.thresholds.get(namespace, self.DEFAULT_THRESHOLD)
+        queries = await self.embedding_model.aembed_array(texts, normalize=True)
+        similarities = queries @ entries["vectors"][:len(entries["responses"])].T
+        best = np.argmax(similarities, axis=1)
+        results = []
+        for i, j in enumerate(best):
+            similarity = float(similarities[i, j])
+            if similarity >= threshold:
+                ns["hits"] += 1
+                ns["hit_similarity_sum"] += similarity
+                if ns["min_hit_similarity"] is None or similarity < ns["min_hit_similarity"]:
+                    ns["min_hit_similarity"] = similarity
+                results.append(entries["responses"][j])
+            else:
+                if similarity >= threshold - self.NEAR_MISS_MARGIN:
+                    ns["near_misses"] += 1
+                results.append(None)
+        return results
+
+    async def aadd(self, texts: List[str], responses: list, namespace: str = "default", partition: str = ""):
+        entries = self._partition(self._namespace(namespace), partition)
+        vectors = await self.embedding_model.aembed_array(texts, normalize=True)
+        for vector, response in zip(vectors, responses):
+            count = len(entries["responses"])
+            if count < self.max_entries:
+                if count == len(entries["vectors"]):
+                    # Grow geometrically so inserts stay amortised O(1)
+                    grown = np.zeros((min(max(16, 2 * count), self.max_entries), vectors.shape[1]), dtype=np.float32)
+                    grown[:count] = entries["vectors"]
+                    entries["vectors"] = grown
+                entries["vectors"][count] = vector
+                entries["responses"].append(response)
+            else:
+                entries["vectors"][entries["next"]] = vector
+                entries["responses"][entries["next"]] = response
+                entries["next"] = (entries["next"] + 1) % self.max_entries
+
+    def stats(self) -> dict:
+        """Per-namespace hit rate and similarity of accepted hits"""
+        report = {}
+        for name, ns in self._namespaces.items():
+            report[name] = {
+                "entries": sum(len(entries["responses"]) for entries in ns["partitions"].values()),
+                "lookups": ns["lookups"],
+                "hits": ns["hits"],
+                "hit_rate": ns["hits"] / ns["lookups"] if ns["lookups"] else 0.0,
+                "near_misses": ns["near_misses"],
+                "mean_hit_similarity": ns["hit_similarity_sum"] / ns["hits"] if ns["hits"] else None,
+                "min_hit_similarity": ns["min_hit_similarity"],
+                "threshold": self.thresholds.get(name, self.DEFAULT_THRESHOLD),
+            }
+        return report
@@ -0,0 +1,123 @@
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from cache_store import CacheStore
+
+PERSIST_SHARED_CACHES = os.getenv("AXIOM_PERSIST_AGENT_CACHES") == "1"
+
+
+class TTLCache:
+    """LRU cache with per-entry TTL.
+
+    Expiry times are kept in a min-heap, so purging expired entries costs
+    O(log n) per expired entry instead of a scan of the whole cache on every
+    lookup. With a CacheStore attached, writes are persisted and unexpired
+    entries are reloaded on start.
+    """
+
+    def __init__(self, maxsize: int = 100, ttl: float = 3600, store: CacheStore = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._heap = []  # (expires_at, key); may hold stale pairs for overwritten keys
+        self._lock = threading.Lock()
+        self._store = store
+        if store is not None:
+            now = time.time()
+            for key, (value, expires_at) in store.items(limit=maxsize):
+                if expires_at > now:
+                    self._insert(key, value, expires_at)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            self._expire(time.time())
+            return key in self._data
+
+    def _expire(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            entry = self._data.get(key)
+            # Skip heap pairs left behind when the key was overwritten
+            if entry is not None and entry[1] == expires_at:
+                del self._data[key]
+                self.expirations += 1
+
+    def _insert(self, key, value, expires_at: float):
+        if key in self._data:
+            self._data.move_to_end(key)
+        elif len(self._data) >= self.maxsize:
+            self._data.popitem(last=False)  # Remove LRU
+            self.evictions += 1
+        self._data[key] = (value, expires_at)
+        heapq.heappush(self._heap, (expires_at, key))
+        if len(self._heap) > 2 * len(self._data) + 64:
+            # Drop stale pairs so the heap stays proportional to the cache
+            self._heap = [(exp, k) for k, (_, exp) in self._data.items()]
+            heapq.heapify(self._heap)
+
+    def get(self, key):
+        with self._lock:
+            self._expire(time.time())
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)  # LRU
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._insert(key, value, expires_at)
+        if self._store is not None:
+            self._store.set(key, [value, expires_at])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._heap.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache(namespace: str, maxsize: int = 100, ttl: float = 3600, persist: bool = None) -> TTLCache:
+    """Return the process-wide cache for namespace, creating it on first use.
+
+    A process can hold several agents of one kind, such as the
+    orchestrator's and the daemon's. They share answers and the optional
+    on-disk store only because the cache lives here rather than on the
+    agent instance.
+    """
+    with _shared_lock:
+        if namespace not in _shared_caches:
+            persist = PERSIST_SHARED_CACHES if persist is None else persist
+            store = CacheStore(f"{namespace}_cache.db", max_entries=maxsize * 10) if persist else None
+            _shared_caches[namespace] = TTLCache(maxsize, ttl, store)
+        return _shared_caches[namespace]
+
+
+def shared_cache_stats() -> dict:
+    with _shared_lock:
+        return {namespace: cache.stats() for namespace, cache in _shared_caches.items()}
@@ -1,16 +1,63 @@
 import argparse
+import sys
+
+# Heavy modules (torch, transformers, the agents) are imported inside the
+# commands that need them, so the rest of the CLI starts in milliseconds
+
+
+def plan(command: str):
+    """Print command's subtasks, from the inference daemon when one is running"""
+    from inference_daemon import DaemonClient, DaemonTimeout, DaemonUnavailable
+    try:
+        subtasks = DaemonClient().call("plan", command=command)
+    except DaemonTimeout as e:
+        # A busy daemon still holds the model; loading a second copy here would be slower
+        sys.exit(f"{e}; it may still be loading its model, so try again shortly")
+    except DaemonUnavailable:
+        from llm_inference import LLMInference
+        # Start loading the model now; a cached plan is answered without waiting for it
+        LLMInference.warm_up()
+        from agents.planner_agent import PlannerAgent
+        subtasks = PlannerAgent().decompose(command)
+    for subtask in subtasks:
+        print(subtask)
+
+
+def serve():
+    from inference_daemon import InferenceDaemon
+    InferenceDaemon().run()
+
+
+def cache_stats():
+    from llm_inference import LLMInference
+    from cache_store import CacheStore
+    store = CacheStore(LLMInference.CACHE_FILE)
+    print(f"LLM cache: {len(store)} responses in {LLMInference.CACHE_FILE}")
+    store.close()
+
 
 def main():
     parser = argparse.ArgumentParser(description='Sovereign Gemini CLI')
     parser.add_argument('--nl', help='Natural language command')
     parser.add_argument('--context-id', default='default')
+    parser.add_argument('--plan', metavar='COMMAND', help='Decompose COMMAND into subtasks with the planner')
+    parser.add_argument('--cache-stats', action='store_true', help='Show response cache size without loading the model')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run the inference daemon that hosts the models for every CLI call')
     args = parser.parse_args()
 
-    # Placeholder for orchestrator call
-    if args.nl:
+    if args.serve:
+        serve()
+    elif args.plan:
+        plan(args.plan)
+    elif args.cache_stats:
+        cache_stats()
+    elif args.nl:
         print(f"Processing NL: {args.nl} with context {args.context_id}")
+        # Warm models live in the daemon; without one, planning runs in this process
+        plan(args.nl)
     else:
         print("Use --nl for natural language commands")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,60 @@
+import json
+
+
+def valid_json(text: str) -> bool:
+    """Stop callback: true once the generated text is a complete JSON object or array"""
+    text = text.strip()
+    # Only a closing bracket can complete a document, so skip the parse otherwise
+    if not text or text[-1] not in "}]" or text[0] not in "{[":
+        return False
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+
+class StopCriteria:
+    """generate() stopping criterion for stop strings and stop callbacks.
+
+    Each row's generated text is checked after every token and the first
+    match is remembered, so finish() can trim the text at the stop point and
+    report why the row stopped. generate() ends once every row has stopped.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, stop=(), callbacks=()):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop = [s for s in stop if s]
+        self.callbacks = list(callbacks)
+        self._lookback = max((len(s) for s in self.stop), default=0)
+        self._rows = []  # per row: [tokens checked, chars searched, (reason, end) or None]
+
+    def _text(self, row_ids) -> str:
+        return self.tokenizer.decode(row_ids[self.prompt_length:], skip_special_tokens=True)
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        for row in range(len(input_ids)):
+            if row == len(self._rows):
+                self._rows.append([0, 0, None])
+            checked, searched, stopped = self._rows[row]
+            length = len(input_ids[row]) - self.prompt_length
+            if stopped is not None or length == checked:
+                continue
+            text = self._text(input_ids[row])
+            # A stop string may straddle the previous and the new tokens
+            start = max(0, searched - self._lookback)
+            ends = [text.find(s, start) + len(s) for s in self.stop if text.find(s, start) >= 0]
+            if ends:
+                stopped = ("stop_string", min(ends))
+            elif any(callback(text) for callback in self.callbacks):
+                stopped = ("callback", len(text))
+            self._rows[row] = [length, len(text), stopped]
+        return bool(self._rows) and all(stopped is not None for _, _, stopped in self._rows)
+
+    def finish(self, row: int, text: str):
+        """(text trimmed after the stop point, stop reason or None) for a decoded row"""
+        if row >= len(self._rows) or self._rows[row][2] is None:
+            return text, None
+        reason, end = self._rows[row][2]
+        return text[:end], reason
@@ -103,15 +103,17 @@ class MockCuda:
 class MockTorch:
     cuda = MockCuda()
 
-# Monkey patch the imports
-sys.modules['transformers'] = type(sys)('transformers')
-sys.modules['transformers'].AutoTokenizer = MockAutoTokenizer
-sys.modules['transformers'].AutoModelForCausalLM = MockAutoModelForCausalLM
-sys.modules['torch'] = MockTorch
+mock_transformers = type(sys)('transformers')
+mock_transformers.AutoTokenizer = MockAutoTokenizer
+mock_transformers.AutoModelForCausalLM = MockAutoModelForCausalLM
+mock_transformers.StoppingCriteriaList = list
+mock_transformers.LogitsProcessorList = list
+MOCK_MODULES = {'transformers': mock_transformers, 'torch': MockTorch}
 
 # Import agents
 from agents.planner_agent import PlannerAgent
 from agents.debug_agent import DebugAgent
+from json_constraint import JSONSchemaAutomaton
 
 # Set up logging to capture messages
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -208,11 +210,51 @@ def test_ttl_expiration():
 
     return True
 
+def test_planner_dag():
+    print("\nTesting PlannerAgent DAG output...")
+
+    planner = PlannerAgent()
+
+    # Inferred dependencies: LLM queries only wait for the install, git steps chain
+    dag = planner.to_dag(["check_install_deps", "git_init", "query llm readme", "git commit"])
+    assert [t["depends_on"] for t in dag] == [[], [0], [0], [1]], dag
+    assert [t["agent"] for t in dag] == ["deps", "git", "llm", "git"], dag
+    assert planner.critical_path_cost(dag) == 35.0, planner.critical_path_cost(dag)
+
+    # Explicit ids are renumbered; cycles and dangling ids fall back to inference
+    explicit = [{"id": "a", "task": "git_init", "depends_on": []}, {"id": "b", "task": "query llm x", "depends_on": ["a"]}]
+    assert [t["depends_on"] for t in planner.to_dag(explicit)] == [[], [0]]
+    cyclic = [{"id": 1, "task": "git_init", "depends_on": [2]}, {"id": 2, "task": "git commit", "depends_on": [1]}]
+    assert [t["depends_on"] for t in planner.to_dag(cyclic)] == [[], [0]]
+    dangling = [{"id": 1, "task": "git_init", "depends_on": [7]}]
+    assert planner.to_dag(dangling)[0]["depends_on"] == []
+
+    # DAG requests constrain the model to tasks that name prerequisites by position
+    automaton = JSONSchemaAutomaton(planner._request("x", as_dag=True)[1])
+    response = '{"subtasks": [{"task": "git_init", "depends_on": []}, {"task": "query llm x", "depends_on": []}, ' \
+               '{"task": "git commit", "depends_on": [0, 1]}]}'
+    assert automaton.is_complete(automaton.step_text(automaton.initial, response))
+    positional = planner.to_dag(planner._parse_subtasks(response, "x"))
+    assert [t["depends_on"] for t in positional] == [[], [], [0, 1]], positional
+
+    # DAGs are cached separately from flat results for the same command
+    flat = planner.decompose("Make a DAG")
+    dag = planner.decompose("Make a DAG", as_dag=True)
+    assert all(isinstance(t, str) for t in flat)
+    assert [t["task"] for t in dag] == flat
+    assert planner.decompose("Make a DAG", as_dag=True) is dag
+    assert planner.batch_decompose(["Make a DAG"], as_dag=True)[0] is dag
+    print("✓ PlannerAgent DAG output works")
+
+    return True
+
 if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
     try:
         test_planner_agent_caching()
         test_debug_agent_caching()
         test_ttl_expiration()
+        test_planner_dag()
         print("\n✅ All agent caching tests passed!")
     except Exception as e:
         print(f"\n❌ Test failed: {e}")
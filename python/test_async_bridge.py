@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared event-loop bridge used by sync entry points.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+class MockTokenizer:
+    pad_token = "[PAD]"
+    pad_token_id = 0
+
+    def __call__(self, prompts, return_tensors="pt", padding=False):
+        prompts = [prompts] if isinstance(prompts, str) else prompts
+        return {"input_ids": [[1, 2, 3]] * len(prompts)}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "Mock response"
+
+class MockModel:
+    def __init__(self):
+        self.batch_sizes = []
+        self.delay = 0
+
+    def generate(self, input_ids=None, **kwargs):
+        self.batch_sizes.append(len(input_ids))
+        time.sleep(self.delay)
+        return [row + [4] for row in input_ids]
+
+    def to(self, device):
+        return self
+
+class MockAutoTokenizer:
+    @staticmethod
+    def from_pretrained(model_name):
+        return MockTokenizer()
+
+class MockAutoModelForCausalLM:
+    @staticmethod
+    def from_pretrained(model_name):
+        return MockModel()
+
+class MockCuda:
+    @staticmethod
+    def is_available():
+        return False
+
+class MockTorch:
+    cuda = MockCuda()
+
+mock_transformers = type(sys)('transformers')
+mock_transformers.AutoTokenizer = MockAutoTokenizer
+mock_transformers.AutoModelForCausalLM = MockAutoModelForCausalLM
+MOCK_MODULES = {'transformers': mock_transformers, 'torch': MockTorch}
+
+from async_bridge import AsyncBridge, get_bridge, run_sync
+from llm_inference import LLMInference
+
+async def current_loop():
+    await asyncio.sleep(0)
+    return asyncio.get_running_loop()
+
+def test_bridge_reuses_one_loop():
+    print("Testing AsyncBridge loop reuse...")
+
+    first = run_sync(current_loop())
+    assert run_sync(current_loop()) is first is get_bridge().loop, "Every call should share one loop"
+
+    # Sync APIs also work from code that is already running a loop
+    async def caller():
+        return run_sync(current_loop())
+    assert asyncio.run(caller()) is first
+
+    # ...but not from the bridge loop itself, which would deadlock
+    async def reentrant():
+        return run_sync(current_loop())
+    try:
+        run_sync(reentrant())
+        assert False, "Re-entrant call should raise"
+    except RuntimeError:
+        pass
+    print("✓ One loop serves every sync call, including from inside other loops")
+
+    return True
+
+def test_bounded_executor():
+    print("\nTesting bounded executor...")
+
+    bridge = AsyncBridge(workers=2)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    async def fan_out():
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(None, work) for _ in range(8)])
+
+    bridge.run(fan_out())
+    assert max(peak) == 2, f"At most 2 workers should run at once, saw {max(peak)}"
+    bridge.close()
+    print("✓ Executor work is capped at the configured thread count")
+
+    return True
+
+def test_threads_share_micro_batches():
+    print("\nTesting sync generate from several threads...")
+
+    LLMInference.CACHE_FILE = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+    llm = LLMInference()
+    llm.model.batch_sizes.clear()
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(llm.generate(f"thread prompt {i}"))) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["Mock response"] * 4, results
+    assert sum(llm.model.batch_sizes) == 4 and len(llm.model.batch_sizes) < 4, llm.model.batch_sizes
+    print(f"✓ Sync calls from 4 threads ran as batches {llm.model.batch_sizes}")
+
+    return True
+
+def test_single_flight_generation():
+    print("\nTesting in-flight request coalescing...")
+
+    llm = LLMInference()
+    llm.model.batch_sizes.clear()
+    llm.model.delay = 0.1
+
+    async def retry_storm():
+        first = asyncio.ensure_future(llm.agenerate("Re-plan for error: flaky"))
+        # Past the batch window, so the first request is already generating
+        await asyncio.sleep(0.05)
+        return await asyncio.gather(
+            first,
+            llm.agenerate("Re-plan for error: flaky"),
+            llm.agenerate(["Re-plan for error: flaky"] * 3 + ["Re-plan for error: other"] * 2),
+        )
+
+    single, joined, batch = run_sync(retry_storm())
+    llm.model.delay = 0
+    assert single == joined == "Mock response" and batch == ["Mock response"] * 5, batch
+    assert sum(llm.model.batch_sizes) == 2, f"Each distinct prompt should run once: {llm.model.batch_sizes}"
+    assert len(llm._inflight) == 0, "Finished requests should leave the in-flight table"
+    print(f"✓ 7 requests for 2 distinct prompts generated {sum(llm.model.batch_sizes)} rows")
+
+    return True
+
+if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
+    try:
+        test_bridge_reuses_one_loop()
+        test_bounded_executor()
+        test_threads_share_micro_batches()
+        test_single_flight_generation()
+        print("\n✅ All async bridge tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
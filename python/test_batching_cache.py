@@ -106,14 +106,14 @@ class MockCuda:
 class MockTorch:
     cuda = MockCuda()
 
-# Monkey patch the imports
-sys.modules['transformers'] = type(sys)('transformers')
-sys.modules['transformers'].AutoTokenizer = MockAutoTokenizer
-sys.modules['transformers'].AutoModelForCausalLM = MockAutoModelForCausalLM
-sys.modules['torch'] = MockTorch
+mock_transformers = type(sys)('transformers')
+mock_transformers.AutoTokenizer = MockAutoTokenizer
+mock_transformers.AutoModelForCausalLM = MockAutoModelForCausalLM
+MOCK_MODULES = {'transformers': mock_transformers, 'torch': MockTorch}
 
 # Import LLMInference
-from llm_inference import LLMInference
+from llm_inference import LLMInference, PrefixCache
+from batching import length_buckets
 
 # Set up logging to capture messages
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -157,5 +157,129 @@ def test_batching_and_caching():
 
     print("\n✅ All batching and caching tests passed!")
 
+def test_concurrent_micro_batching():
+    print("Testing micro-batching of concurrent single prompts...")
+
+    import asyncio
+    llm = LLMInference()
+    calls = []
+    original_generate = llm.model.generate
+
+    def counting_generate(*args, **kwargs):
+        calls.append(kwargs.get("input_ids"))
+        return original_generate(*args, **kwargs)
+
+    llm.model.generate = counting_generate
+    try:
+        async def run():
+            prompts = [f"Concurrent prompt {i} {time.time()}" for i in range(4)]
+            return await asyncio.gather(*(llm.agenerate(p) for p in prompts))
+
+        responses = asyncio.run(run())
+    finally:
+        llm.model.generate = original_generate
+
+    assert len(responses) == 4, "Each caller should get its own response"
+    assert len(calls) == 1, "Concurrent prompts should share one generate call"
+    assert len(calls[0]) == 4, "Batched generate should see all queued prompts"
+    print("✓ Concurrent prompts batched into one generate")
+
+def test_length_bucketing():
+    print("Testing length-bucketed batches under a token budget...")
+
+    # Sorted by length, cut so rows * (longest + extra) stays within budget
+    assert length_buckets([50, 5, 6, 40, 7], token_budget=30) == [[1, 2, 4], [3], [0]]
+    assert length_buckets([5, 6, 7], token_budget=30, extra_tokens=5) == [[0, 1], [2]]
+    assert length_buckets([100], token_budget=30) == [[0]], "Oversized items still run alone"
+
+    llm = LLMInference()
+    batches = []
+    original_bucket = llm._generate_bucket
+
+    async def recording_bucket(prompts, *args):
+        batches.append(prompts)
+        return [f"response to {p}" for p in prompts]
+
+    llm._generate_bucket = recording_bucket
+    llm._token_lengths = lambda prompts: [len(p) for p in prompts]
+    llm.BATCH_TOKEN_BUDGET = 3 * (10 + 4)
+    try:
+        prompts = [f"short {i} {time.time()}"[:8] for i in range(3)] + ["a much longer prompt " * 4]
+        options = llm._generation_options("default", max_new_tokens=4)
+        import asyncio
+        responses = asyncio.run(llm._generate_batch(prompts, None, options))
+    finally:
+        llm._generate_bucket = original_bucket
+        del llm._token_lengths
+        del llm.BATCH_TOKEN_BUDGET
+
+    assert responses == [f"response to {p}" for p in prompts], "Responses must keep the input order"
+    assert batches == [prompts[:3], prompts[3:]], f"Long prompt should not pad the short ones: {batches}"
+    print("✓ Short prompts batched apart from the long one, order restored")
+
+class MockKV:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+def test_prefix_cache_lru():
+    print("Testing prefix KV cache matching and byte-bounded eviction...")
+
+    cache = PrefixCache(max_bytes=100)
+    cache.register("System:")
+    assert cache.match("System: do things") == "System:", "Registered prefix should match"
+    assert cache.match("Other prompt") is None, "Unrelated prompt should not match"
+
+    # Unregistered first lines are cached only after being seen repeatedly
+    for _ in range(PrefixCache.MIN_HITS - 1):
+        assert cache.match("Header\nbody") is None
+    assert cache.match("Header\nbody") == "Header\n", "Frequent first line should match"
+
+    cache.put("a", [1], [(MockKV(30), MockKV(30))])
+    cache.put("b", [2], [(MockKV(20), MockKV(20))])
+    assert cache.get("a") is not None, "Cached prefix should hit"
+    cache.put("c", [3], [(MockKV(20), MockKV(20))])
+    assert cache.get("b") is None, "Least recently used prefix should be evicted"
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.hits == 3 and cache.misses == 1
+    print("✓ Prefix cache works")
+
+def test_stale_response_format():
+    print("Testing that responses cached in an older format are not served...")
+
+    import hashlib
+    import tempfile
+    from collections import OrderedDict
+    from cache_store import CacheStore
+
+    # Only the response cache is exercised, so skip loading a model
+    llm = object.__new__(LLMInference)
+    llm.cache = OrderedDict()
+    llm._store = CacheStore(os.path.join(tempfile.mkdtemp(), "llm_cache.db"))
+    try:
+        prompt = "Explain git rebase"
+        # Keyed the way responses that echoed the prompt were
+        llm._store.set(hashlib.md5(prompt.encode()).hexdigest(), prompt + " It replays commits.")
+        llm._store.flush()
+        assert llm._get_cached_response(prompt) is None, "Prompt-echo entries must not be served"
+
+        llm._set_cached_response(prompt, "It replays commits.")
+        llm._store.flush()
+        llm.cache.clear()
+        assert llm._get_cached_response(prompt) == "It replays commits."
+    finally:
+        llm._store.close()
+    print("✓ Only current-format responses hit")
+
 if __name__ == "__main__":
-    test_batching_and_caching()
\ No newline at end of file
+    sys.modules.update(MOCK_MODULES)
+    test_batching_and_caching()
+    test_concurrent_micro_batching()
+    test_length_bucketing()
+    test_prefix_cache_lru()
+    test_stale_response_format()
\ No newline at end of file
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the SQLite-backed persistent CacheStore.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from cache_store import CacheStore
+
+def test_set_get_and_persistence():
+    print("Testing CacheStore set/get and persistence...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+        store = CacheStore(path)
+        store.set("a", "response a")
+        store.set("b", [0.1, 0.2])
+        store.flush()
+        assert store.get("a") == "response a", "Stored value should be readable"
+        assert store.get("b") == [0.1, 0.2], "JSON values should round-trip"
+        assert store.get("missing") is None, "Unknown key should miss"
+        store.close()
+
+        reopened = CacheStore(path)
+        assert len(reopened) == 2, "Entries should survive reopening"
+        assert [k for k, _ in reopened.items()] == ["a", "b"], "Items should be oldest first"
+        assert [k for k, _ in reopened.items(limit=1)] == ["b"], "Limit should keep the newest"
+        reopened.close()
+    print("✓ CacheStore persistence works")
+
+def test_compaction_and_legacy_import():
+    print("Testing CacheStore compaction and legacy JSON import...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "legacy.json")
+        with open(legacy, 'w') as f:
+            json.dump({f"k{i}": i for i in range(20)}, f)
+
+        store = CacheStore(os.path.join(tmp, "cache.db"), max_entries=5)
+        assert store.import_json(legacy) == 20, "Legacy entries should be imported"
+        assert store.import_json(legacy) == 0, "Import should only run on an empty store"
+        store.compact()
+        assert len(store) == 5, "Compaction should trim to max_entries"
+        assert [k for k, _ in store.items()] == [f"k{i}" for i in range(15, 20)], "Newest entries should survive"
+        store.close()
+    print("✓ CacheStore compaction works")
+
+def test_concurrent_writers():
+    print("Testing CacheStore with concurrent writers...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+        stores = [CacheStore(path) for _ in range(2)]
+
+        def write(store, offset):
+            for i in range(200):
+                store.set(f"key{offset + i}", i)
+
+        threads = [threading.Thread(target=write, args=(s, n * 1000)) for n, s in enumerate(stores)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for s in stores:
+            s.flush()
+        assert len(stores[0]) == 400, "Writes from both connections should land"
+        for s in stores:
+            s.close()
+    print("✓ CacheStore concurrent writes work")
+
+if __name__ == "__main__":
+    test_set_get_and_persistence()
+    test_compaction_and_legacy_import()
+    test_concurrent_writers()
+    print("\n✅ All CacheStore tests passed!")
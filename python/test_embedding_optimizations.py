@@ -3,36 +3,53 @@
 Test script to verify singleton, caching, and batching functionality in EmbeddingModel.
 """
 
+import asyncio
+import re
 import sys
 import os
+import tempfile
 import time
+import numpy as np
 
 # Mock sentence_transformers to avoid dependency issues
-class MockEmbedding:
-    def __init__(self, data):
-        self.data = data
-
-    def tolist(self):
-        return self.data
-
 class MockSentenceTransformer:
     def __init__(self, model_name):
         self.model_name = model_name
+        self.encoded = []
+        self.delay = 0
 
     def encode(self, texts):
+        self.encoded.append(texts)
+        time.sleep(self.delay)
         if isinstance(texts, str):
             # Single text - return mock embedding
-            return MockEmbedding([0.1] * 384)  # 384 dimensions like real model
+            return np.full(384, 0.1, dtype=np.float32)  # 384 dimensions like real model
         else:
             # Batch - return list of embeddings
-            return MockEmbedding([[0.1] * 384 for _ in texts])
+            return np.full((len(texts), 384), 0.1, dtype=np.float32)
+
+# Word-level fast tokenizer: every whitespace-separated word is one token
+class MockFastTokenizer:
+    is_fast = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False, verbose=True):
+        self.calls += 1
+        if return_offsets_mapping:
+            return {"offset_mapping": [m.span() for m in re.finditer(r"\S+", texts)]}
+        return {"input_ids": [[0] * (len(t.split()) + 2) for t in texts]}
+
+    def num_special_tokens_to_add(self):
+        return 2
 
-# Monkey patch
-sys.modules['sentence_transformers'] = type(sys)('sentence_transformers')
-sys.modules['sentence_transformers'].SentenceTransformer = MockSentenceTransformer
+mock_sentence_transformers = type(sys)('sentence_transformers')
+mock_sentence_transformers.SentenceTransformer = MockSentenceTransformer
+MOCK_MODULES = {'sentence_transformers': mock_sentence_transformers}
 
-# Import after mocking
-from embedding_model import EmbeddingModel
+from embedding_model import ByteLRUCache, EmbeddingModel
+from embedding_store import EmbeddingStore
 
 def test_singleton():
     print("Testing singleton pattern...")
@@ -106,6 +123,147 @@ def test_cache_size_limit():
     assert len(emb._cache) <= emb.CACHE_SIZE, "Cache should not exceed size limit"
     print("✓ Cache size limit works")
 
+def test_lru_recency_and_stats():
+    print("Testing LRU recency and byte-bounded eviction...")
+
+    entry = np.zeros(4, dtype=np.float32)  # 16 bytes + 1-byte key
+    cache = ByteLRUCache(max_bytes=3 * 17)
+    for key in "abc":
+        cache.put(key, entry)
+    assert cache.get("a") is not None, "Entry should be cached"
+    cache.put("d", entry)
+    assert "b" not in cache, "Least recently used entry should be evicted"
+    assert "a" in cache, "A hit should refresh recency"
+    assert cache.bytes <= cache.max_bytes, "Cache should stay within its byte budget"
+    assert (cache.hits, cache.evictions) == (1, 1)
+
+    emb = EmbeddingModel()
+    stats = emb.cache_stats()
+    assert {"hits", "misses", "evictions", "bytes"} <= set(stats), "Counters should be exposed"
+    print("✓ LRU recency and stats work")
+
+def test_hot_tier_survives_row_recycling():
+    print("Testing hot-tier vectors when the store recycles rows...")
+
+    model = EmbeddingModel.get_instance()
+    saved = model._store, model._cache
+    tmp = tempfile.mkdtemp()
+    model._store = EmbeddingStore(os.path.join(tmp, "v.f32"), os.path.join(tmp, "i.db"), 384, 4)
+    model._cache = ByteLRUCache(1 << 20)
+    try:
+        for value, key in enumerate("abcd", start=1):
+            model._store_embedding(key, np.full(384, float(value), dtype=np.float32))
+        assert model._lookup("a")[0] == 1.0
+        # A full store recycles its least recently used row; the hot hit on "a" spared it
+        model._store_embedding("e", np.full(384, 5.0, dtype=np.float32))
+        assert "a" in model._store and "b" not in model._store
+        assert model._lookup("a")[0] == 1.0 and model._store.get("a")[0] == 1.0
+        # Even a recycled row must not leak into a vector already in the hot tier
+        for value, key in enumerate("fghi", start=6):
+            model._store_embedding(key, np.full(384, float(value), dtype=np.float32))
+        assert "a" not in model._store and model._lookup("a")[0] == 1.0
+    finally:
+        model._store.close()
+        model._store, model._cache = saved
+    print("✓ Hot-tier vectors are copies and hot hits refresh store recency")
+
+def test_embed_array():
+    print("Testing ndarray embedding API...")
+
+    emb = EmbeddingModel()
+    texts = ["Array one", "Array two", "Array one"]
+    embeddings = emb.embed_array(texts, normalize=True)
+    assert isinstance(embeddings, np.ndarray), "Batch should be an ndarray"
+    assert embeddings.shape == (3, 384) and embeddings.dtype == np.float32
+    assert embeddings.flags['C_CONTIGUOUS'], "Batch should be contiguous"
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0), "Rows should be unit length"
+    assert emb.embed_array("Array one").shape == (384,), "Single text should be one row"
+    print("✓ ndarray embedding API works")
+
+def test_single_flight_encoding():
+    print("\nTesting in-flight embedding coalescing...")
+    model = EmbeddingModel.get_instance()
+    model.model.encoded.clear()
+    model.model.delay = 0.1
+
+    # Unique per run, so the persistent cache cannot answer them
+    text = f"coalesced text {time.time()}"
+    other = f"another {text}"
+
+    async def concurrent():
+        return await asyncio.gather(
+            model.aembed_array(text),
+            model.aembed_array([text, text, other]),
+        )
+
+    single, batch = asyncio.run(concurrent())
+    model.model.delay = 0
+    encoded = [t for texts in model.model.encoded for t in texts]
+    assert sorted(encoded) == [other, text], encoded
+    assert np.array_equal(single, batch[0]) and np.array_equal(batch[0], batch[1])
+    assert len(model._inflight) == 0
+    print(f"✓ 4 requests for 2 distinct texts encoded {len(encoded)} texts")
+
+def test_length_bucketed_encoding():
+    print("\nTesting length-bucketed encode calls...")
+    model = EmbeddingModel.get_instance()
+    model.model.encoded.clear()
+    model.ENCODE_TOKEN_BUDGET = 40
+    try:
+        stamp = time.time()
+        texts = [f"bucket {i} {stamp}" for i in range(3)] + [f"a long bucketed document {stamp} " * 10, f"bucket 3 {stamp}"]
+        result = model.embed_array(texts)
+    finally:
+        del model.ENCODE_TOKEN_BUDGET
+    assert result.shape == (5, 384)
+    assert model.model.encoded == [texts[:3] + texts[4:], texts[3:4]], model.model.encoded
+    print("✓ Short texts encoded apart from the long one")
+
+def test_streaming_chunked_embedding():
+    print("\nTesting streaming chunked embedding...")
+    model = EmbeddingModel.get_instance()
+    stamp = time.time()
+    words = [f"w{i}-{stamp}" for i in range(10)]
+
+    # 10 tokens in windows of 4 overlapping by 1: starts 0, 3, 6
+    chunks = list(model.chunk_documents([("long", " ".join(words)), "short"], chunk_tokens=4, overlap=1))
+    assert [(doc_id, idx) for doc_id, idx, _ in chunks] == [("long", 0), ("long", 1), ("long", 2), (1, 0)], chunks
+    assert chunks[1][2] == " ".join(words[3:7]), "Chunks should be sliced from the original text"
+    assert chunks[2][2] == " ".join(words[6:10])
+    try:
+        list(model.chunk_documents(["text"], chunk_tokens=4, overlap=4))
+        assert False, "overlap must be smaller than the window"
+    except ValueError:
+        pass
+
+    # Documents are read and encoded only as the consumer pulls
+    read = []
+    def documents():
+        for i in range(6):
+            read.append(i)
+            yield f"doc {i} {stamp}"
+
+    model.model.encoded.clear()
+    stream = model.embed_stream(documents(), batch_size=2)
+    doc_id, chunk_idx, vector = next(stream)
+    assert (doc_id, chunk_idx, vector.shape) == (0, 0, (384,))
+    assert read == [0, 1] and len(model.model.encoded) == 1, "Only the first batch should be read and encoded"
+    assert [doc_id for doc_id, _, _ in stream] == [1, 2, 3, 4, 5]
+
+    async def consume():
+        return [(doc_id, chunk_idx) async for doc_id, chunk_idx, _ in
+                model.aembed_stream([("a", " ".join(words)), ("b", "tail")], batch_size=2, chunk_tokens=4, overlap=1)]
+    assert asyncio.run(consume()) == [("a", 0), ("a", 1), ("a", 2), ("b", 0)]
+
+    # Bucketing reuses the chunker's token counts instead of tokenizing each batch again
+    model.model.tokenizer = MockFastTokenizer()
+    try:
+        streamed = list(model.embed_stream([f"fresh doc {i} {stamp}" for i in range(4)], batch_size=4))
+        assert len(streamed) == 4 and model.model.tokenizer.calls == 4, model.model.tokenizer.calls
+    finally:
+        del model.model.tokenizer
+    print("✓ Long documents are chunked and streamed batch by batch")
+
 def test_performance():
     print("Testing performance improvements...")
 
@@ -130,10 +288,17 @@ def test_performance():
     print(".2f")
 
 if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
     test_singleton()
     test_caching()
     test_batch_embedding()
     test_mixed_cache_and_batch()
     test_cache_size_limit()
+    test_lru_recency_and_stats()
+    test_hot_tier_survives_row_recycling()
+    test_embed_array()
+    test_single_flight_encoding()
+    test_length_bucketed_encoding()
+    test_streaming_chunked_embedding()
     test_performance()
     print("\n✅ All EmbeddingModel optimization tests passed!")
\ No newline at end of file
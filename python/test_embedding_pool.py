@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the multi-process embedding pool.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from embedding_pool import EmbeddingPool
+from embedding_model import EmbeddingModel
+from mock_models import broken_sentence_transformer, mock_sentence_transformer
+
+def test_pool_encode():
+    print("Testing EmbeddingPool sharding and shared-memory output...")
+
+    pool = EmbeddingPool(workers=2, model_name="mock", dim=384, model_factory=mock_sentence_transformer)
+    try:
+        texts = ["x" * (i % 17 + 1) for i in range(200)]
+        vectors = pool.encode(texts)
+        assert vectors.shape == (200, 384) and vectors.dtype == np.float32
+        assert vectors[:, 0].tolist() == [len(t) for t in texts], "Rows must come back in input order"
+        workers = set(vectors[:, 1].astype(int).tolist())
+        # Shards go to whichever worker is free, so one fast worker may take them all
+        assert workers <= {process.pid for process in pool._processes}, f"Rows should come from the workers: {workers}"
+        assert pool.encode([]).shape == (0, 384)
+
+        try:
+            pool.encode(["fine"] * 20 + ["poison"])
+            assert False, "Worker errors should be raised in the caller"
+        except RuntimeError as e:
+            assert "poison" in str(e)
+        # Failed batches leave the pool usable
+        assert pool.encode(["abc"] * 10)[:, 0].tolist() == [3.0] * 10
+    finally:
+        pool.close()
+    assert not pool.alive
+    print(f"✓ 200 texts encoded by workers {sorted(workers)} in input order")
+
+    return True
+
+def test_pool_startup_failure():
+    print("\nTesting EmbeddingPool startup errors...")
+
+    pool = EmbeddingPool(workers=1, model_name="mock", dim=384, model_factory=broken_sentence_transformer)
+    try:
+        pool.encode(["text"])
+        assert False, "A worker that cannot load its model should fail the batch"
+    except RuntimeError as e:
+        assert "model files for mock are missing" in str(e), str(e)
+    finally:
+        pool.close()
+    print("✓ The worker's startup traceback reaches the caller")
+
+    return True
+
+def test_model_uses_pool():
+    print("\nTesting EmbeddingModel opt-in pool mode...")
+
+    tmp = tempfile.mkdtemp()
+    saved = {name: EmbeddingModel.__dict__[name] for name in
+             ("_instance", "CACHE_FILE", "INDEX_FILE", "LEGACY_CACHE_FILE", "POOL_WORKERS", "POOL_MIN_BATCH", "MODEL_FACTORY")}
+    EmbeddingModel._instance = None
+    EmbeddingModel.CACHE_FILE = os.path.join(tmp, "embedding_cache.f32")
+    EmbeddingModel.INDEX_FILE = os.path.join(tmp, "embedding_index.db")
+    EmbeddingModel.LEGACY_CACHE_FILE = os.path.join(tmp, "embedding_cache.json")
+    EmbeddingModel.POOL_WORKERS = 2
+    EmbeddingModel.POOL_MIN_BATCH = 8
+    EmbeddingModel.MODEL_FACTORY = staticmethod(mock_sentence_transformer)
+    try:
+        model = EmbeddingModel.get_instance()
+        small = model.embed_array(["one", "two"])
+        assert set(small[:, 1].astype(int).tolist()) == {os.getpid()}, "Small batches stay in-process"
+        large = model.embed_array([f"text {i}" for i in range(40)])
+        assert os.getpid() not in set(large[:, 1].astype(int).tolist()), "Large batches go to the pool"
+        assert model.embed_array("text 7")[0] == len("text 7"), "Pool results are cached like any other"
+
+        # A batch a worker rejects fails on its own; the pool stays in use
+        try:
+            model.embed_array(["poison"] + [f"batch {i}" for i in range(39)])
+            assert False, "A rejected batch should raise"
+        except RuntimeError as e:
+            assert "poison" in str(e), e
+        assert model._get_pool() is not None and model._pool.alive
+
+        # A broken pool falls back to encoding in this process
+        for process in model._pool._processes:
+            process.kill()
+            process.join()
+        fallback = model.embed_array([f"after {i}" for i in range(40)])
+        assert set(fallback[:, 1].astype(int).tolist()) == {os.getpid()}
+        assert model._get_pool() is None
+        model._store.close()
+    finally:
+        for name, value in saved.items():
+            setattr(EmbeddingModel, name, value)
+    print("✓ Large batches use the pool; a dead pool falls back in-process")
+
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_pool_encode()
+        test_pool_startup_failure()
+        test_model_uses_pool()
+        print("\n✅ All embedding pool tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
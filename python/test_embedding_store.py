@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the memory-mapped EmbeddingStore.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+def _open(tmp, max_rows=100):
+    return EmbeddingStore(os.path.join(tmp, "vectors.f32"), os.path.join(tmp, "index.db"), 4, max_rows)
+
+def test_put_get_and_reload():
+    print("Testing EmbeddingStore put/get and reload...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _open(tmp)
+        view = store.put("a", [1.0, 2.0, 3.0, 4.0])
+        assert isinstance(view, np.ndarray) and view.dtype == np.float32, "Lookups should return float32 arrays"
+        assert store.get("a").tolist() == [1.0, 2.0, 3.0, 4.0]
+        assert store.get("missing") is None
+        store.close()
+
+        reopened = _open(tmp)
+        assert len(reopened) == 1, "Index should survive reopening"
+        assert reopened.get("a").tolist() == [1.0, 2.0, 3.0, 4.0], "Vectors should survive reopening"
+        reopened.close()
+    print("✓ EmbeddingStore persistence works")
+
+def test_growth_and_recycling():
+    print("Testing EmbeddingStore growth and row recycling...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _open(tmp, max_rows=EmbeddingStore.INITIAL_ROWS + 10)
+        first = store.put("k0", np.zeros(4))
+        for i in range(1, EmbeddingStore.INITIAL_ROWS + 10):
+            store.put(f"k{i}", np.full(4, i))
+        assert store.capacity == EmbeddingStore.INITIAL_ROWS + 10, "Matrix should grow up to max_rows"
+        assert first.tolist() == [0.0] * 4, "Views taken before growth should stay valid"
+
+        store.put("new", np.full(4, -1.0))
+        assert "k0" not in store, "Oldest key should be recycled once full"
+        assert len(store) == EmbeddingStore.INITIAL_ROWS + 10
+        store.delete("k1")
+        store.put("reuse", np.ones(4))
+        assert store.capacity == EmbeddingStore.INITIAL_ROWS + 10, "Freed rows should be reused"
+        store.close()
+    print("✓ EmbeddingStore growth and recycling work")
+
+def test_single_owner():
+    print("Testing EmbeddingStore ownership lock...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        owner = _open(tmp)
+        owner.put("a", np.ones(4))
+        try:
+            _open(tmp)
+            assert False, "A second writer must not share the owner's rows"
+        except RuntimeError as e:
+            assert "already open" in str(e)
+
+        private = EmbeddingStore(os.path.join(tmp, "vectors.f32"), os.path.join(tmp, "index.db"), 4, 100,
+                                 private_fallback=True)
+        assert private.matrix_path != owner.matrix_path and len(private) == 0, "Fallback store should start empty"
+        private.put("b", np.zeros(4))
+        assert "b" not in owner and owner.get("a").tolist() == [1.0] * 4, "Fallback writes stay private"
+        private_dir = os.path.dirname(private.matrix_path)
+        private.close()
+        assert not os.path.exists(private_dir), "Fallback files are removed on close"
+
+        owner.close()
+        reopened = _open(tmp)
+        assert reopened.get("a").tolist() == [1.0] * 4, "Closing releases the lock"
+        reopened.close()
+    print("✓ One store owns the files at a time")
+
+if __name__ == "__main__":
+    test_put_get_and_reload()
+    test_growth_and_recycling()
+    test_single_owner()
+    print("\n✅ All EmbeddingStore tests passed!")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Test script to verify LLM backend selection and fallbacks.
+"""
+
+import os
+import sys
+import tempfile
+
+class MockModel:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.device = None
+        self.quantized = False
+
+    def to(self, device):
+        self.device = device
+        return self
+
+    def forward(self, *args, **kwargs):
+        return "forward"
+
+class MockAutoModelForCausalLM:
+    @staticmethod
+    def from_pretrained(model_name, **kwargs):
+        return MockModel(**kwargs)
+
+class MockQuantization:
+    @staticmethod
+    def quantize_dynamic(model, layers, dtype=None):
+        model.quantized = True
+        return model
+
+class MockTorch:
+    bfloat16 = "bfloat16"
+    qint8 = "qint8"
+
+    class nn:
+        Linear = object
+
+    class ao:
+        quantization = MockQuantization
+
+    class cuda:
+        @staticmethod
+        def is_bf16_supported():
+            return True
+
+    class backends:
+        class mkldnn:
+            @staticmethod
+            def is_available():
+                return False
+
+    @staticmethod
+    def compile(fn, dynamic=False):
+        return lambda *args, **kwargs: "compiled " + fn(*args, **kwargs)
+
+mock_transformers = type(sys)('transformers')
+mock_transformers.AutoModelForCausalLM = MockAutoModelForCausalLM
+MOCK_MODULES = {
+    'transformers': mock_transformers,
+    'torch': MockTorch,
+    # Make sure the optional export dependency is seen as missing
+    'optimum': None,
+}
+
+import inference_backends
+from inference_backends import load_model, parse_backend
+
+class MockORTModel:
+    exports = 0
+
+    def __init__(self, source):
+        self.source = source
+
+    @classmethod
+    def from_pretrained(cls, name_or_path, export=False):
+        if export:
+            cls.exports += 1
+        return cls(name_or_path)
+
+    def save_pretrained(self, path):
+        with open(os.path.join(path, "model.onnx"), "w") as f:
+            f.write(self.source)
+
+def test_parse_backend():
+    print("Testing backend specs...")
+
+    assert parse_backend(None) == ["fp32"]
+    assert parse_backend("INT8 + compile") == ["int8", "compile"]
+    for bad in ["int4", "onnx+int8"]:
+        try:
+            parse_backend(bad)
+            assert False, f"{bad} should be rejected"
+        except ValueError:
+            pass
+    print("✓ Backend specs are parsed and validated")
+
+    return True
+
+def test_load_model():
+    print("\nTesting backend loading and fallbacks...")
+
+    model, applied = load_model("m", "fp32", "cpu")
+    assert applied == ["fp32"] and model.device == "cpu" and not model.kwargs
+
+    model, applied = load_model("m", "int8+compile", "cpu")
+    assert applied == ["int8", "compile"] and model.quantized
+    assert model.forward() == "compiled forward"
+
+    # No native bf16 on this CPU: fp32 weights, and int8 can still apply
+    model, applied = load_model("m", "bf16+int8", "cpu")
+    assert applied == ["int8"] and not model.kwargs
+
+    # bf16 on GPU; dynamic quantization is CPU-only
+    model, applied = load_model("m", "bf16+int8", "cuda")
+    assert applied == ["bf16"] and model.kwargs["torch_dtype"] == "bfloat16" and not model.quantized
+
+    # Export backends fall back to fp32 without optimum installed
+    model, applied = load_model("m", "onnx", "cpu")
+    assert applied == ["fp32"] and isinstance(model, MockModel)
+    print("✓ Backends load, and unavailable options fall back")
+
+    return True
+
+def test_export_is_cached():
+    print("\nTesting exported model caching...")
+
+    onnxruntime = type(sys)('optimum.onnxruntime')
+    onnxruntime.ORTModelForCausalLM = MockORTModel
+    saved = {name: sys.modules.get(name) for name in ('optimum', 'optimum.onnxruntime')}
+    sys.modules['optimum'] = type(sys)('optimum')
+    sys.modules['optimum.onnxruntime'] = onnxruntime
+    export_dir = inference_backends.EXPORT_DIR
+    inference_backends.EXPORT_DIR = tempfile.mkdtemp()
+    try:
+        model, applied = load_model("org/m", "onnx", "cpu")
+        path = inference_backends.export_path("org/m", "onnx")
+        assert applied == ["onnx"] and model.source == "org/m" and MockORTModel.exports == 1
+        assert os.listdir(inference_backends.EXPORT_DIR) == [os.path.basename(path)], "Only the finished export is left"
+
+        model, _ = load_model("org/m", "onnx", "cpu")
+        assert model.source == path and MockORTModel.exports == 1, "Later starts load the saved export"
+    finally:
+        inference_backends.EXPORT_DIR = export_dir
+        for name, module in saved.items():
+            sys.modules[name] = module
+    print("✓ The model is exported once and loaded from disk afterwards")
+
+    return True
+
+if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
+    try:
+        test_parse_backend()
+        test_load_model()
+        test_export_is_cached()
+        print("\n✅ All inference backend tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
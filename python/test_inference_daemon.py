@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the inference daemon and its client.
+"""
+
+import asyncio
+import grp
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+class MockTokenizer:
+    pad_token = "[PAD]"
+    pad_token_id = 0
+
+    def __call__(self, prompts, return_tensors="pt", padding=False):
+        prompts = [prompts] if isinstance(prompts, str) else prompts
+        return {"input_ids": [[1, 2, 3]] * len(prompts)}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return '{"subtasks": ["git_init", "commit"]}'
+
+class MockModel:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def generate(self, input_ids=None, **kwargs):
+        self.batch_sizes.append(len(input_ids))
+        time.sleep(0.05)
+        return [row + [4] for row in input_ids]
+
+    def to(self, device):
+        return self
+
+class MockAutoTokenizer:
+    @staticmethod
+    def from_pretrained(model_name):
+        return MockTokenizer()
+
+class MockAutoModelForCausalLM:
+    @staticmethod
+    def from_pretrained(model_name):
+        return MockModel()
+
+class MockCuda:
+    @staticmethod
+    def is_available():
+        return False
+
+class MockTorch:
+    cuda = MockCuda()
+
+mock_transformers = type(sys)('transformers')
+mock_transformers.AutoTokenizer = MockAutoTokenizer
+mock_transformers.AutoModelForCausalLM = MockAutoModelForCausalLM
+mock_transformers.StoppingCriteriaList = list
+mock_transformers.LogitsProcessorList = list
+MOCK_MODULES = {'transformers': mock_transformers, 'torch': MockTorch}
+
+from llm_inference import LLMInference
+import inference_daemon
+from inference_daemon import DaemonClient, DaemonError, DaemonTimeout, DaemonUnavailable, InferenceDaemon
+
+def start_daemon(socket_path):
+    daemon = InferenceDaemon(socket_path)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_until_complete, args=(daemon.serve(),), daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.02)
+    return daemon, loop, thread
+
+def test_daemon_round_trip():
+    print("Testing inference daemon requests...")
+
+    tmp = tempfile.mkdtemp()
+    LLMInference.CACHE_FILE = os.path.join(tmp, "llm_cache.db")
+    socket_path = os.path.join(tmp, "axiom.sock")
+    assert not DaemonClient(socket_path).available()
+    try:
+        DaemonClient(socket_path).call("ping")
+        assert False, "Calls without a daemon should raise DaemonUnavailable"
+    except DaemonUnavailable:
+        pass
+
+    daemon, loop, thread = start_daemon(socket_path)
+    try:
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == InferenceDaemon.SOCKET_MODE
+        client = DaemonClient(socket_path, timeout=10)
+        assert client.call("ping")["pid"] == os.getpid()
+        assert client.call("generate", prompt="hello") == '{"subtasks": ["git_init", "commit"]}'
+        assert client.call("plan", command="init and commit") == ["git_init", "commit"]
+        dag = client.call("plan", command="init and commit", as_dag=True)
+        assert [t["depends_on"] for t in dag] == [[], [0]], dag
+        try:
+            client.call("no_such_method")
+            assert False, "Unknown methods should return an error"
+        except DaemonError as e:
+            assert "Unknown method" in str(e)
+        # Valid JSON that isn't a request object still gets an error line back
+        raw = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        raw.settimeout(10)
+        raw.connect(socket_path)
+        raw.sendall(b"[1, 2]\n")
+        reply = json.loads(raw.makefile("rb").readline())
+        raw.close()
+        assert reply == {"id": None, "error": "ValueError: Request must be a JSON object"}, reply
+        # The connection survives an error
+        assert client.call("stats")["requests"] >= 6
+        print("✓ Ping, generate, plan, stats and errors round-trip")
+
+        # Separate clients share the daemon's model and micro-batches
+        llm = LLMInference()
+        llm.model.batch_sizes.clear()
+        results = []
+        workers = [threading.Thread(target=lambda i=i: results.append(
+            DaemonClient(socket_path, timeout=10).call("generate", prompt=f"concurrent {i}"))) for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert len(results) == 4
+        assert sum(llm.model.batch_sizes) == 4 and len(llm.model.batch_sizes) < 4, llm.model.batch_sizes
+        print(f"✓ Concurrent clients were batched together: {llm.model.batch_sizes}")
+
+        # A second daemon refuses to take over a live socket
+        try:
+            asyncio.new_event_loop().run_until_complete(InferenceDaemon(socket_path).serve())
+            assert False, "Second daemon should refuse to start"
+        except RuntimeError:
+            pass
+        client.close()
+    finally:
+        loop.call_soon_threadsafe(daemon.close)
+        thread.join(timeout=5)
+    assert not os.path.exists(socket_path), "Socket should be removed on shutdown"
+
+    return True
+
+def test_socket_safety():
+    print("\nTesting daemon socket location and client timeouts...")
+
+    assert os.path.dirname(inference_daemon.SOCKET_PATH) != "/tmp", "The default socket must not sit in shared /tmp"
+    assert DaemonClient().timeout == DaemonClient.TIMEOUT, "Clients should not wait forever by default"
+
+    tmp = tempfile.mkdtemp()
+    shared = os.path.join(tmp, "shared")
+    os.mkdir(shared)
+    os.chmod(shared, 0o777)
+    try:
+        asyncio.new_event_loop().run_until_complete(InferenceDaemon(os.path.join(shared, "axiom.sock")).serve())
+        assert False, "A directory anyone can write to should be refused"
+    except RuntimeError as e:
+        assert "Refusing" in str(e)
+    private = os.path.join(tmp, "private")
+    inference_daemon._check_socket_dir(private)
+    assert stat.S_IMODE(os.stat(private).st_mode) == 0o700
+
+    # A daemon that accepts but never answers fails the call instead of hanging it
+    wedged = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    wedged.bind(os.path.join(private, "wedged.sock"))
+    wedged.listen()
+    start = time.time()
+    try:
+        DaemonClient(os.path.join(private, "wedged.sock"), timeout=0.2).call("ping")
+        assert False, "A silent daemon should time out"
+    except DaemonTimeout:
+        pass
+    assert time.time() - start < 2
+    # A busy daemon is not mistaken for a missing one, which would load a second model
+    assert not issubclass(DaemonTimeout, DaemonUnavailable)
+    assert DaemonClient(os.path.join(private, "wedged.sock"), timeout=0.2).available()
+    wedged.close()
+    print("✓ Socket lives in a private directory and clients time out")
+
+    # With a daemon group, its members share the directory and socket
+    group = grp.getgrgid(os.getgid())
+    inference_daemon.DAEMON_GROUP = group.gr_name
+    try:
+        shared_dir = os.path.join(tmp, "group")
+        inference_daemon._check_socket_dir(shared_dir)
+        info = os.stat(shared_dir)
+        assert stat.S_IMODE(info.st_mode) == 0o2770 and info.st_gid == group.gr_gid
+        # The owner tightens a directory anyone could write to
+        os.chmod(shared_dir, 0o2777)
+        inference_daemon._check_socket_dir(shared_dir)
+        assert stat.S_IMODE(os.stat(shared_dir).st_mode) == 0o2770
+        socket_path = os.path.join(shared_dir, "axiom.sock")
+        daemon, loop, thread = start_daemon(socket_path)
+        try:
+            assert stat.S_IMODE(os.stat(socket_path).st_mode) == InferenceDaemon.GROUP_SOCKET_MODE
+            assert DaemonClient(socket_path, timeout=10).available()
+        finally:
+            loop.call_soon_threadsafe(daemon.close)
+            thread.join(timeout=5)
+    finally:
+        inference_daemon.DAEMON_GROUP = None
+    print("✓ A daemon group shares one socket between its members")
+
+    return True
+
+if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
+    try:
+        test_daemon_round_trip()
+        test_socket_safety()
+        print("\n✅ All inference daemon tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
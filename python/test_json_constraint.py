@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script to verify schema-constrained JSON decoding.
+"""
+
+import json
+import random
+import sys
+
+import numpy as np
+
+# numpy stand-in for the few torch calls the logits processor makes
+class MockTorch:
+    long = np.int64
+
+    @staticmethod
+    def full_like(array, value):
+        return np.full_like(array, value)
+
+    @staticmethod
+    def tensor(data, dtype=None):
+        return np.array(data, dtype=dtype)
+
+MOCK_MODULES = {'torch': MockTorch}
+
+from json_constraint import JSONConstraint, JSONSchemaAutomaton
+
+SUBTASKS_SCHEMA = {
+    "type": "object",
+    "properties": {"subtasks": {"type": "array", "items": {"type": "string"}}},
+}
+
+# SentencePiece-style vocabulary mixing single characters with multi-character pieces;
+# like a byte-fallback vocabulary, every character the schema needs is a token
+class MockTokenizer:
+    eos_token_id = 0
+    all_special_ids = [0]
+
+    def __init__(self):
+        pieces = ["</s>", "{", "}", "[", "]", ",", ":", '"', "\\", "▁", "<0x0A>", "<0xE2>",
+                  '{"', '"subtasks', '":', '▁["', '",', '▁"', '"]', ']}', '"}', "git", "▁init", "▁commit", "ab", "x"] + list("subtak")
+        self.vocab = {piece: i for i, piece in enumerate(pieces)}
+        self.ids = {i: piece for piece, i in self.vocab.items()}
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+def test_automaton():
+    print("Testing JSONSchemaAutomaton...")
+
+    automaton = JSONSchemaAutomaton(SUBTASKS_SCHEMA)
+    for text in ['{"subtasks": []}', '{"subtasks":["a","b \\"c\\""]}', ' {\n  "subtasks": [ "git init" ]\n}']:
+        state = automaton.step_text(automaton.initial, text)
+        assert state is not None and automaton.is_complete(state), text
+    for text in ['{"subtask": []}', '{"subtasks": [1]}', '{"subtasks": ["a",]}', '{"subtasks": []}}', '{     "subtasks": []}']:
+        state = automaton.step_text(automaton.initial, text)
+        assert state is None or not automaton.is_complete(state), text
+
+    dag_schema = {"type": "object", "properties": {
+        "tasks": {"type": "array", "items": {"type": "object", "properties": {
+            "task": {"type": "string"}, "depends_on": {"type": "array", "items": {"type": "integer"}}, "parallel": {"type": "boolean"}}}}}}
+    automaton = JSONSchemaAutomaton(dag_schema)
+    text = '{"tasks": [{"task": "a", "depends_on": [], "parallel": true}, {"task": "b", "depends_on": [0, 12], "parallel": false}]}'
+    assert automaton.is_complete(automaton.step_text(automaton.initial, text))
+    assert automaton.step_text(automaton.initial, text.replace("12", "1x")) is None
+    print("✓ Automaton accepts exactly the schema's documents")
+
+    return True
+
+def test_allowed_tokens():
+    print("\nTesting allowed token sets...")
+
+    tokenizer = MockTokenizer()
+    constraint = JSONConstraint(tokenizer, SUBTASKS_SCHEMA)
+    # The non-ASCII lone byte and the special token never appear
+    assert tokenizer.vocab["<0xE2>"] not in constraint.texts
+    assert 0 not in constraint.texts
+
+    allowed = {tokenizer.ids[i] for i in constraint.allowed_token_ids(constraint.automaton.initial)}
+    assert allowed == {"{", '{"', "▁", "<0x0A>"}, allowed
+    state = constraint.automaton.step_text(constraint.automaton.initial, '{"subtasks": ["git')
+    allowed = {tokenizer.ids[i] for i in constraint.allowed_token_ids(state)}
+    assert '"]' in allowed and '",' in allowed and "▁init" in allowed and "{" in allowed and "<0x0A>" not in allowed, allowed
+    done = constraint.automaton.step_text(constraint.automaton.initial, '{"subtasks": []}')
+    assert constraint.allowed_token_ids(done) == [tokenizer.eos_token_id]
+    # Memoised per state
+    assert constraint.allowed_token_ids(state) is constraint.allowed_token_ids(state)
+    print("✓ Allowed token sets follow the automaton")
+
+    return True
+
+def test_constrained_greedy_decoding():
+    print("\nTesting constrained decoding with random logits...")
+
+    tokenizer = MockTokenizer()
+    constraint = JSONConstraint(tokenizer, SUBTASKS_SCHEMA)
+    rng = random.Random(0)
+    prompt = [7, 7, 7]
+    for trial in range(20):
+        processor = constraint.processor(len(prompt))
+        input_ids = np.array([prompt, prompt])
+        for _ in range(200):
+            if processor.stopping_criterion(input_ids, None):
+                break
+            scores = np.array([[rng.random() for _ in tokenizer.vocab] for _ in range(2)])
+            # Favour closing tokens a little so documents finish within the budget
+            scores[:, [tokenizer.vocab['"]'], tokenizer.vocab[']}'], tokenizer.vocab["}"]]] += 0.3
+            masked = processor(input_ids, scores)
+            input_ids = np.concatenate([input_ids, masked.argmax(axis=1)[:, None]], axis=1)
+        assert processor.done(), f"trial {trial} did not finish"
+        for row in input_ids:
+            text = "".join(constraint.texts.get(int(t), "") for t in row[len(prompt):])  # EOS pads rows that finished first
+            data = json.loads(text)
+            assert isinstance(data["subtasks"], list) and all(isinstance(s, str) for s in data["subtasks"]), text
+    print("✓ Every constrained generation parses and stops when the object closes")
+
+    return True
+
+if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
+    try:
+        test_automaton()
+        test_allowed_tokens()
+        test_constrained_greedy_decoding()
+        print("\n✅ All JSON constraint tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the in-process LocalVectorIndex used as a Qdrant fallback.
+"""
+
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from local_index import LocalVectorIndex
+
+def _points(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return [f"id{i}" for i in range(n)], rng.standard_normal((n, dim)).astype(np.float32)
+
+def test_exact_search_and_persistence():
+    print("Testing LocalVectorIndex exact search and persistence...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "memory")
+        index = LocalVectorIndex(path, dim=16)
+        ids, vectors = _points(100)
+        index.upsert(ids, vectors, [{"text": i} for i in ids])
+
+        hits = index.search(vectors[7] * 3, limit=3)
+        assert hits[0].id == "id7", "Nearest neighbour should be the query point"
+        assert abs(hits[0].score - 1.0) < 1e-5, "Cosine score of identical direction should be 1"
+        assert hits[0].payload == {"text": "id7"}, "Payload should be returned"
+        assert hits[0].score >= hits[1].score >= hits[2].score, "Hits should be sorted by score"
+        index.close()
+
+        reopened = LocalVectorIndex(path, dim=16)
+        assert len(reopened) == 100, "Points should survive reopening"
+        assert reopened.search(vectors[42], limit=1)[0].id == "id42"
+        reopened.close()
+    print("✓ Exact search and persistence work")
+
+def test_ivf_recall():
+    print("Testing LocalVectorIndex IVF search...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(os.path.join(tmp, "memory"), dim=16)
+        index.IVF_MIN_POINTS = 500
+        ids, vectors = _points(2000, seed=1)
+        index.upsert(ids, vectors, [{} for _ in ids])
+
+        found = sum(index.search(vectors[i], limit=1)[0].id == ids[i] for i in range(0, 2000, 20))
+        assert index._centroids is not None, "Large index should be clustered"
+        assert found >= 95, f"IVF should find nearly every query point, found {found}/100"
+        index.close()
+    print("✓ IVF search works")
+
+def test_recycling_and_delete():
+    print("Testing LocalVectorIndex payload cleanup...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(os.path.join(tmp, "memory"), dim=16, max_points=4)
+        ids, vectors = _points(5)
+        index.upsert(ids, vectors, [{"text": i} for i in ids])
+        index._payloads.flush()
+        assert len(index) == 4 and index._payloads.get("id0") is None, "A recycled point's payload should go too"
+
+        index.delete(["id2", "missing"])
+        index._payloads.flush()
+        assert len(index) == 3 and index._payloads.get("id2") is None
+        assert "id2" not in [hit.id for hit in index.search(vectors[2], limit=4)], "Deleted points are not found"
+        index.upsert(["new"], vectors[2:3], [{"text": "new"}])
+        assert index.search(vectors[2], limit=1)[0].payload == {"text": "new"}, "Freed rows are reused"
+        index.close()
+    print("✓ Recycled and deleted points leave no payload behind")
+
+def test_search_skips_deleted_rows():
+    print("Testing LocalVectorIndex search after deleting near-duplicates...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(os.path.join(tmp, "memory"), dim=16)
+        _, vectors = _points(12)
+        query = vectors[0]
+        near = [query + 0.01 * i for i in range(10)]
+        index.upsert([f"dup{i}" for i in range(10)] + ["far1", "far2"], near + [vectors[1], vectors[2]],
+                     [{} for _ in range(12)])
+        index.delete([f"dup{i}" for i in range(10)])
+        hits = index.search(query, limit=2)
+        assert sorted(hit.id for hit in hits) == ["far1", "far2"], f"Freed rows must not crowd out live ones: {hits}"
+        index.close()
+    print("✓ Deleted rows never take a top-k slot")
+
+def test_incremental_assignment():
+    print("Testing LocalVectorIndex incremental cluster assignment...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(os.path.join(tmp, "memory"), dim=16)
+        index.IVF_MIN_POINTS = 500
+        ids, vectors = _points(2000, seed=2)
+        index.upsert(ids, vectors, [{} for _ in ids])
+        index.search(vectors[0], limit=1)
+        assigned = []
+        assign = index._assign
+        index._assign = lambda matrix: assigned.append(len(matrix)) or assign(matrix)
+
+        new_ids, new_vectors = _points(100, seed=3)
+        new_ids = [f"new{i}" for i in range(100)]
+        index.upsert(new_ids, new_vectors, [{} for _ in new_ids])
+        # Existing points move to another cluster
+        index.upsert(ids[:50], new_vectors[50:] * -1, [{} for _ in range(50)])
+        found = sum(index.search(new_vectors[i], limit=1)[0].id == new_ids[i] for i in range(100))
+        moved = [index.search(-new_vectors[50 + i], limit=2) for i in range(50)]
+        assert not assigned, "Upserts should not trigger a full reassignment"
+        assert found >= 95, f"New points should be searchable at once, found {found}/100"
+        assert sum(hits[0].id == ids[i] for i, hits in enumerate(moved)) >= 48, "Moved points are found where they are"
+        assert all(hits[0].id != hits[1].id for hits in moved), "A moved point is listed once"
+        index.delete(new_ids)
+        assert all(hit.id not in new_ids for hit in index.search(new_vectors[0], limit=10))
+        index.close()
+    print("✓ Upserts join their nearest cluster without rebuilding the lists")
+
+def test_concurrent_upsert_and_search():
+    print("Testing LocalVectorIndex concurrent upserts and searches...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(os.path.join(tmp, "memory"), dim=16, max_points=3000)
+        index.IVF_MIN_POINTS = 300
+        errors = []
+
+        def writer(seed):
+            try:
+                ids, vectors = _points(1000, seed=seed)
+                for start in range(0, 1000, 50):
+                    index.upsert([f"{seed}-{i}" for i in ids[start:start + 50]], vectors[start:start + 50],
+                                 [{} for _ in range(50)])
+            except Exception as e:
+                errors.append(e)
+
+        def reader():
+            try:
+                query = _points(1, seed=99)[1][0]
+                for _ in range(200):
+                    index.search(query, limit=3)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(seed,)) for seed in (10, 11, 12, 13)]
+        threads += [threading.Thread(target=reader) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, f"Concurrent use failed: {errors[:1]}"
+        assert len(index) == 3000 and len(index._ids_by_row) == 3000
+        ids, vectors = _points(1000, seed=13)
+        assert index.search(vectors[999], limit=1)[0].id == "13-id999"
+        index.close()
+    print("✓ Upserts and searches from several threads stay consistent")
+
+if __name__ == "__main__":
+    test_exact_search_and_persistence()
+    test_ivf_recall()
+    test_recycling_and_delete()
+    test_search_skips_deleted_rows()
+    test_incremental_assignment()
+    test_concurrent_upsert_and_search()
+    print("\n✅ All LocalVectorIndex tests passed!")
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Test script to verify QdrantMemory bulk ingestion and AsyncQdrantMemory against mocked Qdrant clients.
+"""
+
+import asyncio
+import sys
+import tempfile
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+Hit = namedtuple("Hit", ["id", "score", "payload"])
+
+class MockCollections:
+    def __init__(self):
+        self.collections = {}  # name -> {id: (vector, payload)}
+        self.uploads = []  # (points per call, calling thread)
+
+    def upload_collection(self, collection_name, vectors, payload, ids, wait=True):
+        assert isinstance(vectors, np.ndarray) and vectors.dtype == np.float32, "Vectors should stay an array"
+        self.uploads.append((len(ids), threading.current_thread()))
+        points = self.collections.setdefault(collection_name, {})
+        for point_id, vector, point_payload in zip(ids, vectors, payload):
+            points[point_id] = (vector, point_payload)
+
+    def _search(self, collection_name, query_vector, limit):
+        query = np.asarray(query_vector) / np.linalg.norm(query_vector)
+        hits = [Hit(point_id, float(vector @ query / np.linalg.norm(vector)), payload)
+                for point_id, (vector, payload) in self.collections.get(collection_name, {}).items()]
+        return sorted(hits, key=lambda hit: -hit.score)[:limit]
+
+class MockQdrantClient(MockCollections):
+    def __init__(self, host, port=None):
+        super().__init__()
+
+    def get_collection(self, name):
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} not found")
+
+    def create_collection(self, collection_name, vectors_config):
+        self.collections[collection_name] = {}
+
+    def search(self, collection_name, query_vector, limit):
+        return self._search(collection_name, query_vector, limit)
+
+class MockAsyncQdrantClient(MockCollections):
+    created = []
+
+    def __init__(self, host, port=None, grpc_port=None, prefer_grpc=False):
+        super().__init__()
+        # The real client's connections are bound to the loop that opens them
+        self.loop = asyncio.get_running_loop()
+        MockAsyncQdrantClient.created.append(self)
+
+    def _check_loop(self):
+        assert asyncio.get_running_loop() is self.loop, "Client used from another event loop"
+
+    async def collection_exists(self, name):
+        self._check_loop()
+        return name in self.collections
+
+    async def create_collection(self, collection_name, vectors_config):
+        self._check_loop()
+        self.collections[collection_name] = {}
+
+    async def search(self, collection_name, query_vector, limit):
+        self._check_loop()
+        return self._search(collection_name, query_vector, limit)
+
+class MockModels:
+    class Distance:
+        COSINE = "Cosine"
+
+    class VectorParams:
+        def __init__(self, size, distance):
+            self.size = size
+            self.distance = distance
+
+    class PointStruct:
+        def __init__(self, id, vector, payload):
+            self.id = id
+            self.vector = vector
+            self.payload = payload
+
+mock_qdrant_client = type(sys)('qdrant_client')
+mock_qdrant_client.QdrantClient = MockQdrantClient
+mock_qdrant_client.AsyncQdrantClient = MockAsyncQdrantClient
+MOCK_MODULES = {'qdrant_client': mock_qdrant_client, 'qdrant_client.models': MockModels}
+
+# memory imports qdrant_client at load, so the tests import it once the mocks are in place
+from embedding_model import EmbeddingModel
+from mock_models import hashing_sentence_transformer
+
+class MockEmbeddingModel:
+    """Swap in a hashing EmbeddingModel with its caches in tmp"""
+
+    NAMES = ("_instance", "CACHE_FILE", "INDEX_FILE", "LEGACY_CACHE_FILE", "POOL_WORKERS", "MODEL_FACTORY")
+
+    def __init__(self, tmp):
+        self.tmp = tmp
+
+    def __enter__(self):
+        self.saved = {name: EmbeddingModel.__dict__[name] for name in self.NAMES}
+        EmbeddingModel._instance = None
+        EmbeddingModel.CACHE_FILE = str(self.tmp / "embedding_cache.f32")
+        EmbeddingModel.INDEX_FILE = str(self.tmp / "embedding_index.db")
+        EmbeddingModel.LEGACY_CACHE_FILE = str(self.tmp / "embedding_cache.json")
+        EmbeddingModel.POOL_WORKERS = 0
+        EmbeddingModel.MODEL_FACTORY = staticmethod(hashing_sentence_transformer)
+        self.model = EmbeddingModel.get_instance()
+        return self.model
+
+    def __exit__(self, *exc):
+        self.model._store.close()
+        for name, value in self.saved.items():
+            setattr(EmbeddingModel, name, value)
+
+def test_store_contexts(tmp_path):
+    print("Testing QdrantMemory.store_contexts bulk ingestion...")
+
+    from memory import QdrantMemory
+    with MockEmbeddingModel(tmp_path):
+        memory = QdrantMemory("bulk", backend="qdrant")
+        texts = [f"context {i}" for i in range(150)]
+        result = memory.store_contexts(texts, [f"c{i}" for i in range(150)], [{"n": i} for i in range(150)],
+                                       embed_batch_size=64, upsert_chunk_size=50)
+        assert result["stored"] == 150 and len(set(result["ids"])) == 150
+        assert [n for n, _ in memory.client.uploads] == [50, 14, 50, 14, 22], "Batches should upload in chunks"
+        points = memory.client.collections["bulk"]
+        first = points[result["ids"][0]][1]
+        assert first == {"text": "context 0", "context_id": "c0", "n": 0}, f"Payload should be merged: {first}"
+        assert memory.search_similar("context 42", limit=1)[0]["context_id"] == "c42"
+        assert memory.store_contexts([], [])["stored"] == 0
+    print("✓ Contexts are embedded in batches, uploaded in chunks and searchable")
+
+    return True
+
+def test_async_memory(tmp_path):
+    print("\nTesting AsyncQdrantMemory on separate event loops...")
+
+    from memory import AsyncQdrantMemory
+    MockAsyncQdrantClient.created.clear()
+
+    async def run(tag):
+        memory = AsyncQdrantMemory("async")
+        other = AsyncQdrantMemory("async")
+        assert memory.client is other.client, "Instances on one loop should share a client"
+        texts = [f"{tag} note {i}" for i in range(10)]
+        result = await memory.astore_contexts(texts, [f"{tag}{i}" for i in range(10)], embed_batch_size=4,
+                                              upsert_chunk_size=3)
+        assert result["stored"] == 10
+        assert all(thread is not threading.current_thread() for _, thread in memory.client.uploads), \
+            "Blocking uploads should run off the event loop"
+        hits = await other.asearch_similar(f"{tag} note 7", limit=2)
+        assert hits[0]["context_id"] == f"{tag}7" and hits[0]["score"] > hits[1]["score"]
+        batched = await memory.abatch_search_similar([f"{tag} note 1", f"{tag} note 2"], limit=1)
+        assert [hits[0]["context_id"] for hits in batched] == [f"{tag}1", f"{tag}2"]
+        await memory.astore_context(f"{tag} single", "single", {"kind": "one"})
+        assert (await memory.asearch_similar(f"{tag} single", limit=1))[0]["payload"]["kind"] == "one"
+
+    with MockEmbeddingModel(tmp_path):
+        asyncio.run(run("first"))
+        asyncio.run(run("second"))
+    assert len(MockAsyncQdrantClient.created) == 2, "Each event loop should get its own client"
+    print("✓ Async stores and searches work, with one client per event loop")
+
+    return True
+
+def test_local_backend(tmp_path):
+    print("\nTesting QdrantMemory on the in-process local index...")
+
+    import memory
+    from memory import QdrantMemory
+    index_dir = memory.LOCAL_INDEX_DIR
+    memory.LOCAL_INDEX_DIR = str(tmp_path)
+    try:
+        with MockEmbeddingModel(tmp_path):
+            local = QdrantMemory("local_notes", backend="local")
+            assert local.client is None, "The local backend needs no Qdrant server"
+            local.store_context("rebase onto main", "ctx-1", {"source": "cli"})
+            result = local.store_contexts([f"note {i}" for i in range(100)], [f"n{i}" for i in range(100)],
+                                          embed_batch_size=32, upsert_chunk_size=10)
+            assert result["stored"] == 100 and len(local.index) == 101
+
+            hits = local.search_similar("rebase onto main", limit=3)
+            assert hits[0]["context_id"] == "ctx-1" and abs(hits[0]["score"] - 1.0) < 1e-5
+            assert hits[0]["payload"] == {"text": "rebase onto main", "context_id": "ctx-1", "source": "cli"}
+            assert local.search_similar("note 64", limit=1)[0]["text"] == "note 64"
+            local.index.close()
+
+            reopened = QdrantMemory("local_notes", backend="local")
+            assert reopened.search_similar("note 7", limit=1)[0]["context_id"] == "n7", "Memory should persist"
+            reopened.index.close()
+    finally:
+        memory.LOCAL_INDEX_DIR = index_dir
+    print("✓ Stores and searches work without a Qdrant server")
+
+    return True
+
+if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
+    try:
+        for test in (test_store_contexts, test_async_memory, test_local_backend):
+            with tempfile.TemporaryDirectory() as tmp:
+                test(Path(tmp))
+        print("\n✅ All memory tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
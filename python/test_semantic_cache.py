@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script to verify near-duplicate prompt matching in SemanticCache.
+"""
+
+import asyncio
+import re
+import zlib
+
+import numpy as np
+
+from llm_inference import LLMInference, PrefixCache
+from semantic_cache import SemanticCache
+
+# Bag-of-words embedder standing in for EmbeddingModel, so paraphrases share words
+class MockEmbeddingModel:
+    EMBEDDING_DIM = 256
+
+    async def aembed_array(self, texts, normalize=False):
+        vectors = np.zeros((len(texts), self.EMBEDDING_DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[i, zlib.crc32(word.encode()) % self.EMBEDDING_DIM] += 1
+        if normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+def test_paraphrase_hits_and_stats():
+    print("Testing SemanticCache paraphrase matching...")
+
+    cache = SemanticCache(MockEmbeddingModel(), thresholds={"planner": 0.8})
+
+    async def run():
+        await cache.aadd(["init a repo and push it"], ["plan A"], "planner")
+        hits = await cache.alookup(["init the repo and push it", "delete every branch"], "planner")
+        other = await cache.alookup(["init a repo and push it"], "debug")
+        partitioned = await cache.alookup(["init the repo and push it"], "planner", "schema")
+        return hits, other, partitioned
+
+    hits, other, partitioned = asyncio.run(run())
+    assert hits == ["plan A", None], "Paraphrase should hit, unrelated prompt should miss"
+    assert other == [None], "Namespaces should not share entries"
+    assert partitioned == [None], "Partitions should not share entries"
+
+    stats = cache.stats()["planner"]
+    assert stats["hits"] == 1 and stats["lookups"] == 3
+    assert stats["threshold"] == 0.8, "Per-namespace threshold should be reported"
+    assert 0.8 <= stats["mean_hit_similarity"] <= 1.0
+    print("✓ SemanticCache paraphrase matching works")
+
+def test_ring_buffer_bound():
+    print("Testing SemanticCache entry bound...")
+
+    cache = SemanticCache(MockEmbeddingModel(), max_entries=20)
+
+    async def run():
+        for i in range(50):
+            await cache.aadd([f"prompt number {i}"], [i])
+
+    asyncio.run(run())
+    assert cache.stats()["default"]["entries"] == 20, "Namespace should stay within max_entries"
+    print("✓ SemanticCache entry bound works")
+
+def test_llm_semantic_hits_respect_request_settings():
+    print("Testing LLMInference semantic lookups across schemas and budgets...")
+
+    # Only the semantic cache wiring is exercised, so skip loading a model
+    llm = object.__new__(LLMInference)
+    llm.prefix_cache = PrefixCache(0)
+    llm.semantic_cache = SemanticCache(MockEmbeddingModel(), thresholds={"planner": 0.8})
+    schema = {"type": "object", "properties": {"subtasks": {"type": "array", "items": {"type": "string"}}}}
+    options = llm._generation_options("planner")
+
+    async def run():
+        await llm._semantic_add(["init a repo and push it"], ['{"subtasks": ["init", "push"]}'], "planner", schema, options)
+        paraphrase = "init the repo and push it"
+        return (
+            await llm._semantic_lookup([paraphrase], "planner", schema, options),
+            await llm._semantic_lookup([paraphrase], "planner", None, options),
+            await llm._semantic_lookup([paraphrase], "planner", schema, llm._generation_options("planner", max_new_tokens=16)),
+        )
+
+    same, no_schema, other_budget = asyncio.run(run())
+    assert same == ['{"subtasks": ["init", "push"]}'], "Same schema and budget should hit"
+    assert no_schema == [None] and other_budget == [None], "Different request settings must not share answers"
+    print("✓ Semantic hits only cross prompts with identical request settings")
+
+if __name__ == "__main__":
+    test_paraphrase_hits_and_stats()
+    test_ring_buffer_bound()
+    test_llm_semantic_hits_respect_request_settings()
+    print("\n✅ All SemanticCache tests passed!")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test script to verify TTLCache expiry, LRU eviction and process-wide sharing.
+"""
+
+import os
+import tempfile
+import time
+
+from cache_store import CacheStore
+from shared_cache import TTLCache, get_shared_cache
+
+def test_lru_and_ttl():
+    print("Testing TTLCache LRU eviction and heap-based expiry...")
+
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1, "Entry should be cached"
+    cache.set("c", 3)
+    assert cache.get("b") is None, "Least recently used entry should be evicted"
+
+    cache.set("short", 4, ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("short") is None, "Expired entry should be dropped"
+    cache.set("a", 5, ttl=0.05)
+    cache.set("a", 6)
+    time.sleep(0.1)
+    assert cache.get("a") == 6, "Overwriting should replace the old expiry"
+
+    stats = cache.stats()
+    assert stats["evictions"] >= 1 and stats["expirations"] == 1
+    print("✓ TTLCache works")
+
+def test_shared_and_persistent():
+    print("Testing shared and persistent caches...")
+
+    assert get_shared_cache("test_ns") is get_shared_cache("test_ns"), "Namespace cache should be shared"
+    assert get_shared_cache("test_ns") is not get_shared_cache("other_ns")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "agent.db")
+        store = CacheStore(path)
+        cache = TTLCache(maxsize=10, ttl=60, store=store)
+        cache.set("kept", ["subtask"])
+        cache.set("gone", "x", ttl=0.01)
+        store.flush()
+        time.sleep(0.05)
+        reloaded = TTLCache(maxsize=10, ttl=60, store=store)
+        assert reloaded.get("kept") == ["subtask"], "Persisted entry should reload"
+        assert reloaded.get("gone") is None, "Expired entries should not reload"
+        store.close()
+    print("✓ Shared and persistent caches work")
+
+if __name__ == "__main__":
+    test_lru_and_ttl()
+    test_shared_and_persistent()
+    print("\n✅ All shared cache tests passed!")
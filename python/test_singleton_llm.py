@@ -15,7 +15,7 @@ class MockTokenizer:
         self.pad_token = "[PAD]"
         self.eos_token = "[EOS]"
 
-    def __call__(self, prompt, return_tensors="pt"):
+    def __call__(self, prompt, return_tensors="pt", padding=False):
         return {"input_ids": [[1, 2, 3]]}
 
     def decode(self, outputs, skip_special_tokens=True):
@@ -34,7 +34,7 @@ class MockTokenizer:
             return "Mock response"
 
 class MockModel:
-    def generate(self, inputs, max_length=512):
+    def generate(self, input_ids=None, max_length=512, **kwargs):
         return [[1, 2, 3, 4]]
 
     def to(self, device):
@@ -58,11 +58,10 @@ class MockCuda:
 class MockTorch:
     cuda = MockCuda()
 
-# Monkey patch the imports
-sys.modules['transformers'] = type(sys)('transformers')
-sys.modules['transformers'].AutoTokenizer = MockAutoTokenizer
-sys.modules['transformers'].AutoModelForCausalLM = MockAutoModelForCausalLM
-sys.modules['torch'] = MockTorch
+mock_transformers = type(sys)('transformers')
+mock_transformers.AutoTokenizer = MockAutoTokenizer
+mock_transformers.AutoModelForCausalLM = MockAutoModelForCausalLM
+MOCK_MODULES = {'transformers': mock_transformers, 'torch': MockTorch}
 
 # Import LLMInference
 from llm_inference import LLMInference
@@ -102,5 +101,29 @@ def test_singleton_llm():
     print("\n✅ All tests passed! Singleton pattern is working correctly.")
     print("Only one model load should have occurred (check logs above).")
 
+def test_failed_load_is_retried():
+    print("\nTesting that a failed model load is retried...")
+
+    def unavailable(model_name):
+        raise OSError("model download failed")
+
+    LLMInference._instance = None
+    original = MockAutoModelForCausalLM.from_pretrained
+    MockAutoModelForCausalLM.from_pretrained = staticmethod(unavailable)
+    try:
+        LLMInference()
+        assert False, "A failed foreground load should raise"
+    except OSError:
+        pass
+    finally:
+        MockAutoModelForCausalLM.from_pretrained = original
+
+    llm = LLMInference()
+    assert llm.ready and llm.model is not None, "The next construction should load the model"
+    assert llm.generate("Hello after retry") == "Mock response"
+    print("✓ The singleton retries initialization after a failed load")
+
 if __name__ == "__main__":
-    test_singleton_llm()
\ No newline at end of file
+    sys.modules.update(MOCK_MODULES)
+    test_singleton_llm()
+    test_failed_load_is_retried()
\ No newline at end of file
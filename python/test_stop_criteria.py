@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script to verify generation budgets, stop strings and stop-reason telemetry.
+"""
+
+import os
+import sys
+import tempfile
+
+# Character-level tokenizer: token id = ord(char), 0 pads
+class MockTokenizer:
+    pad_token = "[PAD]"
+    pad_token_id = 0
+    eos_token_id = 0
+
+    def __call__(self, prompts, return_tensors="pt", padding=False):
+        prompts = [prompts] if isinstance(prompts, str) else prompts
+        width = max(len(p) for p in prompts)
+        return {"input_ids": [[0] * (width - len(p)) + [ord(c) for c in p] for p in prompts]}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(int(i)) for i in ids if int(i) != 0)
+
+# Emits a scripted answer one token at a time, honouring the budget and stopping criteria
+class MockModel:
+    ANSWERS = {"json": '{"a": 1} and then some', "stop": "first line\nsecond line", "long": "x" * 50}
+
+    def __init__(self):
+        self.generated = 0
+
+    def generate(self, input_ids=None, max_new_tokens=512, stopping_criteria=None, **kwargs):
+        rows = [list(row) for row in input_ids]
+        answers = [self.ANSWERS[MockTokenizer().decode(row).split(":")[0]] for row in rows]
+        for step in range(max_new_tokens):
+            for row, answer in zip(rows, answers):
+                row.append(ord(answer[step]) if step < len(answer) else 0)
+            self.generated += 1
+            if all(step + 1 >= len(answer) for answer in answers):
+                break
+            if stopping_criteria and all(criterion(rows, None) for criterion in stopping_criteria):
+                break
+        return rows
+
+    def to(self, device):
+        return self
+
+class MockAutoTokenizer:
+    @staticmethod
+    def from_pretrained(model_name):
+        return MockTokenizer()
+
+class MockAutoModelForCausalLM:
+    @staticmethod
+    def from_pretrained(model_name):
+        return MockModel()
+
+class MockCuda:
+    @staticmethod
+    def is_available():
+        return False
+
+class MockTorch:
+    cuda = MockCuda()
+
+mock_transformers = type(sys)('transformers')
+mock_transformers.AutoTokenizer = MockAutoTokenizer
+mock_transformers.AutoModelForCausalLM = MockAutoModelForCausalLM
+mock_transformers.StoppingCriteriaList = list
+mock_transformers.LogitsProcessorList = list
+MOCK_MODULES = {'transformers': mock_transformers, 'torch': MockTorch}
+
+from llm_inference import LLMInference
+from stop_criteria import StopCriteria, valid_json
+
+def test_stop_criteria():
+    print("Testing StopCriteria...")
+
+    assert valid_json('{"a": [1]}') and valid_json(' [1, 2] ')
+    assert not valid_json('{"a": [1]') and not valid_json('{"a": 1} x') and not valid_json("")
+
+    tokenizer = MockTokenizer()
+    criteria = StopCriteria(tokenizer, 2, stop=["END"], callbacks=[lambda text: text.endswith("!")])
+    rows = [[0, 0], [0, 0]]
+    for a, b in zip("abEN", "hi!?"):
+        rows[0].append(ord(a))
+        rows[1].append(ord(b))
+        assert not criteria(rows, None) or a == "N"
+    # The stop string straddles two tokens
+    rows[0].append(ord("D"))
+    rows[1].append(ord("."))
+    assert criteria(rows, None), "Both rows should have stopped"
+    assert criteria.finish(0, "abEND tail") == ("abEND", "stop_string")
+    assert criteria.finish(1, "hi!?.") == ("hi!", "callback")
+    print("✓ Stop strings and callbacks stop rows and trim output")
+
+    return True
+
+def test_budgets_and_telemetry():
+    print("\nTesting generation budgets and stop reasons...")
+
+    # A fresh cache file, so every prompt below is really generated
+    LLMInference.CACHE_FILE = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+    llm = LLMInference()
+
+    response = llm.generate("json: budget test", stop_on_json=True)
+    assert response == '{"a": 1}', response
+    response = llm.generate("stop: budget test", stop=["\n"])
+    assert response == "first line\n", response
+    response = llm.generate("long: budget test", max_new_tokens=10)
+    assert response == "x" * 10, response
+    assert llm.model.generated < 40, "Generation should end at the budget or stop point"
+
+    # The planner budget turns JSON stopping on by default
+    response = llm.generate("json: planner budget test", namespace="planner")
+    assert response == '{"a": 1}', response
+
+    stats = llm.generation_stats()
+    assert stats["default"]["stop_reasons"] == {"callback": 1, "stop_string": 1, "max_new_tokens": 1}, stats
+    assert stats["default"]["max_tokens"] == 11, stats
+    assert stats["planner"]["generations"] == 1 and stats["planner"]["stop_reasons"] == {"callback": 1}, stats
+
+    # Different budgets are cached separately from the default
+    assert llm._cache_prompt("p", None, llm._generation_options("default")) == "p"
+    assert llm._cache_prompt("p", None, llm._generation_options("default", max_new_tokens=10)) != "p"
+    print("✓ Budgets, stop strings and stop-reason telemetry work")
+
+    return True
+
+if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
+    try:
+        test_stop_criteria()
+        test_budgets_and_telemetry()
+        print("\n✅ All stop criteria tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)
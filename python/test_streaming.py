@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script to verify LLMInference streaming and its handling of generation errors.
+"""
+
+import asyncio
+import os
+import queue
+import sys
+import tempfile
+
+class MockTokenizer:
+    pad_token = "[PAD]"
+
+    def __call__(self, prompt, return_tensors="pt", padding=False):
+        return {"input_ids": [[1, 2, 3]], "prompt": prompt}
+
+# Queue-backed stand-in for transformers' TextIteratorStreamer
+class MockTextIteratorStreamer:
+    def __init__(self, tokenizer, skip_prompt=True, skip_special_tokens=True):
+        self._queue = queue.Queue()
+        self._end = object()
+
+    def put(self, text):
+        self._queue.put(text)
+
+    def end(self):
+        self._queue.put(self._end)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        value = self._queue.get(timeout=10)
+        if value is self._end:
+            raise StopIteration
+        return value
+
+# Streams three words; prompts starting with "fail" raise after the second
+class MockModel:
+    def generate(self, input_ids=None, prompt="", streamer=None, **kwargs):
+        for i, word in enumerate(["one ", "two ", "three"]):
+            if i == 2 and prompt.startswith("fail"):
+                raise RuntimeError("CUDA out of memory")
+            streamer.put(word)
+        streamer.end()
+
+    def to(self, device):
+        return self
+
+class MockAutoTokenizer:
+    @staticmethod
+    def from_pretrained(model_name):
+        return MockTokenizer()
+
+class MockAutoModelForCausalLM:
+    @staticmethod
+    def from_pretrained(model_name):
+        return MockModel()
+
+class MockCuda:
+    @staticmethod
+    def is_available():
+        return False
+
+class MockTorch:
+    cuda = MockCuda()
+
+mock_transformers = type(sys)('transformers')
+mock_transformers.AutoTokenizer = MockAutoTokenizer
+mock_transformers.AutoModelForCausalLM = MockAutoModelForCausalLM
+mock_transformers.TextIteratorStreamer = MockTextIteratorStreamer
+mock_transformers.StoppingCriteriaList = list
+MOCK_MODULES = {'transformers': mock_transformers, 'torch': MockTorch}
+
+from llm_inference import LLMInference
+
+def test_stream_caches_complete_text():
+    print("Testing streamed responses are cached once complete...")
+
+    LLMInference.CACHE_FILE = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+    llm = LLMInference()
+    assert list(llm.stream("ok sync")) == ["one ", "two ", "three"]
+    assert list(llm.stream("ok sync")) == ["one two three"], "A finished stream should be cached"
+
+    async def consume(prompt):
+        return [chunk async for chunk in llm.astream(prompt)]
+
+    assert asyncio.run(consume("ok async")) == ["one ", "two ", "three"]
+    assert llm._get_cached_response("ok async") == "one two three"
+    print("✓ Complete streams are cached")
+
+    return True
+
+def test_stream_generation_error():
+    print("\nTesting a generation error part-way through a stream...")
+
+    llm = LLMInference()
+    chunks = []
+    try:
+        for chunk in llm.stream("fail sync"):
+            chunks.append(chunk)
+        assert False, "The generation error should reach the consumer"
+    except RuntimeError as e:
+        assert "out of memory" in str(e)
+    assert chunks == ["one ", "two "]
+
+    async def consume(prompt):
+        return [chunk async for chunk in llm.astream(prompt)]
+
+    try:
+        asyncio.run(consume("fail async"))
+        assert False, "The generation error should reach the async consumer"
+    except RuntimeError as e:
+        assert "out of memory" in str(e)
+
+    llm._store.flush()
+    for prompt in ["fail sync", "fail async"]:
+        assert llm._get_cached_response(prompt) is None, "Truncated text must not be cached"
+        assert llm._store.get(llm._get_cache_key(prompt)) is None
+    print("✓ Stream errors are raised and nothing is cached")
+
+    return True
+
+if __name__ == "__main__":
+    sys.modules.update(MOCK_MODULES)
+    try:
+        test_stream_caches_complete_text()
+        test_stream_generation_error()
+        print("\n✅ All streaming tests passed!")
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        sys.exit(1)